@@ -0,0 +1,218 @@
+"""
+Log Collector for TouchDesigner
+Author: Arnaud Cassone / CraftKontrol
+Merges the log records of several TouchDesigner processes of a machine in a single,
+time ordered, rotating log file. It doesn't depend on TouchDesigner.
+
+Records are sent over a local TCP connection as frames: a 4 bytes big endian
+length followed by a json payload. One process hosts the collector and is the only
+writer of the merged file, so processes never compete for a file lock.
+
+Run standalone with: python LogCollector.py <port> <path/to/merged.log>
+"""
+
+import heapq
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+HEADER = struct.Struct('>I')
+MAX_FRAME = 1 << 20
+
+collectors = {} # port -> LogCollector hosted by this process
+handlers = {} # port -> CollectorHandler shared by the loggers of this process
+
+
+def encodeRecord(created, pid, name, level, message):
+	payload = json.dumps({'t': created, 'pid': pid, 'name': name, 'level': level, 'msg': message}, separators=(',', ':')).encode('utf-8')
+	return HEADER.pack(len(payload)) + payload
+
+
+def readFrames(stream):
+	"""Yield the decoded records of a stream of frames until it is closed."""
+	while True:
+		header = stream.read(HEADER.size)
+		if len(header) < HEADER.size:
+			return
+		length = HEADER.unpack(header)[0]
+		if length > MAX_FRAME:
+			return
+		payload = stream.read(length)
+		if len(payload) < length:
+			return
+		try:
+			yield json.loads(payload)
+		except ValueError:
+			continue
+
+
+class LogCollector:
+	"""
+	Local server receiving framed log records and writing them, ordered by time,
+	to a rotating file.
+
+	Records are held for reorderDelay seconds so records of different
+	processes arriving slightly out of order are still written in time order,
+	records arriving later than that are written as soon as they arrive.
+	"""
+
+	def __init__(self, port, path, maxBytes=50 << 20, backupCount=5, reorderDelay=0.5):
+		self.port = port
+		self.path = path
+		self.reorderDelay = reorderDelay
+		self.pending = []
+		self.sequence = 0
+		self.maxBytes = maxBytes
+		self.backupCount = backupCount
+		self.lock = threading.Lock()
+		self.running = False
+		self.fileHandler = None
+		self.server = None
+		self.threads = []
+
+	def start(self):
+		collector = self
+
+		class Handler(socketserver.StreamRequestHandler):
+			def handle(self):
+				for record in readFrames(self.rfile):
+					collector.add(record)
+
+		class Server(socketserver.ThreadingTCPServer):
+			daemon_threads = True
+			allow_reuse_address = False
+
+		# binding fails when another process already hosts the collector
+		self.server = Server(('127.0.0.1', self.port), Handler)
+		os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+		self.fileHandler = RotatingFileHandler(self.path, maxBytes=self.maxBytes, backupCount=self.backupCount, encoding='utf8')
+		self.running = True
+		self.threads = [
+			threading.Thread(target=self.server.serve_forever, daemon=True),
+			threading.Thread(target=self.writeLoop, daemon=True)
+		]
+		for thread in self.threads:
+			thread.start()
+
+	def stop(self):
+		self.running = False
+		if self.server:
+			self.server.shutdown()
+			self.server.server_close()
+		for thread in self.threads:
+			thread.join(2)
+		if self.fileHandler:
+			self.flush(float('inf'))
+			self.fileHandler.close()
+
+	def add(self, record):
+		with self.lock:
+			self.sequence += 1
+			heapq.heappush(self.pending, (record.get('t', 0), self.sequence, record))
+
+	def flush(self, until):
+		lines = []
+		with self.lock:
+			while self.pending and self.pending[0][0] <= until:
+				created, sequence, record = heapq.heappop(self.pending)
+				timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created)) + ',{:03d}'.format(int(created % 1 * 1000))
+				lines.append('{} - PID:{} - {} - {} - {}'.format(timestamp, record.get('pid'), record.get('level'), record.get('name'), record.get('msg')))
+		if lines:
+			logRecord = logging.makeLogRecord({'msg': '\n'.join(lines)})
+			self.fileHandler.emit(logRecord)
+
+	def writeLoop(self):
+		while self.running:
+			time.sleep(self.reorderDelay / 2)
+			self.flush(time.time() - self.reorderDelay)
+
+
+class CollectorHandler(logging.Handler):
+	"""
+	logging.Handler sending records to a LogCollector.
+
+	emit only queues the frame, a sender thread does the network work.
+	When no collector answers, the handler tries to host one itself with
+	hostPath, so the merged log survives the process that hosted it.
+	"""
+
+	def __init__(self, port, hostPath=None, queueSize=10000):
+		super().__init__()
+		self.port = port
+		self.hostPath = hostPath
+		self.frames = queue.Queue(queueSize)
+		self.dropped = 0
+		self.socket = None
+		self.sender = threading.Thread(target=self.sendLoop, daemon=True)
+		self.sender.start()
+
+	def emit(self, record):
+		try:
+			frame = encodeRecord(record.created, record.process, record.name, record.levelname, record.getMessage())
+			self.frames.put_nowait(frame)
+		except queue.Full:
+			self.dropped += 1
+		except Exception:
+			self.handleError(record)
+
+	def connect(self):
+		try:
+			self.socket = socket.create_connection(('127.0.0.1', self.port), timeout=1)
+			return True
+		except OSError:
+			self.socket = None
+		if self.hostPath and self.port not in collectors:
+			try:
+				collector = LogCollector(self.port, self.hostPath)
+				collector.start()
+				collectors[self.port] = collector
+				return self.connect()
+			except OSError:
+				pass
+		return False
+
+	def sendLoop(self):
+		while True:
+			frame = self.frames.get()
+			sent = False
+			while not sent:
+				if self.socket is None and not self.connect():
+					time.sleep(1)
+					continue
+				try:
+					self.socket.sendall(frame)
+					sent = True
+				except OSError:
+					self.socket.close()
+					self.socket = None
+
+	def close(self):
+		if self.socket:
+			self.socket.close()
+			self.socket = None
+		super().close()
+
+
+def getCollectorHandler(port, hostPath=None):
+	"""The CollectorHandler of this process for a port, created on first use."""
+	if port not in handlers:
+		handlers[port] = CollectorHandler(port, hostPath)
+	return handlers[port]
+
+
+if __name__ == '__main__':
+	collector = LogCollector(int(sys.argv[1]), sys.argv[2])
+	collector.start()
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		collector.stop()
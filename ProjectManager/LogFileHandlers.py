@@ -0,0 +1,72 @@
+"""
+Log File Handlers for TouchDesigner
+Author: Arnaud Cassone / CraftKontrol
+The daily rotating file handlers of a process, shared by path, so Logger COMPs
+writing to the same file use a single writer and a single rollover.
+It doesn't depend on TouchDesigner.
+
+The registry lives in this module and not in LoggerExt, so it survives the
+extension being initialized again: a handler left on a logging.Logger by a
+previous LoggerExt is still known here, with its reference.
+"""
+
+import logging
+import os
+import threading
+from logging.handlers import TimedRotatingFileHandler
+
+fileHandlers = {} # normalized absolute path -> [TimedRotatingFileHandler, references]
+fileHandlersLock = threading.Lock()
+
+
+def fileKey(path):
+	return os.path.normcase(os.path.abspath(path))
+
+
+def acquireFileHandler(path, backupCount=0):
+	"""
+	The daily rotating file handler of this process for a path, created on first use.
+	Every call must be paired with a releaseFileHandler.
+	"""
+	key = fileKey(path)
+	with fileHandlersLock:
+		entry = fileHandlers.get(key)
+		if entry is None:
+			fileHandler = TimedRotatingFileHandler(key, when='midnight', backupCount=backupCount, encoding='utf8')
+			fileHandler.suffix = '%Y%m%d-%H%M%S'
+			fileHandler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+			entry = fileHandlers[key] = [fileHandler, 0]
+		entry[0].backupCount = backupCount
+		entry[1] += 1
+		return entry[0]
+
+
+def releaseFileHandler(fileHandler):
+	"""Release a handler from acquireFileHandler, the file is closed with its last reference."""
+	key = fileKey(fileHandler.baseFilename)
+	with fileHandlersLock:
+		entry = fileHandlers.get(key)
+		if entry is None or entry[0] is not fileHandler:
+			fileHandler.close()
+			return
+		entry[1] -= 1
+		if entry[1] <= 0:
+			del fileHandlers[key]
+			fileHandler.close()
+
+
+def isSharedFileHandler(handler):
+	"""True when handler was returned by acquireFileHandler and is still referenced."""
+	path = getattr(handler, 'baseFilename', None)
+	if path is None:
+		return False
+	with fileHandlersLock:
+		entry = fileHandlers.get(fileKey(path))
+		return entry is not None and entry[0] is handler
+
+
+def references(path):
+	"""The number of references to the shared handler of a path, 0 when there is none."""
+	with fileHandlersLock:
+		entry = fileHandlers.get(fileKey(path))
+		return entry[1] if entry else 0
@@ -8,7 +8,10 @@ can be accessed externally, e.g. op('yourComp').PromotedFunction().
 Help: search "Extensions" in wiki
 """
 
+import collections
+import functools
 import inspect
+import json
 import logging
 from logging.handlers import TimedRotatingFileHandler
 import os
@@ -18,8 +21,23 @@ from TDStoreTools import StorageManager
 TDF = op.TDModules.mod.TDFunctions
 import subprocess
 import platform
+import sys
+import threading
+import time
 import requests
 from ckserverapi import CKServerApi
+import LogFileHandlers
+
+
+# optional, logging works without them: the log collector and the metrics
+try:
+	import LogCollector
+except ImportError:
+	LogCollector = None
+try:
+	import Metrics
+except ImportError:
+	Metrics = None
 
 BASE = "https://www.artcraft-zone.com/CK"
 TOKEN_LOG = parent().par.Tokenlog.eval()
@@ -28,6 +46,48 @@ TOKEN_ADMIN = parent().par.Tokenadmin.eval()
 
 client = CKServerApi(BASE, TOKEN_LOG, TOKEN_SYNC, TOKEN_ADMIN)
 
+class Span:
+	"""
+	A timed section of code, used as a context manager or as a decorator.
+	Created with LoggerExt.Span(name), the finished span is added to the Logger trace buffer.
+	"""
+	def __init__(self, loggerExt, name: str):
+		self.loggerExt = loggerExt
+		self.name = name
+		self.start = 0
+		self.frame = 0
+		self.absFrame = 0
+
+	def __enter__(self):
+		if not self.loggerExt.isTracing:
+			self.start = None
+			return self
+		self.frame = self.loggerExt.ownerComp.time.frame
+		self.absFrame = absTime.frame
+		self.loggerExt.spanStack().append(self)
+		self.start = time.perf_counter_ns()
+		return self
+
+	def __exit__(self, *exc):
+		if self.start is None:
+			return False
+		end = time.perf_counter_ns()
+		stack = self.loggerExt.spanStack()
+		slowSpanNs = self.loggerExt.slowSpanNs
+		if slowSpanNs is not None and end - self.start > slowSpanNs:
+			# kept apart from the trace buffer, with the spans it ran in, for the slow frame warning
+			self.loggerExt.SlowSpans.append((end, end - self.start, ' > '.join(span.name for span in stack)))
+		stack.pop()
+		self.loggerExt.TraceEvents.append(('X', self.name, self.start, end - self.start, threading.get_ident(), len(stack), self.frame, self.absFrame))
+		return False
+
+	def __call__(self, fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			with Span(self.loggerExt, self.name):
+				return fn(*args, **kwargs)
+		return wrapper
+
 class LoggerExt:
 	"""
 	LoggerExt description
@@ -57,6 +117,7 @@ class LoggerExt:
 		self.isLoggingToStatusbar = self.ownerComp.par.Logtostatusbar.eval()
 		self.isLoggingToFile = self.ownerComp.par.Logtofile.eval()
 		self.isLoggingToCKServer = self.ownerComp.par.Logtockserver.eval() if hasattr(self.ownerComp.par, 'Logtockserver') else False
+		self.isLoggingToCollector = self.ownerComp.par.Logtocollector.eval() if hasattr(self.ownerComp.par, 'Logtocollector') else False
 		
 		self.logLevels = logging.getLevelNamesMapping()
 
@@ -71,6 +132,11 @@ class LoggerExt:
 
 		self.Origin = self.ownerComp.par.Origin.eval()
 
+		# handlers added by this Logger COMP, kept to avoid scanning logger.handlers
+		self.fileHandler = None # shared with the other Logger COMPs of the same file, see LogFileHandlers
+		self.streamHandler = None
+		self.adoptedLogger = None # the logging.Logger whose handlers were adopted, see adoptHandlers
+
 		loggerNamePar = self.ownerComp.par.Loggername.eval()
 		self.LoggerName = loggerNamePar if loggerNamePar != '' else self.Origin.name
 
@@ -78,7 +144,39 @@ class LoggerExt:
 
 		self.Logger = self.createLogger('TDAppLogger') if self.inTDAppLogger else self.createLogger(self.LoggerName, parent=self.parentLogger) if self.Active else None
 		
-		self.LogsQueue = []
+		# (log method, message) waiting to be logged, bounded so a failing handler can't grow it forever
+		self.LogsQueue = collections.deque(maxlen=1000)
+		self.isDequeuing = False
+
+		self.isTracing = self.ownerComp.par.Tracing.eval() if hasattr(self.ownerComp.par, 'Tracing') else True
+		# finished spans and log messages as tuples, exported as Chrome trace events by ExportTrace
+		self.TraceEvents = collections.deque(maxlen=100000)
+		self.spanStacks = threading.local()
+
+		# frame watchdog, see StartWatchdog
+		self.RecentLogs = collections.deque(maxlen=20)
+		self.lastFrameTime = None
+		self.frameHistogram = [0] * 501 # 1 ms buckets, the last one holds slower frames
+		self.histogramStart = time.perf_counter()
+		self.lastSlowFrameWarning = 0
+		self.suppressedSlowFrames = 0
+		self.slowSpanNs = None # frame budget in ns, spans longer than it are kept in SlowSpans
+		self.SlowSpans = collections.deque(maxlen=20) # (end ns, duration ns, 'outer > span') of the spans over the budget
+
+		# process wide counters and gauges, served by StartMetricsServer
+		self.metrics = Metrics.getRegistry() if Metrics else None
+		if self.metrics:
+			self.metrics.describe('ckui_log_records_total', 'counter', 'Log records by level and logger')
+			self.metrics.describe('ckui_ckserver_failures_total', 'counter', 'CKServer log sends that failed')
+		self.metricsPort = None
+
+		# CKServer identity (device_id, user_id), resolved on first use, see InvalidateCKServerIdentity
+		self.ckServerIdentity = None
+		self.ckServerPrefixes = {} # (level, source) -> "[LEVEL] - LoggerName - source"
+
+		# status bar message of the current frame, written once per frame by flushStatus
+		self.pendingStatus = None # (severity, logItemDict)
+		self.suppressedStatus = 0
 		self.postInit()
 
 	def postInit(self):
@@ -100,6 +198,12 @@ class LoggerExt:
 			self.initLogger()
 			self.dequeueLogs()
 
+			if hasattr(self.ownerComp.par, 'Framewatchdog') and self.ownerComp.par.Framewatchdog.eval():
+				self.StartWatchdog()
+
+			if hasattr(self.ownerComp.par, 'Metricsport') and self.ownerComp.par.Metricsport.eval() > 0:
+				self.StartMetricsServer(self.ownerComp.par.Metricsport.eval())
+
 	def initLogger(self):
 		"""
 		Initialize the logger based on the current configuration of the Logger COMP parameters.
@@ -126,18 +230,24 @@ class LoggerExt:
 				self.Info(f'The logger {loggerName} is a root logger.')
 			else:
 				self.Info(f'The logger {loggerName} was setup with a parent {parentName}. {loggerName} will inherit from parent.')
-		
+
+		if self.adoptedLogger is not self.Logger:
+			self.adoptHandlers()
+
 		if self.isLoggingToTextport:				
 			self.initStreamHandler()
 			
-			if not self.getHandlerByType(self.Logger, logging.StreamHandler):
+			if not self.streamHandler:
 				self.createStreamHandler()
 
 		if self.isLoggingToFile:
 			self.initFileHandler()
 			
-			if not self.getHandlerByType(self.Logger, TimedRotatingFileHandler):
+			if not self.fileHandler:
 				self.createFileHandler()
+
+		if self.isLoggingToCollector:
+			self.createCollectorHandler()
 		
 		self.setPathToLogFile()
 
@@ -176,12 +286,15 @@ class LoggerExt:
 		"""
 		logger = logging.getLogger(loggerName)
 
-		for handler in logger.handlers:
+		for handler in list(logger.handlers):
 			logger.removeHandler(handler)
 
+		self.releaseFileHandler()
+		self.streamHandler = None
+
 		logger.setLevel(logging.NOTSET)
 
-		for filter in logger.filters:
+		for filter in list(logger.filters):
 			logger.removeFilter(filter)
 
 		logger.propagate = False
@@ -214,30 +327,68 @@ class LoggerExt:
 	
 	def createFileHandler(self):
 		"""
-		Create a new Timed Rotating file handler with the valid file path.
+		Add the Timed Rotating file handler of the valid file path to the Logger.
 
-		This also set the formatter as well as add the created handler to the Logger.
+		The handler is shared by every Logger COMP of this process writing to the same file,
+		so a file has a single writer and a single rollover.
 		"""
 		if self.Logger:
-			myFileHandler = TimedRotatingFileHandler(
-				self.getLogFilePath(),
-				when='midnight',
-				backupCount=self.ownerComp.par.Filerotation.eval(),
-				encoding='utf8')
-			myFileHandler.suffix = '%Y%m%d-%H%M%S'
-			fileFormatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-			myFileHandler.setFormatter(fileFormatter)
-			self.Logger.addHandler(myFileHandler)
+			if self.fileHandler:
+				self.deleteFileHandler()
+			self.fileHandler = LogFileHandlers.acquireFileHandler(self.getLogFilePath(), self.ownerComp.par.Filerotation.eval())
+			if self.fileHandler not in self.Logger.handlers:
+				self.Logger.addHandler(self.fileHandler)
 		
 		return
 	
 	def deleteFileHandler(self):
 		"""
-		Remove the current Handler from the Logger.
+		Remove the current Handler from the Logger and release it.
 		"""
-		self.deleteHandlerByType(self.Logger, handlerType=TimedRotatingFileHandler)
+		if self.fileHandler and self.Logger:
+			self.Logger.removeHandler(self.fileHandler)
+		self.releaseFileHandler()
 		return
 
+	def releaseFileHandler(self):
+		"""
+		Release the shared file handler, it is closed with its last reference.
+		"""
+		if not self.fileHandler:
+			return
+		LogFileHandlers.releaseFileHandler(self.fileHandler)
+		self.fileHandler = None
+
+	def adoptHandlers(self):
+		"""
+		Take over the handlers a previous instance of this extension left on the Logger
+		when the extension is initialized again, so they are neither duplicated nor leaked.
+
+		The stream handler and the shared file handler of the current log file are kept
+		as self.streamHandler and self.fileHandler, with the reference the previous instance acquired.
+		The others are removed, and the file handlers released.
+		"""
+		if not self.Logger:
+			return
+		self.adoptedLogger = self.Logger
+		if self.isLoggingToFile and not self.LogFileName:
+			self.setLogFileName()
+		logFileKey = LogFileHandlers.fileKey(self.getLogFilePath()) if self.isLoggingToFile else None
+		for handler in list(self.Logger.handlers):
+			if handler is self.fileHandler or handler is self.streamHandler:
+				continue
+			if LogFileHandlers.isSharedFileHandler(handler):
+				if not self.fileHandler and LogFileHandlers.fileKey(handler.baseFilename) == logFileKey:
+					self.fileHandler = handler
+				else:
+					self.Logger.removeHandler(handler)
+					LogFileHandlers.releaseFileHandler(handler)
+			elif type(handler) is logging.StreamHandler:
+				if not self.streamHandler and self.isLoggingToTextport:
+					self.streamHandler = handler
+				else:
+					self.Logger.removeHandler(handler)
+
 	def initStreamHandler(self):
 		return
 
@@ -253,12 +404,41 @@ class LoggerExt:
 			streamFormatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 			myStreamHandler.setFormatter(streamFormatter)
 			self.Logger.addHandler(myStreamHandler)
+			self.streamHandler = myStreamHandler
 
 	def deleteStreamHanlder(self):
 		"""
 		Remove the current Handler from the Logger.
 		"""
-		self.deleteHandlerByType(self.Logger, handlerType=logging.StreamHandler)
+		if self.streamHandler:
+			if self.Logger:
+				self.Logger.removeHandler(self.streamHandler)
+			self.streamHandler = None
+		return
+
+	def createCollectorHandler(self):
+		"""
+		Add the log collector handler of this process to the Logger.
+
+		Records of every TouchDesigner process of the machine are merged by a single collector
+		in LogFolder/<project>_merged.log. The first process that can't reach a collector hosts it.
+		"""
+		if not LogCollector:
+			self.Warning('Log collector not available, LogCollector could not be imported', withInfos=False)
+			return
+		if self.Logger:
+			port = self.ownerComp.par.Collectorport.eval() if hasattr(self.ownerComp.par, 'Collectorport') else 42200
+			mergedPath = f"{self.LogFolder}/{project.name.split('.')[0]}_merged.log"
+			collectorHandler = LogCollector.getCollectorHandler(port, mergedPath)
+			if collectorHandler not in self.Logger.handlers:
+				self.Logger.addHandler(collectorHandler)
+
+	def deleteCollectorHandler(self):
+		"""
+		Remove the log collector handler from the Logger.
+		"""
+		if LogCollector:
+			self.deleteHandlerByType(self.Logger, handlerType=LogCollector.CollectorHandler)
 		return
 
 	def deleteHandlerByName(self, logger:logging.Logger, handlerName:str):
@@ -271,7 +451,7 @@ class LoggerExt:
 			handlerName (str): The name of the handler to remove.
 		"""
 		if self.Logger:
-			for handler in self.Logger.handlers:
+			for handler in list(self.Logger.handlers):
 				if handler.name == handlerName:
 					self.Logger.removeHandler(handler)
 
@@ -287,7 +467,7 @@ class LoggerExt:
 			handlerType (logging.Handler): Search for handlers of the given handler type.
 		"""
 		if self.Logger:
-			for handler in self.Logger.handlers:
+			for handler in list(self.Logger.handlers):
 				if type(handler) is handlerType:
 					self.Logger.removeHandler(handler)
 
@@ -301,9 +481,12 @@ class LoggerExt:
 		A new handler should be created after calling createFileHandler or similar.
 		"""
 		if self.Logger:
-			for handler in self.Logger.handlers:
+			for handler in list(self.Logger.handlers):
 				self.Logger.removeHandler(handler)
 
+		self.releaseFileHandler()
+		self.streamHandler = None
+
 	#region Main Logging Methods
 	def Log(self, *args, level: str, withInfos: bool = True, **logItemDict: dict) -> None:
 		"""
@@ -344,7 +527,14 @@ class LoggerExt:
 			else:
 				logItemDict['completeInfos'] += f" (absFrame: {logItemDict['absFrame']}, frame: {logItemDict['frame']})"
 
-			if self.LogsQueue:
+			self.RecentLogs.append(f"{logItemDict['level']} - {logItemDict['message']}")
+			if self.metrics:
+				self.metrics.inc('ckui_log_records_total', (('level', level), ('logger', self.LoggerName)))
+
+			if self.isTracing:
+				self.TraceEvents.append(('i', logItemDict['message'], time.perf_counter_ns(), 0, threading.get_ident(), logItemDict['level'], logItemDict['frame'], logItemDict['absFrame']))
+
+			if self.LogsQueue and not self.isDequeuing:
 				self.dequeueLogs()
 
 			self.logWithHandlers(logItemDict)
@@ -411,6 +601,226 @@ class LoggerExt:
 		self.Log(*args, level='CRITICAL', withInfos=withInfos)
 		return
 
+	def Span(self, name: str) -> Span:
+		"""Time a section of code, lined up with the log messages in the exported trace.
+
+		Use it as a context manager, `with op.Logger.Span('name'):`,
+		or as a decorator, `@op.Logger.Span('name')`.
+
+		Args:
+			name (str): The name of the span in the trace.
+
+		Returns:
+			Span: The span, it records nothing while tracing is off.
+		"""
+		return Span(self, name)
+
+	def spanStack(self) -> list:
+		"""
+		The spans currently open on the calling thread, innermost last.
+		"""
+		if not hasattr(self.spanStacks, 'stack'):
+			self.spanStacks.stack = []
+		return self.spanStacks.stack
+
+	def ExportTrace(self, path: str = '') -> str:
+		"""
+		Export the spans and log messages in the Chrome trace event format,
+		to be opened in chrome://tracing or ui.perfetto.dev.
+
+		Args:
+			path (str, optional): The json file to write. Defaults to LogFolder/<LoggerName>_trace.json.
+
+		Returns:
+			str: The path of the written file.
+		"""
+		path = path or f'{self.LogFolder}/{self.LoggerName}_trace.json'
+		pid = os.getpid()
+		events = []
+		for phase, name, start, duration, tid, extra, frame, absFrame in list(self.TraceEvents):
+			if phase == 'X':
+				events.append({'name': name, 'cat': 'span', 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000, 'pid': pid, 'tid': tid,
+					'args': {'depth': extra, 'frame': frame, 'absFrame': absFrame}})
+			else:
+				events.append({'name': name[:200], 'cat': 'log', 'ph': 'i', 's': 't', 'ts': start / 1000, 'pid': pid, 'tid': tid,
+					'args': {'level': extra, 'frame': frame, 'absFrame': absFrame}})
+
+		self.createLogFolder(os.path.dirname(path))
+		with open(path, 'w', encoding='utf8') as traceFile:
+			json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, traceFile)
+		self.Info(f'Trace exported with {len(events)} events to {path}')
+		return path
+
+	def ClearTrace(self) -> None:
+		"""
+		Empty the trace buffer.
+		"""
+		self.TraceEvents.clear()
+
+	def StartWatchdog(self) -> None:
+		"""
+		Call FrameTick every frame, slow frames get logged with their context.
+		FrameTick can also be called from an Execute DAT onFrameStart instead.
+		"""
+		self.StopWatchdog()
+		self.lastFrameTime = None
+		run("args[0]()", self.watchdogLoop, delayFrames=1, group='LoggerWatchdog')
+
+	def StopWatchdog(self) -> None:
+		for r in runs:
+			if r.group == 'LoggerWatchdog':
+				r.kill()
+
+	def watchdogLoop(self):
+		self.FrameTick()
+		run("args[0]()", self.watchdogLoop, delayFrames=1, group='LoggerWatchdog')
+
+	def FrameTick(self) -> None:
+		"""
+		Measure the time since the previous frame and add it to the frame time histogram.
+
+		A frame over the budget (Framebudget parameter in ms, 2 frames by default) logs a single WARNING
+		with the recent log messages and the spans of that frame (when tracing), at most every Watchdoginterval seconds.
+		Spans longer than the budget are reported with the spans they ran in.
+		Every minute the p50/p95/p99 frame times are logged.
+		"""
+		now = time.perf_counter()
+		previous = self.lastFrameTime
+		self.lastFrameTime = now
+		budget = self.ownerComp.par.Framebudget.eval() if hasattr(self.ownerComp.par, 'Framebudget') else 2000 / project.cookRate
+		self.slowSpanNs = int(budget * 1e6)
+		if previous is None:
+			return
+
+		frameMs = (now - previous) * 1000
+		self.frameHistogram[min(int(frameMs), 500)] += 1
+
+		if frameMs > budget:
+			interval = self.ownerComp.par.Watchdoginterval.eval() if hasattr(self.ownerComp.par, 'Watchdoginterval') else 10
+			if now - self.lastSlowFrameWarning < interval:
+				self.suppressedSlowFrames += 1
+			else:
+				self.lastSlowFrameWarning = now
+				self.logSlowFrame(frameMs, budget, int(previous * 1e9))
+
+		if now - self.histogramStart >= 60:
+			self.logFramePercentiles()
+			self.frameHistogram = [0] * 501
+			self.histogramStart = now
+
+	def logSlowFrame(self, frameMs: float, budget: float, frameStartNs: int):
+		"""
+		Log a slow frame with the recent log messages, the longest spans that ran during it
+		and the spans over the budget with the spans that were open around them.
+
+		The watchdog runs between frames, when no span is open on the main thread,
+		so the open spans are the ones recorded by Span when a span over the budget ended.
+		"""
+		spans = []
+		# Events are appended when they end, so walk back until one ended before the frame,
+		# a span that started before the frame but ended during it still counts
+		for event in reversed(self.TraceEvents):
+			if event[2] + event[3] < frameStartNs:
+				break
+			if event[0] == 'X':
+				spans.append((event[3], event[1]))
+		spans = sorted(spans, reverse=True)[:5]
+		slowSpans = sorted(((duration, path) for end, duration, path in self.SlowSpans if end >= frameStartNs), reverse=True)[:5]
+
+		message = f'Slow frame: {frameMs:.1f} ms (budget {budget:.1f} ms)'
+		if self.suppressedSlowFrames:
+			message += f', {self.suppressedSlowFrames} slow frames since the previous warning'
+		if spans:
+			message += '\nSpans: ' + ', '.join(f'{name} {duration / 1e6:.1f} ms' for duration, name in spans)
+		if slowSpans:
+			message += '\nSpans over the budget: ' + ', '.join(f'{path} {duration / 1e6:.1f} ms' for duration, path in slowSpans)
+		if self.RecentLogs:
+			message += '\nRecent logs:\n  ' + '\n  '.join(self.RecentLogs)
+		self.suppressedSlowFrames = 0
+		self.Warning(message, withInfos=False)
+
+	def logFramePercentiles(self):
+		"""
+		Log the p50/p95/p99 frame times of the histogram.
+		"""
+		total = sum(self.frameHistogram)
+		if not total:
+			return
+		percentiles = {}
+		targets = [(50, total * 0.5), (95, total * 0.95), (99, total * 0.99)]
+		count = 0
+		for bucket, frames in enumerate(self.frameHistogram):
+			count += frames
+			while targets and count >= targets[0][1]:
+				percentiles[targets.pop(0)[0]] = bucket
+		self.Info(f"Frame times over the last minute ({total} frames): p50 {percentiles[50]} ms, p95 {percentiles[95]} ms, p99 {percentiles[99]} ms", withInfos=False)
+
+	def StartMetricsServer(self, port: int) -> None:
+		"""
+		Serve the metrics of this process at http://<host>:<port>/metrics in the Prometheus text format.
+		The server runs on a background thread and is shared by the loggers using the same port.
+
+		Args:
+			port (int): The HTTP port.
+		"""
+		self.StopMetricsServer()
+		if not Metrics:
+			self.Warning('Metrics not available, Metrics could not be imported', withInfos=False)
+			return
+		try:
+			Metrics.startServer(port)
+			self.metricsPort = port
+			self.Info(f'Metrics served on port {port}', withInfos=False)
+		except OSError as err:
+			self.Error(f'Could not serve metrics on port {port}: {err}', withInfos=False)
+
+	def StopMetricsServer(self) -> None:
+		if self.metricsPort is not None:
+			Metrics.stopServer(self.metricsPort)
+			self.metricsPort = None
+
+	def IncMetric(self, name: str, value: float = 1, **labels) -> None:
+		"""
+		Add a value to a counter.
+
+		Args:
+			name (str): The metric name, e.g. ckui_snapshots_total.
+			value (float): The increment. Defaults to 1.
+			**labels: The metric labels.
+		"""
+		if not self.metrics:
+			return
+		self.metrics.describe(name, 'counter')
+		self.metrics.inc(name, tuple(labels.items()), value)
+
+	def SetMetric(self, name: str, value: float, **labels) -> None:
+		"""
+		Set the value of a gauge.
+
+		Args:
+			name (str): The metric name, e.g. ckui_cluster_nodes.
+			value (float): The gauge value.
+			**labels: The metric labels.
+		"""
+		if not self.metrics:
+			return
+		self.metrics.describe(name, 'gauge')
+		self.metrics.set(name, value, tuple(labels.items()))
+
+	def SetMetricState(self, name: str, state: str, **labels) -> None:
+		"""
+		Set the current state of a status gauge, exposed as name{labels,status="state"} 1.
+
+		Args:
+			name (str): The metric name, e.g. ckui_state.
+			state (str): The current status.
+			**labels: The metric labels.
+		"""
+		if not self.metrics:
+			return
+		self.metrics.describe(name, 'gauge')
+		self.metrics.setState(name, str(state), tuple(labels.items()))
+
 	def logWithHandlers(self, logItemDict: dict) -> None:
 		"""
 		Using the logItemDict prepared in the Log method,
@@ -433,8 +843,12 @@ class LoggerExt:
 		try:
 			getattr(self.Logger, logFn.lower())(logMsg)
 		except Exception as err:
+			if self.isDequeuing:
+				# a queued log failed again, it is dropped so the queue can't feed itself
+				return
+			levelMethods = {'DEBUG': self.Debug, 'INFO': self.Info, 'WARNING': self.Warning, 'ERROR': self.Error, 'CRITICAL': self.Critical}
 			self.LogsQueue.append((self.Error, f'An error occured while trying to log with handlers. {err}.'))
-			self.LogsQueue.append((getattr(self, logFn), logMsg))
+			self.LogsQueue.append((levelMethods.get(logFn.upper(), self.Info), logMsg))
 		
 		return
 
@@ -443,10 +857,33 @@ class LoggerExt:
 		Using the logItemDict prepared in the Log method,
 		pass the message to the statusbar using ui.status.
 
+		The statusbar is updated at most once per frame, with the most severe message
+		of the frame and the number of messages it replaced.
+
 		Args:
 			logItemDict (dict): A dictionnary holding all the required informations for the formatting of the log message.
 		"""
-		ui.status = f"{logItemDict['level']} - {logItemDict['source']} - {logItemDict['message']}{logItemDict['completeInfos']}"
+		severity = self.logLevels.get(logItemDict['level'], 0)
+		if self.pendingStatus is None:
+			self.pendingStatus = (severity, logItemDict)
+			run("args[0]()", self.flushStatus, delayFrames=1, group='LoggerStatus')
+			return
+
+		self.suppressedStatus += 1
+		if severity >= self.pendingStatus[0]:
+			self.pendingStatus = (severity, logItemDict)
+		return
+
+	def flushStatus(self) -> None:
+		if self.pendingStatus is None:
+			return
+		logItemDict = self.pendingStatus[1]
+		status = f"{logItemDict['level']} - {logItemDict['source']} - {logItemDict['message']}{logItemDict['completeInfos']}"
+		if self.suppressedStatus:
+			status += f" (+{self.suppressedStatus} more)"
+		self.pendingStatus = None
+		self.suppressedStatus = 0
+		ui.status = status
 		return
 
 	def logToCKServer(self, logItemDict: dict) -> None:
@@ -462,24 +899,20 @@ class LoggerExt:
 			return
 			
 		try:
-			# Get device_id and user_id from StateMachine if available
-			device_id = op.StateMachine.ClientId if hasattr(op, 'StateMachine') and hasattr(op.StateMachine, 'ClientId') else f"{project.name.split('.')[0]}"
-			user_id = op.StateMachine.Payload if hasattr(op, 'StateMachine') and hasattr(op.StateMachine, 'Payload') else ""
-			
-			# Format log message: [LEVEL] logger_name - message (file:line)
-			log_parts = [f"[{logItemDict['level']}]", self.LoggerName]
-			
-			if logItemDict['source']:
-				log_parts.append(logItemDict['source'])
-			
-			log_parts.append(logItemDict['message'])
-			
-			# Add stack info if available
-			if logItemDict['stackInfos']:
-				stack_info = f"({logItemDict['stackInfos']['fileName']}:{logItemDict['stackInfos']['ln']})"
-				log_parts.append(stack_info)
-			
-			log_message = " - ".join(log_parts)
+			device_id, user_id = self.ckServerIdentity or self.resolveCKServerIdentity()
+
+			# Format log message: [LEVEL] logger_name - source - message - (file:line)
+			prefixKey = (logItemDict['level'], logItemDict['source'])
+			prefix = self.ckServerPrefixes.get(prefixKey)
+			if prefix is None:
+				prefix = f"[{logItemDict['level']}] - {self.LoggerName}" + (f" - {logItemDict['source']}" if logItemDict['source'] else "")
+				self.ckServerPrefixes[prefixKey] = prefix
+
+			stackInfos = logItemDict['stackInfos']
+			if stackInfos:
+				log_message = " - ".join((prefix, logItemDict['message'], f"({stackInfos['fileName']}:{stackInfos['ln']})"))
+			else:
+				log_message = " - ".join((prefix, logItemDict['message']))
 			
 			# Map TD log level to lowercase
 			level = logItemDict['level'].lower()
@@ -494,11 +927,13 @@ class LoggerExt:
 				)
 				
 				if not result.get('ok'):
+					self.countCKServerFailure('rejected')
 					self._ckserver_error_logged = True
 					print(f"CKServer logging failed: {result.get('error', result.get('message', 'Unknown error'))}")
 					self._ckserver_error_logged = False
 					
 			except requests.exceptions.HTTPError as http_err:
+				self.countCKServerFailure('http')
 				self._ckserver_error_logged = True
 				#print(f"CKServer HTTP error: {http_err.response.status_code} - {http_err.response.reason}")
 				try:
@@ -509,18 +944,42 @@ class LoggerExt:
 				self._ckserver_error_logged = False
 				
 			except requests.exceptions.RequestException as req_err:
+				self.countCKServerFailure('request')
 				self._ckserver_error_logged = True
 				print(f"CKServer request error: {req_err}")
 				self._ckserver_error_logged = False
 				
 		except Exception as err:
 			# Catch-all for unexpected errors
+			self.countCKServerFailure('error')
 			self._ckserver_error_logged = True
 			print(f"Unexpected error in CKServer logging: {err}")
 			self._ckserver_error_logged = False
 		
 		return
 
+	def countCKServerFailure(self, reason: str) -> None:
+		if self.metrics:
+			self.metrics.inc('ckui_ckserver_failures_total', (('reason', reason),))
+
+	def resolveCKServerIdentity(self) -> tuple:
+		"""
+		Get device_id and user_id from StateMachine if available, and keep them until InvalidateCKServerIdentity.
+		"""
+		device_id = op.StateMachine.ClientId if hasattr(op, 'StateMachine') and hasattr(op.StateMachine, 'ClientId') else f"{project.name.split('.')[0]}"
+		user_id = op.StateMachine.Payload if hasattr(op, 'StateMachine') and hasattr(op.StateMachine, 'Payload') else ""
+		self.ckServerIdentity = (device_id, user_id)
+		return self.ckServerIdentity
+
+	def InvalidateCKServerIdentity(self) -> None:
+		"""
+		Resolve the CKServer device_id and user_id again on the next message.
+
+		StateMachine calls op.Logger.InvalidateCKServerIdentity() once it is started
+		and whenever its ClientId or Payload changes, messages logged before use the project name.
+		"""
+		self.ckServerIdentity = None
+
 	def getStackInfos(self, stackOffset:int=2) -> dict:
 		"""
 		A method going back up the stack frames to get informations about the original calling method.
@@ -601,19 +1060,12 @@ class LoggerExt:
 		to a parent logger, and this method attempt to find the path to a parent logger
 		file handler.
 		"""
-		if self.Logger and self.Logger.hasHandlers and self.isLoggingToFile:
-			fileHandlers = self.getHandlerByType(self.Logger, TimedRotatingFileHandler)
-			nbFileHandlers = len(fileHandlers)
-
-			if nbFileHandlers > 1:
-				self.Warning(f'{self.Logger.name} has more than 1 file handler, this could cause unexpected behaviors.')
-			elif not nbFileHandlers:
+		if self.Logger and self.isLoggingToFile:
+			if not self.fileHandler:
 				self.Warning(f'{self.Logger.name} has no file handler.')
 				return
 
-			myFileHandler = fileHandlers[0]
-			if myFileHandler:
-				self.ownerComp.par.Pathtologfile = myFileHandler.baseFilename
+			self.ownerComp.par.Pathtologfile = self.fileHandler.baseFilename
 
 		elif self.Logger:
 			parentHandler = self.getParentHandler(self.Logger, TimedRotatingFileHandler)
@@ -632,18 +1084,19 @@ class LoggerExt:
 
 		Args:
 			logger (logging.Logger): The logger with a potential parent.
+			handlerType (logging.Handler, optional): The type of handler to search for. Defaults to None.
 
 		Returns:
 			Optional[TimedRotatingFileHandler]: Returns a potential file handler.
 		"""
-		if logger and logger.parent:
-			parentLogger = logger.parent
+		parentLogger = logger.parent if logger else None
 
+		while parentLogger:
 			for handler in parentLogger.handlers:
 				if type(handler) is handlerType:
 					return handler
 
-			self.getParentHandler(parentLogger)
+			parentLogger = parentLogger.parent
 		
 		return None
 	
@@ -706,11 +1159,20 @@ class LoggerExt:
 
 	def dequeueLogs(self):
 		"""
-		Process logs that were queued.
+		Process logs that were queued, oldest first.
+
+		The queued calls go through Log again, a queued log that fails
+		again is dropped instead of being queued so a failing handler can't loop here.
 		"""
-		for log in self.LogsQueue:
-			log[0](log[1])
-			self.LogsQueue.remove(log)
+		if self.isDequeuing:
+			return
+		self.isDequeuing = True
+		try:
+			for _ in range(len(self.LogsQueue)):
+				logFn, message = self.LogsQueue.popleft()
+				logFn(message)
+		finally:
+			self.isDequeuing = False
 
 	def getHandlerByName(self, logger:logging.Logger, handlerName:str) -> logging.Handler|None:
 		"""
@@ -772,6 +1234,14 @@ class LoggerExt:
 		Log app errors (light impact)
 		Log to textport (light impact)
 		Log to status bar (light impact)
+		Log to collector
+			add or remove the collector handler
+		Tracing (light impact)
+			spans and log messages are recorded for ExportTrace
+		Frame watchdog
+			start or stop the frame watchdog
+		Metrics port
+			serve the metrics on the new port, 0 stops the server
 		Logger name change
 			init or delete logger
 			set path to log file
@@ -838,6 +1308,7 @@ class LoggerExt:
 			self.deleteLogger(self.LoggerName)
 			
 		self.LoggerName = par.eval()
+		self.ckServerPrefixes = {}
 		
 		self.setLogFileName()
 
@@ -853,7 +1324,7 @@ class LoggerExt:
 			return
 
 		if self.isLoggingToTextport:
-			if self.Logger.hasHandlers and self.getHandlerByType(self.Logger, logging.StreamHandler):
+			if self.streamHandler:
 				self.deleteStreamHanlder()			
 
 			self.initStreamHandler()
@@ -871,7 +1342,7 @@ class LoggerExt:
 			return
 
 		if self.isLoggingToFile:
-			if self.Logger.hasHandlers and self.getHandlerByType(self.Logger, TimedRotatingFileHandler):
+			if self.fileHandler:
 				self.deleteFileHandler()
 			
 			self.initFileHandler()
@@ -883,11 +1354,43 @@ class LoggerExt:
 		self.setPathToLogFile()
 		return
 
+	def OnLogtocollectorChange(self, par, prev):
+		self.isLoggingToCollector = par.eval()
+
+		if not self.Logger:
+			return
+
+		if self.isLoggingToCollector:
+			self.createCollectorHandler()
+		elif prev:
+			self.deleteCollectorHandler()
+
+		return
+
+	def OnFramewatchdogChange(self, par, prev):
+		if par.eval():
+			self.StartWatchdog()
+		else:
+			self.StopWatchdog()
+		return
+
+	def OnMetricsportChange(self, par, prev):
+		if par.eval() > 0:
+			self.StartMetricsServer(par.eval())
+		else:
+			self.StopMetricsServer()
+		return
+
+	def OnTracingChange(self, par, prev):
+		self.isTracing = par.eval()
+		return
+
 	def OnLogtockserverChange(self, par, prev):
 		"""Handle CKServer logging toggle."""
 		self.isLoggingToCKServer = par.eval()
 		
 		if self.isLoggingToCKServer:
+			self.InvalidateCKServerIdentity()
 			self.Info('CKServer remote logging enabled')
 			# Test connection
 			try:
@@ -913,7 +1416,7 @@ class LoggerExt:
 		if self.isLoggingToFile:
 			return
 
-		if self.Logger and self.Logger.hasHandlers and self.getHandlerByType(self.Logger, TimedRotatingFileHandler):
+		if self.fileHandler:
 			self.deleteFileHandler()
 
 		self.setLogFolder()
@@ -946,7 +1449,7 @@ class LoggerExt:
 
 		self.Info(f'Logger file name will be changed from {prevFileName} to {self.LogFileName}')
 		
-		if self.Logger.hasHandlers and self.getHandlerByType(self.Logger, TimedRotatingFileHandler):
+		if self.fileHandler:
 			self.deleteFileHandler()
 		
 		self.initFileHandler()	
@@ -984,7 +1487,7 @@ class LoggerExt:
 				subprocess.Popen(["open", str(pathToFile)])
 
 	def OnFilerotationChange(self, par, prev):
-		if self.Logger.hasHandlers and self.getHandlerByType(self.Logger, TimedRotatingFileHandler):
+		if self.fileHandler:
 			self.deleteFileHandler()
 			self.createFileHandler()
 
@@ -0,0 +1,158 @@
+"""
+Metrics for TouchDesigner
+Author: Arnaud Cassone / CraftKontrol
+Counters and gauges of a process, served over HTTP in the Prometheus text
+exposition format. It doesn't depend on TouchDesigner.
+
+The registry keeps the rendered page as bytes and only renders it again after
+a value changed, so a scrape doesn't allocate anything.
+"""
+
+import http.server
+import threading
+
+registry = None # MetricsRegistry shared by the loggers of this process
+servers = {} # port -> MetricsServer hosted by this process
+
+
+def escapeLabel(value):
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def formatLabels(labels):
+	if not labels:
+		return ''
+	return '{' + ','.join('{}="{}"'.format(key, escapeLabel(value)) for key, value in labels) + '}'
+
+
+class MetricsRegistry:
+	"""
+	Counters and gauges identified by a name and a tuple of (label, value) pairs.
+
+	States are gauges holding the current value of a status as a label, e.g.
+	ckui_library_status{library="CKUI",status="Ready"} 1, setting a new state
+	removes the previous one.
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.metrics = {} # name -> (type, help)
+		self.values = {} # name -> {labels: value}
+		self.page = b''
+		self.dirty = True
+
+	def describe(self, name, metricType, help=''):
+		with self.lock:
+			if name not in self.metrics:
+				self.metrics[name] = (metricType, help)
+				self.values.setdefault(name, {})
+				self.dirty = True
+
+	def inc(self, name, labels=(), value=1):
+		with self.lock:
+			values = self.values.setdefault(name, {})
+			values[labels] = values.get(labels, 0) + value
+			self.dirty = True
+
+	def set(self, name, value, labels=()):
+		with self.lock:
+			values = self.values.setdefault(name, {})
+			if values.get(labels) != value:
+				values[labels] = value
+				self.dirty = True
+
+	def setState(self, name, state, labels=()):
+		stateLabels = labels + (('status', state),)
+		with self.lock:
+			values = self.values.setdefault(name, {})
+			if values.get(stateLabels) == 1:
+				return
+			for key in [key for key in values if key[:-1] == labels]:
+				del values[key]
+			values[stateLabels] = 1
+			self.dirty = True
+
+	def render(self):
+		"""The exposition page as bytes, rendered again only when a value changed."""
+		with self.lock:
+			if not self.dirty:
+				return self.page
+			lines = []
+			for name in sorted(self.values):
+				metricType, help = self.metrics.get(name, ('untyped', ''))
+				if help:
+					lines.append('# HELP {} {}'.format(name, help))
+				lines.append('# TYPE {} {}'.format(name, metricType))
+				for labels, value in sorted(self.values[name].items()):
+					lines.append('{}{} {}'.format(name, formatLabels(labels), value))
+			self.page = ('\n'.join(lines) + '\n').encode('utf-8')
+			self.dirty = False
+			return self.page
+
+
+class MetricsServer:
+	"""
+	HTTP server answering GET /metrics with the registry page on a background thread.
+	"""
+
+	def __init__(self, port, metricsRegistry, host='0.0.0.0'):
+		self.port = port
+		self.host = host
+		self.registry = metricsRegistry
+		self.server = None
+		self.thread = None
+
+	def start(self):
+		metricsRegistry = self.registry
+
+		class Handler(http.server.BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path.split('?')[0] not in ('/', '/metrics'):
+					self.send_error(404)
+					return
+				page = metricsRegistry.render()
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+				self.send_header('Content-Length', str(len(page)))
+				self.end_headers()
+				self.wfile.write(page)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+		self.server.daemon_threads = True
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		if self.server:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+		if self.thread:
+			self.thread.join(2)
+			self.thread = None
+
+
+def getRegistry():
+	"""The MetricsRegistry of this process, created on first use."""
+	global registry
+	if registry is None:
+		registry = MetricsRegistry()
+	return registry
+
+
+def startServer(port):
+	"""Serve the registry of this process on a port, once per port."""
+	if port not in servers:
+		server = MetricsServer(port, getRegistry())
+		server.start()
+		servers[port] = server
+	return servers[port]
+
+
+def stopServer(port):
+	server = servers.pop(port, None)
+	if server:
+		server.stop()
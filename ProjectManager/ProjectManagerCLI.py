@@ -0,0 +1,275 @@
+"""
+Project Manager command line
+Author: Arnaud Cassone / CraftKontrol
+Runs the Project Manager setup stages on a project folder without TouchDesigner,
+so show machines can be provisioned before the project is opened. Opening the
+project then only verifies what is already there.
+
+Stages: template, config, gitignore, libraries, venv, requirements, assets.
+The project template is written first, then the independent stages run
+in parallel, requirements waits for venv.
+A json report is written to <project>/provision_report.json.
+
+python ProjectManagerCLI.py <project folder> --libraries <folder> --venv <folder> --python <python.exe>
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ProjectUtils
+
+STAGES = ('template', 'config', 'gitignore', 'libraries', 'venv', 'requirements', 'assets')
+
+# stage -> stages it waits for
+DEPENDENCIES = {
+	'config': ('template',),
+	'gitignore': ('template',),
+	'libraries': ('template',),
+	'venv': ('template',),
+	'requirements': ('template', 'venv'),
+	'assets': ('template',)
+}
+
+
+class Skipped(Exception):
+	"""Raised by a stage that has nothing to do with the given arguments."""
+
+
+class Provisioner:
+	"""
+	The Project Manager stages for a project folder, see ProjectManagerExt for the same stages inside TouchDesigner.
+	"""
+
+	def __init__(self, args):
+		self.args = args
+		self.projectFolder = os.path.abspath(args.project)
+		self.projectName = args.name or self.findProjectName()
+		self.configPath = os.path.join(self.projectFolder, 'config.json')
+		self.templateLibraries = None # libraries listed by the applied template
+		self.venvFolder = ''
+		if args.venv:
+			self.venvFolder = args.venv if os.path.isabs(args.venv) else os.path.abspath(os.path.join(self.projectFolder, args.venv))
+
+	def findProjectName(self):
+		# name of the project .toe, without its iteration number
+		toeFiles = sorted(glob.glob(os.path.join(self.projectFolder, '*.toe')))
+		if toeFiles:
+			return os.path.basename(toeFiles[0]).split('.')[0].strip()
+		return os.path.basename(self.projectFolder)
+
+	def readConfig(self):
+		if not os.path.exists(self.configPath):
+			return {}
+		with open(self.configPath, 'r') as configFile:
+			return json.load(configFile)
+
+	def getLibrariesFolder(self):
+		# --libraries, or ToolsPath of an existing config.json (one written by the template stage,
+		# the config stage runs in parallel and only writes --libraries)
+		return self.args.libraries or self.readConfig().get('ToolsPath', '')
+
+	def stageTemplate(self):
+		if not self.args.template:
+			raise Skipped('no project template, use --template')
+		templatesFolder = self.args.templates or os.getenv('CKUI_TEMPLATES', '') or ProjectUtils.machineCacheFolder('TemplateArchives')
+		archivePath = ProjectUtils.projectTemplateArchive(templatesFolder, self.args.template)
+		if not archivePath:
+			raise RuntimeError('project template {} not found in {}'.format(self.args.template, templatesFolder))
+		templateFolder, manifest = ProjectUtils.extractProjectTemplate(archivePath)
+		values = {
+			"ProjectName": self.projectName,
+			"ProjectFolder": self.projectFolder,
+			"LibrariesFolder": self.args.libraries or '',
+			"TouchDesignerVersion": '',
+			"Date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		}
+		summary = ProjectUtils.materializeTemplate(templateFolder, self.projectFolder, values, link=not self.args.copy)
+		self.templateLibraries = [name for name in manifest.get('Libraries', []) if name in ProjectUtils.LIBRARIES]
+		return dict(summary, Name=manifest['Name'], Version=manifest['Version'])
+
+	def stageConfig(self):
+		if self.readConfig():
+			return {'Status': 'Exists', 'Path': self.configPath}
+		# same content as the config TouchDesigner writes, it fills in TouchDesignerVersion on open
+		logPath = self.projectFolder.replace('\\', '/') + '/' + ProjectUtils.PROJECT_LOG_FOLDER
+		config = ProjectUtils.projectConfig(self.projectName, self.args.libraries or '', logPath)
+		ProjectUtils.writeJsonAtomic(self.configPath, config)
+		return {'Status': 'Created', 'Path': self.configPath}
+
+	def stageGitignore(self):
+		created = ProjectUtils.writeGitignore(self.projectFolder, self.projectName)
+		return {'Status': 'Created' if created else 'Exists'}
+
+	def stageLibraries(self):
+		librariesFolder = self.getLibrariesFolder()
+		if not librariesFolder:
+			raise Skipped('no Libraries folder, use --libraries or set ToolsPath in config.json')
+		names = self.args.library or self.templateLibraries or list(ProjectUtils.LIBRARIES)
+		with ThreadPoolExecutor(max_workers=len(names)) as executor:
+			futures = {name: executor.submit(ProjectUtils.cloneLibrary, librariesFolder, name, self.args.update) for name in names}
+		results = {}
+		for name, future in futures.items():
+			try:
+				results[name] = future.result()
+			except Exception as e:
+				results[name] = 'Failed: {}'.format(e)
+		failed = [name for name, status in results.items() if status.startswith('Failed')]
+		if failed:
+			raise RuntimeError('{} failed: {}'.format(', '.join(failed), results))
+		return results
+
+	def getTemplateFolder(self, pythonHome):
+		if self.args.no_templates:
+			return None
+		requirementsPath = self.getRequirementsPath()
+		requirementsHash = ProjectUtils.hashFile(requirementsPath) if os.path.exists(requirementsPath) else ''
+		return ProjectUtils.venvTemplateFolder(pythonHome, requirementsHash)
+
+	def getRequirementsPath(self):
+		return os.path.join(self.projectFolder, 'Assets', 'Python', 'requirements.txt')
+
+	def stageVenv(self):
+		if not self.venvFolder:
+			raise Skipped('no venv folder, use --venv')
+		if os.path.exists(self.venvFolder):
+			return {'Status': 'Exists', 'Path': self.venvFolder}
+		pythonExe = self.args.python or ProjectUtils.findBasePython(self.args.python_version or '')
+		if not pythonExe or not os.path.exists(pythonExe):
+			raise RuntimeError('base python not found, use --python or --python-version')
+		templateFolder = self.getTemplateFolder(os.path.dirname(pythonExe))
+		status = ProjectUtils.createVenv(pythonExe, self.venvFolder, templateFolder)
+		return {'Status': status, 'Path': self.venvFolder}
+
+	def stageRequirements(self):
+		requirementsPath = self.getRequirementsPath()
+		if not self.venvFolder:
+			raise Skipped('no venv folder, use --venv')
+		if not os.path.exists(requirementsPath):
+			raise Skipped('no requirements.txt at {}'.format(requirementsPath))
+		pythonExe = ProjectUtils.findVenvPython(self.venvFolder)
+		if not pythonExe:
+			raise RuntimeError('python executable not found in venv at {}'.format(self.venvFolder))
+
+		wheelhouse = self.args.wheelhouse or os.getenv('CKUI_WHEELHOUSE', '') or os.path.join(self.projectFolder, 'Assets', 'Python', 'wheels')
+		lockPath = os.path.join(self.projectFolder, 'Assets', 'Python', 'requirements.lock.json')
+		result = ProjectUtils.installRequirements(pythonExe, requirementsPath, lockPath, ProjectUtils.wheelhouseArgs(wheelhouse, self.args.offline), self.args.force)
+
+		pythonHome = ProjectUtils.readPyvenvCfg(self.venvFolder).get('home')
+		templateFolder = self.getTemplateFolder(pythonHome) if pythonHome else None
+		if result['Status'] == 'Installed' and templateFolder and not ProjectUtils.isTemplateReady(templateFolder):
+			ProjectUtils.saveVenvTemplate(self.venvFolder, templateFolder, pythonHome)
+			result['Template'] = templateFolder
+		return result
+
+	def stageAssets(self):
+		exclude = list(ProjectUtils.PROJECT_EXCLUDES)
+		if self.venvFolder and self.venvFolder.startswith(self.projectFolder):
+			exclude.append(os.path.relpath(self.venvFolder, self.projectFolder))
+		with ProjectUtils.AssetIndex(os.path.join(self.projectFolder, 'AssetIndex.db')) as assetIndex:
+			return assetIndex.scan(self.projectFolder, exclude)
+
+	def runStage(self, stage):
+		start = time.perf_counter()
+		report = {}
+		try:
+			report['Result'] = getattr(self, 'stage' + stage.capitalize())()
+			report['Status'] = 'Done'
+		except Skipped as e:
+			report['Status'] = 'Skipped'
+			report['Reason'] = str(e)
+		except Exception as e:
+			report['Status'] = 'Failed'
+			stderr = getattr(e, 'stderr', None)
+			if isinstance(stderr, bytes):
+				stderr = stderr.decode(errors='replace')
+			report['Error'] = '{}: {}'.format(type(e).__name__, (stderr or '').strip() or e)
+		report['Seconds'] = round(time.perf_counter() - start, 3)
+		return report
+
+	def run(self, stages):
+		"""
+		Run the stages, each one as soon as the stages it waits for are done.
+
+		Returns:
+			dict: The provisioning report.
+		"""
+		start = time.perf_counter()
+		results = {}
+		pending = [stage for stage in STAGES if stage in stages]
+		running = {}
+		with ThreadPoolExecutor(max_workers=len(pending) or 1) as executor:
+			while pending or running:
+				for stage in list(pending):
+					dependencies = [dependency for dependency in DEPENDENCIES.get(stage, ()) if dependency in stages]
+					if any(dependency not in results for dependency in dependencies):
+						continue
+					pending.remove(stage)
+					failed = [dependency for dependency in dependencies if results[dependency]['Status'] == 'Failed']
+					if failed:
+						results[stage] = {'Status': 'Skipped', 'Reason': '{} failed'.format(', '.join(failed)), 'Seconds': 0}
+						continue
+					running[executor.submit(self.runStage, stage)] = stage
+				if not running:
+					continue
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in done:
+					results[running.pop(future)] = future.result()
+
+		return {
+			"Project": self.projectName,
+			"Folder": self.projectFolder,
+			"Date": time.strftime('%Y-%m-%d %H:%M:%S'),
+			"Seconds": round(time.perf_counter() - start, 3),
+			"Ok": all(result['Status'] != 'Failed' for result in results.values()),
+			"Stages": {stage: results[stage] for stage in STAGES if stage in results}
+		}
+
+
+def parseArgs(argv=None):
+	parser = argparse.ArgumentParser(description='Provision a CKUI project folder without TouchDesigner.')
+	parser.add_argument('project', help='project folder')
+	parser.add_argument('--name', help='project name, defaults to the name of the .toe in the folder')
+	parser.add_argument('--stages', default=','.join(STAGES), help='comma separated stages, default: all ({})'.format(','.join(STAGES)))
+	parser.add_argument('--template', help='project template: Name (latest version), Name-Version or a .zip path')
+	parser.add_argument('--templates', help='project template archives folder, defaults to CKUI_TEMPLATES or the CKUI cache')
+	parser.add_argument('--copy', action='store_true', help='copy the large template media files too instead of hardlinking them')
+	parser.add_argument('--libraries', help='Libraries folder, defaults to ToolsPath in config.json')
+	parser.add_argument('--library', action='append', choices=list(ProjectUtils.LIBRARIES), help='library to clone, can be repeated, default: the template libraries or all')
+	parser.add_argument('--update', action='store_true', help='pull the libraries that are already cloned')
+	parser.add_argument('--venv', help='venv folder, relative to the project folder or absolute')
+	parser.add_argument('--python', help='base python executable used to create the venv')
+	parser.add_argument('--python-version', help='base python to look for, as the Version parameter, ex. Python311/python.exe')
+	parser.add_argument('--no-templates', action='store_true', help='always build the venv, never clone or save a template')
+	parser.add_argument('--wheelhouse', help='local wheel folder, defaults to CKUI_WHEELHOUSE or Assets/Python/wheels')
+	parser.add_argument('--offline', action='store_true', help='only install from the wheelhouse')
+	parser.add_argument('--force', action='store_true', help='install requirements.txt even when the lock file matches')
+	parser.add_argument('--report', help='report path, defaults to <project>/provision_report.json')
+	return parser.parse_args(argv)
+
+
+def main(argv=None):
+	args = parseArgs(argv)
+	stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+	unknown = [stage for stage in stages if stage not in STAGES]
+	if unknown:
+		print('Unknown stages: {}'.format(', '.join(unknown)), file=sys.stderr)
+		return 2
+	if not os.path.isdir(args.project):
+		print('Project folder not found: {}'.format(args.project), file=sys.stderr)
+		return 2
+
+	report = Provisioner(args).run(stages)
+	reportPath = args.report or os.path.join(os.path.abspath(args.project), 'provision_report.json')
+	ProjectUtils.writeJsonAtomic(reportPath, report)
+	print(json.dumps(report, indent=4))
+	return 0 if report['Ok'] else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
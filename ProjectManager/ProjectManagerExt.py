@@ -4,7 +4,9 @@ Author: Arnaud Cassone / CraftKontrol
 It manages project setup, library paths, and dependencies.
 """
 
+import collections
 import json
+import queue
 from threading import local
 from TDStoreTools import StorageManager
 import TDFunctions as TDF
@@ -13,10 +15,52 @@ import pip
 import subprocess
 import socket 
 import datetime
+import importlib
+import importlib.util
+import site
 import json
 import urllib.request
 import os
 import sys
+import threading
+import time
+
+
+class MissingModule:
+	# Stands in for a helper module that couldn't be loaded, it is falsy
+	# and using it raises the import error
+	def __init__(self, name, error):
+		self.name = name
+		self.error = error
+
+	def __bool__(self):
+		return False
+
+	def __getattr__(self, attr):
+		raise ImportError("{} is not available: {}".format(self.name, self.error))
+
+
+def importSibling(name):
+	# Import a helper module from its Text DAT when the component has one,
+	# otherwise from the .py file next to the file this extension is synced with
+	try:
+		return importlib.import_module(name)
+	except ImportError as e:
+		error = e
+	if name in sys.modules:
+		return sys.modules[name]
+	filePath = me.par.file.eval() if hasattr(me.par, 'file') else ''
+	path = os.path.join(project.folder, os.path.dirname(filePath), name + '.py') if filePath else ''
+	if not path or not os.path.isfile(path):
+		return MissingModule(name, error)
+	spec = importlib.util.spec_from_file_location(name, path)
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	spec.loader.exec_module(module)
+	return module
+
+
+ProjectUtils = importSibling('ProjectUtils')
 
 
 class ProjectManagerExt:
@@ -32,6 +76,9 @@ class ProjectManagerExt:
 		TDF.createProperty(self, 'VenvStatus', value='Unknown', dependable=True,readOnly=False)
 		TDF.createProperty(self, 'VenvPath', value='Unknown', dependable=True,readOnly=False)
 		TDF.createProperty(self, 'VenvPythonExe', value='Unknown', dependable=True,readOnly=False)
+		TDF.createProperty(self, 'VenvInfo', value={}, dependable=True,readOnly=False)
+		TDF.createProperty(self, 'PipStatus', value='Idle', dependable=True,readOnly=False)
+		TDF.createProperty(self, 'ClusterNodes', value={}, dependable=True,readOnly=False)
 		TDF.createProperty(self, 'Logger', value='Unknown', dependable=True,readOnly=False)
 		TDF.createProperty(self, 'IpAddresses', value=[], dependable=True,readOnly=False)
 		TDF.createProperty(self, 'CKUI', value='Unknown', dependable=True,readOnly=False)
@@ -42,6 +89,24 @@ class ProjectManagerExt:
 		# attributes:
 		self.a = 0 # attribute
 		self.B = 1 # promoted attribute
+		self.StartupProfile = {} # stage name -> wall time in ms
+		self.StartupFailures = {} # stage name -> error of the stages that failed, State is Degraded when not empty
+		self.StartupProfileRuns = 20 # runs kept in startup_profile.json
+		self.ColoredOps = set() # ids of operators already colored by SetColors
+		self.backgroundJobs = [] # jobs started with RunInBackground
+		self.backgroundPollScheduled = False # a single pollBackgroundJobs loop runs at a time
+		self.pipQueues = {} # venv python -> pending pip jobs
+		self.pipJobs = {} # venv python -> running pip job
+		self.pipPollScheduled = False # a single pollPipJobs loop runs at a time
+		self.PipLinesPerFrame = 50 # pip output lines logged per frame
+		self.ImportTimings = {} # module name -> import time in ms, see Timedimports
+		self.Config = {} # content of config.json
+		self.configMtime = None # config.json mtime when it was last read or written
+		self.configSavePending = False
+		self.ConfigSaveDelay = 500 # ms between a SetConfig and the write
+		self.IpLookupTimeout = 2 # seconds before the interface lookup is abandoned
+		self.clusterNode = None # ProjectUtils.ClusterNode when cluster discovery runs
+		self.syncServer = None # ProjectUtils.SyncServer when this node shares its libraries
 
 		# stored items (persistent across saves and re-initialization):
 		storedItems = [
@@ -63,53 +128,182 @@ class ProjectManagerExt:
 		self.OnStart()
 
 	def OnStart(self):
+		# reset the startup profile, each stage adds its wall time to it
+		self.StartupProfile = {}
+		self.StartupFailures = {}
+		self.runStage('Venv', self.CheckVenv)
+
+		# set main project name to the Overall CKUI System name
+		if op('/project1') is not None:
+			op('/project1').name = 'MainProject'
+			op('/perform').par.winop = '/MainProject'
 		
+		# open a popup window to choose a project folder and name
+		if 'NewProject' in project.name:
+			self.OpensaveDialog()  
+		else:
+			self.Setup()
+
+	def CheckVenv(self):
 		# check if venv is active
-		venvFolder = parent().par.Venvfolder.eval()
-		
-		# Convert to absolute path if relative
-		if venvFolder and not os.path.isabs(venvFolder):
-			venvFolder = os.path.abspath(os.path.join(project.folder, venvFolder))
+		venvFolder = self.getVenvFolder()
 			
 		if venvFolder and os.path.exists(venvFolder):
 			
 			op.Logger.Info(me,"Virtual environment folder found at: {}".format(venvFolder))
-			try:
-				# Try Scripts subfolder first (Windows venv), then root (embedded Python)
-				venvPythonExe = os.path.join(venvFolder, 'Scripts', 'python.exe')
-				if not os.path.exists(venvPythonExe):
-					venvPythonExe = os.path.join(venvFolder, 'python.exe')
-					
-				if os.path.exists(venvPythonExe):
-					result = subprocess.run([venvPythonExe, '--version'], capture_output=True, text=True, check=True)
-					venvPythonVersion = result.stdout.strip()
-					op.Logger.Info(me, f"Virtual environment Python version: {venvPythonVersion}")
-					self.VenvPythonExe = venvPythonExe
-				else:
-					op.Logger.Warning(me, f"Python executable not found in venv: {venvFolder}")
-					venvPythonVersion = 'Not Found'
-					self.VenvPythonExe = 'Unknown'
-			except Exception as e:
-				op.Logger.Info(me, f"Failed to get Python version from venv: {e}")
-				venvPythonVersion = 'Unknown'
+			venvPythonExe = ProjectUtils.findVenvPython(venvFolder)
+			if venvPythonExe:
+				self.VenvPythonExe = venvPythonExe
+				self.ProbeVenv(venvPythonExe, venvFolder)
+			else:
+				op.Logger.Warning(me, f"Python executable not found in venv: {venvFolder}")
+				self.VenvStatus = 'Not Found in ' + venvFolder
 				self.VenvPythonExe = 'Unknown'
-		
-			self.VenvStatus = venvPythonVersion  + " in " + venvFolder
 		else:
 			op.Logger.Info(me,"Virtual environment not found at: {}".format(venvFolder))
 			self.VenvStatus = 'not Found'
 			self.VenvPythonExe = 'Unknown'
 
-		# set main project name to the Overall CKUI System name
-		if op('/project1') is not None:
-			op('/project1').name = 'MainProject'
-			op('/perform').par.winop = '/MainProject'
+	def getVenvFolder(self):
+		# Venvfolder parameter as an absolute path, empty if not set
+		venvFolder = parent().par.Venvfolder.eval()
 		
-		# open a popup window to choose a project folder and name
-		if 'NewProject' in project.name:
-			self.OpensaveDialog()  
+		# Convert to absolute path if relative
+		if venvFolder and not os.path.isabs(venvFolder):
+			venvFolder = os.path.abspath(os.path.join(project.folder, venvFolder))
+		return venvFolder
+
+	def ProbeVenv(self, venvPythonExe, venvFolder, onProbed=None):
+		# Get the venv interpreter metadata (version, platform, site-packages, pip)
+		# from the project storage, the interpreter is only run in the background
+		# when its executable or pyvenv.cfg changed since the last probe
+		cache = self.ownerComp.fetch('VenvProbeCache', {})
+		try:
+			key = ProjectUtils.interpreterKey(venvPythonExe)
+		except OSError as e:
+			op.Logger.Warning(me, f"Failed to read venv interpreter: {e}")
+			return
+
+		cached = cache.get(key.split('|')[0])
+		if cached and cached.get('Key') == key:
+			self.applyVenvInfo(cached, venvFolder)
+			if onProbed:
+				onProbed(cached)
+			return
+
+		self.VenvStatus = 'Probing in ' + venvFolder
+
+		def onDone(info, error):
+			if error:
+				op.Logger.Warning(me, f"Failed to get Python version from venv: {error}")
+				self.VenvStatus = 'Unknown in ' + venvFolder
+				return
+			cache = dict(self.ownerComp.fetch('VenvProbeCache', {}))
+			cache[info['Key'].split('|')[0]] = info
+			self.ownerComp.store('VenvProbeCache', cache)
+			self.applyVenvInfo(info, venvFolder)
+			if onProbed:
+				onProbed(info)
+
+		self.RunInBackground(ProjectUtils.probeInterpreter, onDone, venvPythonExe)
+
+	def InvalidateVenvProbe(self):
+		# Forget cached interpreter metadata, ex. after pip was upgraded
+		self.ownerComp.unstore('VenvProbeCache')
+
+	def applyVenvInfo(self, info, venvFolder):
+		self.VenvInfo = info
+		op.Logger.Info(me, f"Virtual environment Python version: {info['Version']}")
+		self.VenvStatus = info['Version'] + " in " + venvFolder
+		self.InjectVenvPath()
+
+	def InjectVenvPath(self):
+		# Make the venv packages importable in TouchDesigner:
+		# its site-packages (and .pth folders) go on sys.path before the global site-packages
+		# and a module index resolves top level imports without walking sys.path.
+		# Turned off by the Injectvenv parameter, skipped if the venv python version differs
+		if hasattr(parent().par, 'Injectvenv') and not parent().par.Injectvenv.eval():
+			return
+		sitePackages = self.VenvInfo.get('SitePackages')
+		if not sitePackages or not os.path.isdir(sitePackages):
+			return
+		venvVersion = self.VenvInfo.get('Version', '').replace('Python ', '').split('.')[:2]
+		if venvVersion != [str(sys.version_info.major), str(sys.version_info.minor)]:
+			op.Logger.Warning(me,"Venv {} doesn't match TouchDesigner Python {}.{}, not added to sys.path.".format(self.VenvInfo.get('Version'), sys.version_info.major, sys.version_info.minor))
+			return
+
+		if sitePackages not in sys.path:
+			pathCount = len(sys.path)
+			site.addsitedir(sitePackages)
+			added = sys.path[pathCount:]
+			del sys.path[pathCount:]
+			globalIndex = next((i for i, path in enumerate(sys.path) if 'site-packages' in path), len(sys.path))
+			sys.path[globalIndex:globalIndex] = added
+			op.Logger.Info(me,"Venv site-packages added to sys.path: {}".format(sitePackages))
+
+		# the module index is stored in the project until a package is installed or removed
+		key = ProjectUtils.siteIndexKey(sitePackages)
+		stored = self.ownerComp.fetch('VenvModuleIndex', {})
+		if stored.get('Key') == key:
+			index = stored['Index']
 		else:
-			self.Setup()
+			index = ProjectUtils.buildModuleIndex(sitePackages)
+			self.ownerComp.store('VenvModuleIndex', {'Key': key, 'Index': index})
+
+		# after the builtin, frozen and TouchDesigner finders, stdlib names are left out of the index
+		finder = ProjectUtils.ModuleIndexFinder(index)
+		ProjectUtils.insertModuleIndexFinder(finder)
+		op.Logger.Info(me,"Venv module index: {} modules".format(len(finder.index)))
+
+		self.timeImports(finder.index)
+
+	def timeImports(self, index):
+		# Import the modules listed in the Timedimports parameter and log how long each took
+		names = parent().par.Timedimports.eval().split() if hasattr(parent().par, 'Timedimports') else []
+		for name in names:
+			if name in sys.modules or name not in index:
+				continue
+			start = time.perf_counter()
+			try:
+				importlib.import_module(name)
+			except Exception as e:
+				op.Logger.Warning(me,"Failed to import {}: {}".format(name, e))
+				continue
+			self.ImportTimings[name] = round((time.perf_counter() - start) * 1000, 3)
+			op.Logger.Info(me,"Imported {} in {} ms".format(name, self.ImportTimings[name]))
+
+	def RunInBackground(self, work, onDone=None, *args):
+		# Run work(*args) in a worker thread, onDone(result, error) is called
+		# on the main thread once it is finished as operators aren't thread safe
+		job = {'Result': None, 'Error': None, 'OnDone': onDone}
+
+		def target():
+			try:
+				job['Result'] = work(*args)
+			except Exception as e:
+				job['Error'] = e
+
+		job['Thread'] = threading.Thread(target=target, daemon=True)
+		self.backgroundJobs.append(job)
+		job['Thread'].start()
+		if not self.backgroundPollScheduled:
+			self.backgroundPollScheduled = True
+			run("args[0]()", self.pollBackgroundJobs, delayFrames=1)
+		return job
+
+	def pollBackgroundJobs(self):
+		# callbacks can start new jobs, they are polled by this loop
+		self.backgroundPollScheduled = False
+		for job in [job for job in self.backgroundJobs if not job['Thread'].is_alive()]:
+			self.backgroundJobs.remove(job)
+			if job['OnDone']:
+				try:
+					job['OnDone'](job['Result'], job['Error'])
+				except Exception as e:
+					op.Logger.Error(me, f"Background job callback failed: {e}")
+		if self.backgroundJobs and not self.backgroundPollScheduled:
+			self.backgroundPollScheduled = True
+			run("args[0]()", self.pollBackgroundJobs, delayFrames=1)
 
 	def OpensaveDialog(self):
 		# open the save dialog
@@ -122,38 +316,113 @@ class ProjectManagerExt:
 	def Setup(self):
 		op.Logger.Info(me,"Setup Project Manager...")
 		self.State = 'Setup'
-		self.InitializeLogger()
-		self.CheckConfig()
-		self.CheckGitignore()
-		self.UpdateLibraries()
-		self.CheckDependencies()
-		self.GetSystemInfo()
-		self.SetColors()
-		op.Logger.Info(me,"Project Manager Ready.") 
-		self.State = 'Ready'
+		if not ProjectUtils:
+			self.StartupFailures['ProjectUtils'] = str(ProjectUtils.error)
+			op.Logger.Error(me,"ProjectUtils could not be loaded, the stages that use it will fail: {}".format(ProjectUtils.error))
+		setupStart = time.perf_counter()
+		self.runStage('Logger', self.InitializeLogger)
+		if not os.path.exists(os.path.join(project.folder, 'config.json')):
+			# new project, scaffold it from the selected template before the config is created
+			self.runStage('Template', self.ApplyProjectTemplate)
+		self.runStage('Config', self.CheckConfig)
+		self.runStage('Gitignore', self.CheckGitignore)
+		self.runStage('Libraries', self.UpdateLibraries)
+		self.runStage('Dependencies', self.CheckDependencies)
+		self.runStage('SystemInfo', self.GetSystemInfo)
+		if hasattr(parent().par, 'Cluster') and parent().par.Cluster.eval():
+			self.runStage('Cluster', self.StartCluster)
+		self.runStage('Colors', self.SetColors)
+		self.runStage('Preflight', self.PreflightMedia)
+		self.StartupProfile['Setup'] = round((time.perf_counter() - setupStart) * 1000, 3)
+		self.SaveStartupProfile()
+		if self.StartupFailures:
+			op.Logger.Warning(me,"Project Manager Degraded, failed stages: {}".format(', '.join(self.StartupFailures)))
+			self.State = 'Degraded'
+		else:
+			op.Logger.Info(me,"Project Manager Ready.") 
+			self.State = 'Ready'
+		self.PublishMetrics()
 		op('DelayedStartup').run(delayFrames=1)
 		pass
 	
+	def runStage(self, stage, fn, *args):
+		# Run a startup stage and record its wall time (ms) in the startup profile
+		# a failing stage is logged and recorded in StartupFailures, the next stages still run
+		start = time.perf_counter()
+		try:
+			return fn(*args)
+		except Exception as e:
+			self.StartupFailures[stage] = str(e)
+			op.Logger.Error(me,"Startup stage {} failed: {}".format(stage, e))
+		finally:
+			self.StartupProfile[stage] = round((time.perf_counter() - start) * 1000, 3)
+
+	def SaveStartupProfile(self):
+		# Append the startup profile to startup_profile.json next to config.json
+		# keeps the last runs to compare each stage against its median
+		profilePath = project.folder + '/startup_profile.json'
+		runs = []
+		if os.path.exists(profilePath):
+			try:
+				with open(profilePath, 'r') as profileFile:
+					runs = json.load(profileFile).get('Runs', [])
+			except Exception as e:
+				op.Logger.Warning(me,"Failed to read startup profile: {}".format(e))
+
+		for stage, duration in self.StartupProfile.items():
+			previous = sorted(run['Stages'][stage] for run in runs if stage in run.get('Stages', {}))
+			if len(previous) < 3:
+				continue
+			median = previous[len(previous) // 2]
+			if duration > max(median * 2, median + 50):
+				op.Logger.Warning(me,"Startup stage {} took {} ms (median {} ms).".format(stage, duration, median))
+
+		runs.append({
+			"Date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+			"TouchDesignerVersion": app.build,
+			"Stages": self.StartupProfile
+		})
+		runs = runs[-self.StartupProfileRuns:]
+		try:
+			with open(profilePath, 'w') as profileFile:
+				json.dump({"Runs": runs}, profileFile, indent=4)
+		except Exception as e:
+			op.Logger.Error(me,"Failed to save startup profile: {}".format(e))
+			return
+		op.Logger.Info(me,"Startup profile: {}".format(self.StartupProfile))
+
 	def GetLocalIP(self):
-		hostname = socket.gethostname()    
-		IPAddr4 = socket.gethostbyname_ex(hostname)  
-		Addresses = []
-		for addr in IPAddr4[2]:
-			if '.' in addr:
-				Addresses.append(addr)
-		return Addresses
+		# IPv4 addresses of the network interfaces, doesn't depend on DNS
+		return ProjectUtils.localIPv4Addresses(self.IpLookupTimeout)
 	
 	def GetSystemInfo(self):
-		Addresses = self.GetLocalIP()
+		# Look up the IP addresses in the background, then every Iprefresh seconds
+		# to follow DHCP changes. Parameters are only rebuilt when the addresses change
+		def onDone(addresses, error):
+			if error:
+				op.Logger.Warning(me,"Failed to get IP addresses: {}".format(error))
+			else:
+				self.updateIpAddresses(addresses)
+			refresh = parent().par.Iprefresh.eval() if hasattr(parent().par, 'Iprefresh') else 30
+			if refresh > 0:
+				run("args[0]()", self.GetSystemInfo, delayMilliSeconds=refresh * 1000, group='ProjectManagerIpRefresh')
+
+		for r in runs:
+			if r.group == 'ProjectManagerIpRefresh':
+				r.kill()
+		self.RunInBackground(self.GetLocalIP, onDone)
+
+	def updateIpAddresses(self, Addresses):
+		if Addresses == self.IpAddresses:
+			return
+
 		# Check if parameters exists then delete them
-		for par in parent().pars():
-			if par.name.startswith('Ipaddress'):
+		for par in parent().pars('Ipaddress*'):
+			if par.name[len('Ipaddress'):].isdigit():
 				par.destroy()
 
-		IpAddresses = [] 
 		# Store IP addresses in the list
-		for i, addr in enumerate(Addresses):
-			self.IpAddresses.append(addr)
+		self.IpAddresses = list(Addresses)
 
 		# Create parameters for each IP address
 		for i in range(len(self.IpAddresses)): 
@@ -165,64 +434,506 @@ class ProjectManagerExt:
 
 		op.Logger.Info(me,"System IP Addresses: {}".format(Addresses)) 
 
+	def StartCluster(self):
+		# Announce this node status on the show network and listen to the other nodes,
+		# their statuses are merged in ClusterNodes and the cluster_nodes table DAT if there is one
+		self.StopCluster()
+		port = parent().par.Clusterport.eval() if hasattr(parent().par, 'Clusterport') else 42099
+		self.clusterNode = ProjectUtils.ClusterNode('{}:{}'.format(socket.gethostname(), os.getpid()), port=port)
+		self.clusterNode.setStatus(self.getClusterStatus())
+		try:
+			self.clusterNode.start()
+		except OSError as e:
+			op.Logger.Error(me,"Failed to start cluster discovery on port {}: {}".format(port, e))
+			self.clusterNode = None
+			return
+		op.Logger.Info(me,"Cluster discovery started on {}:{}".format(self.clusterNode.group, port))
+		run("args[0]()", self.pollCluster, delayMilliSeconds=500, group='ProjectManagerCluster')
+
+	def StopCluster(self):
+		for r in runs:
+			if r.group == 'ProjectManagerCluster':
+				r.kill()
+		if self.clusterNode:
+			self.clusterNode.stop()
+			self.clusterNode = None
+
+	def PublishMetrics(self):
+		# Push the project status to the Logger metrics (see Metricsport on the Logger),
+		# then again every Metricsinterval seconds. Unchanged values don't touch the metrics page
+		for r in runs:
+			if r.group == 'ProjectManagerMetrics':
+				r.kill()
+		if not hasattr(op.Logger, 'SetMetricState'):
+			return
+		op.Logger.SetMetricState('ckui_state', self.State)
+		op.Logger.SetMetricState('ckui_venv_status', self.VenvStatus.split(' in ')[0])
+		pipState = self.PipStatus.split(':')[0]
+		op.Logger.SetMetricState('ckui_pip_status', pipState if pipState in ('Idle', 'Queued', 'Done', 'Failed') else 'Running')
+		for library in ('CKUI', 'CKTDLibrary', 'GGEN', 'TerrainTools'):
+			op.Logger.SetMetricState('ckui_library_status', getattr(self, library), library=library)
+		if self.clusterNode:
+			op.Logger.SetMetric('ckui_cluster_nodes', len(self.ClusterNodes))
+		interval = parent().par.Metricsinterval.eval() if hasattr(parent().par, 'Metricsinterval') else 5
+		if interval > 0:
+			run("args[0]()", self.PublishMetrics, delayMilliSeconds=interval * 1000, group='ProjectManagerMetrics')
+
+	def getClusterStatus(self):
+		return {
+			"Project": project.name.split('.')[0].strip(),
+			"State": self.State,
+			"CKUI": self.CKUI,
+			"CKTDLibrary": self.CKTDLibrary,
+			"GGEN": self.GGEN,
+			"TerrainTools": self.TerrainTools,
+			"Venv": self.VenvStatus,
+			"IpAddresses": ' '.join(self.IpAddresses),
+			"Build": app.build,
+			# a sync server on the loopback interface can't be reached by the peers
+			"SyncPort": self.syncServer.port if self.syncServer and not self.syncServer.host.startswith('127.') else None
+		}
+
+	def pollCluster(self):
+		if not self.clusterNode:
+			return
+		self.clusterNode.setStatus(self.getClusterStatus())
+		changes = self.clusterNode.poll()
+		if changes:
+			self.ClusterNodes = {nodeId: node['Status'] for nodeId, node in self.clusterNode.getNodes().items()}
+			table = op('cluster_nodes')
+			if table is not None:
+				self.updateClusterTable(table, changes)
+		run("args[0]()", self.pollCluster, delayMilliSeconds=500, group='ProjectManagerCluster')
+
+	def updateClusterTable(self, table, changes):
+		# Only the cells of the changed fields are written
+		if table.numRows == 0:
+			table.appendRow(['Node'])
+		for nodeId, fields in changes:
+			if fields is None:
+				if table.row(nodeId) is not None:
+					table.deleteRow(nodeId)
+				op.Logger.Warning(me,"Cluster node lost: {}".format(nodeId))
+				continue
+			if table.row(nodeId) is None:
+				table.appendRow([nodeId])
+				op.Logger.Info(me,"Cluster node found: {}".format(nodeId))
+			for field, value in fields.items():
+				if table.col(field) is None:
+					table.appendCol([field])
+				table[nodeId, field] = '' if value is None else value
+
+	def getSyncFolders(self):
+		# Folders distributed between the show machines: the libraries and the wheelhouse
+		return {
+			'Libraries': parent().par.Libraries.eval(),
+			'Wheelhouse': self.GetWheelhouse()
+		}
+
+	def StartSyncServer(self):
+		# Share the libraries and wheelhouse of this machine with the other nodes
+		# on the Syncinterface address, the loopback interface by default,
+		# the port is announced to the cluster so peers can pull from it
+		self.StopSyncServer()
+		port = parent().par.Syncport.eval() if hasattr(parent().par, 'Syncport') else 42100
+		interface = parent().par.Syncinterface.eval() if hasattr(parent().par, 'Syncinterface') else ''
+		folders = {name: folder for name, folder in self.getSyncFolders().items() if folder and os.path.isdir(folder)}
+		self.syncServer = ProjectUtils.SyncServer(folders, port, host=interface or '127.0.0.1', excludes=ProjectUtils.LIBRARY_SYNC_EXCLUDES)
+		try:
+			self.syncServer.start()
+		except OSError as e:
+			op.Logger.Error(me,"Failed to start sync server on {}:{}: {}".format(self.syncServer.host, port, e))
+			self.syncServer = None
+			return
+		op.Logger.Info(me,"Sync server sharing {} on {}:{}".format(', '.join(folders), self.syncServer.host, port))
+
+	def StopSyncServer(self):
+		if self.syncServer:
+			self.syncServer.stop()
+			self.syncServer = None
+
+	def getSyncPeers(self):
+		# Addresses of the machines PullFromPeer may pick from the cluster, the Syncpeers parameter
+		return (parent().par.Syncpeers.eval() if hasattr(parent().par, 'Syncpeers') else '').split()
+
+	def PullFromPeer(self, host=''):
+		# Pull the libraries and wheelhouse from a peer running the sync server,
+		# then check the libraries and install the requirements from the wheelhouse.
+		# Cluster announcements aren't authenticated, so when no host is given
+		# only a cluster node listed in Syncpeers is pulled from
+		if not host:
+			if not self.clusterNode:
+				op.Logger.Warning(me,"No peer given and cluster discovery is not running.")
+				return
+			allowed = self.getSyncPeers()
+			if not allowed:
+				op.Logger.Warning(me,"No peer given and Syncpeers is empty, give the host to pull from.")
+				return
+			peers = [node for node in self.clusterNode.getNodes().values() if node['Status'].get('SyncPort') and node['Address'] in allowed]
+			if not peers:
+				op.Logger.Warning(me,"No cluster node of Syncpeers is sharing its libraries.")
+				return
+			host = '{}:{}'.format(peers[0]['Address'], peers[0]['Status']['SyncPort'])
+		elif ':' not in host:
+			host = '{}:{}'.format(host, parent().par.Syncport.eval() if hasattr(parent().par, 'Syncport') else 42100)
+
+		baseUrl = 'http://' + host
+		folders = self.getSyncFolders()
+		op.Logger.Info(me,"Pulling {} from {}".format(', '.join(folders), baseUrl))
+
+		def pull():
+			return {name: ProjectUtils.syncFromPeer(baseUrl, name, folder) for name, folder in folders.items() if folder}
+
+		def onDone(summaries, error):
+			if error:
+				op.Logger.Error(me,"Failed to pull from {}: {}".format(baseUrl, error))
+				return
+			for name, summary in summaries.items():
+				op.Logger.Info(me,"{} synced from {}: {UpdatedFiles}/{Files} files, {DownloadedBytes} bytes in {Seconds} s".format(name, host, **summary))
+			self.UpdateLibraries()
+			self.PipInstallRequirements()
+
+		self.RunInBackground(pull, onDone)
+
+	def getTemplatesFolder(self):
+		# Folder of the project template archives: Templatesfolder parameter,
+		# CKUI_TEMPLATES for a machine wide one, or the CKUI cache folder
+		templatesFolder = parent().par.Templatesfolder.eval() if hasattr(parent().par, 'Templatesfolder') else ''
+		return templatesFolder or os.getenv('CKUI_TEMPLATES', '') or ProjectUtils.machineCacheFolder('TemplateArchives')
+
+	def GetProjectTemplates(self):
+		# Available templates, name -> (latest version, archive path)
+		return ProjectUtils.findProjectTemplates(self.getTemplatesFolder())
+
+	def getTemplateValues(self):
+		# Values of the {{Key}} placeholders in template file names and text files
+		return {
+			"ProjectName": project.name.split('.')[0].strip(),
+			"ProjectFolder": project.folder,
+			"LibrariesFolder": parent().par.Libraries.eval(),
+			"TouchDesignerVersion": app.build,
+			"Date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		}
+
+	def ApplyProjectTemplate(self, template=''):
+		# Write a project template (Projecttemplate parameter: Name, Name-Version or a .zip path)
+		# in the project folder, existing files are kept. The archive is extracted once
+		# in the CKUI cache, then its files are copied or rendered in parallel,
+		# only large media files are hardlinked from the cache
+		template = template or (parent().par.Projecttemplate.eval() if hasattr(parent().par, 'Projecttemplate') else '')
+		if not template:
+			return
+		archivePath = ProjectUtils.projectTemplateArchive(self.getTemplatesFolder(), template)
+		if not archivePath:
+			op.Logger.Warning(me,"Project template not found: {} in {}".format(template, self.getTemplatesFolder()))
+			return
+		try:
+			templateFolder, manifest = ProjectUtils.extractProjectTemplate(archivePath)
+			summary = ProjectUtils.materializeTemplate(templateFolder, project.folder, self.getTemplateValues())
+		except Exception as e:
+			op.Logger.Error(me,"Failed to apply project template {}: {}".format(template, e))
+			return
+		op.Logger.Info(me,"Project template {} {} applied: {Files} files, {Rendered} rendered, {Skipped} kept in {Seconds} s".format(manifest['Name'], manifest['Version'], **summary))
+
+		# clone the libraries the template uses in the background
+		self.ProjectLibPath = parent().par.Libraries.eval()
+		found = ProjectUtils.findLibraries(self.ProjectLibPath)
+		for libName in manifest.get('Libraries', []):
+			if libName not in ProjectUtils.LIBRARIES or libName in found:
+				continue
+			op.Logger.Info(me,"Cloning library {} used by the template".format(libName))
+
+			def onCloned(status, error, libName=libName):
+				if error:
+					op.Logger.Warning(me,"Failed to clone library {}: {}".format(libName, error))
+					return
+				setattr(self, libName, 'Ready')
+
+			self.RunInBackground(ProjectUtils.cloneLibrary, onCloned, self.ProjectLibPath, libName)
+
 	def CheckConfig(self):
 		# Check if the config file is present, if not create it
-		ProjConfig = self.ownerComp
+		# then load it once and watch it for external edits
 		configFilePath = project.folder + '/config.json'
 		if os.path.exists(configFilePath):
 			op.Logger.Info(me,"Config file found: {}".format(configFilePath))
+			if self.LoadConfig() and not self.Config.get('TouchDesignerVersion'):
+				# written by ProjectManagerCLI, saved once with the values of this TouchDesigner
+				self.SaveConfig()
 		else:
 			
 			self.SaveConfig()
+		self.StartConfigWatcher()
+
+	def LoadConfig(self):
+		# Read config.json into self.Config
+		configFilePath = project.folder + '/config.json'
+		try:
+			mtime = os.stat(configFilePath).st_mtime_ns
+			with open(configFilePath, 'r') as configFile:
+				config = json.load(configFile)
+		except Exception as e:
+			op.Logger.Error(me,"Failed to load config file: {}".format(e))
+			return False
+		self.Config = config
+		self.configMtime = mtime
+		return True
 
 	def SaveConfig(self):
 		# Save the current configuration to a json file
+		# Modules and Properties are kept from the loaded config
 		ProjConfig = self.ownerComp
-		config = {
-			"Project": project.name.split('.')[0].strip(),
-			"ToolsPath": ProjConfig.par.Libraries.eval(),
-			"LogPath": op.Logger.par.Logfolder.eval(),
-			"TouchDesignerVersion": app.build,
-			"Modules": {},
-			"Properties": {}
-			
-		}
+		config = ProjectUtils.projectConfig(
+			project.name.split('.')[0].strip(),
+			ProjConfig.par.Libraries.eval(),
+			op.Logger.par.Logfolder.eval(),
+			app.build,
+			self.Config.get('Modules', {}),
+			self.Config.get('Properties', {}))
 		configFilePath = project.folder + '/config.json'
 		try:
-			with open(configFilePath, 'w') as configFile:
-				json.dump(config, configFile, indent=4)
+			ProjectUtils.writeJsonAtomic(configFilePath, config)
+			self.configMtime = os.stat(configFilePath).st_mtime_ns
 		except Exception as e:
 			op.Logger.Error(me,"Failed to save config file: {}".format(e))
 			return
+		self.Config = config
 		op.Logger.Info(me,"Config file saved: {}".format(configFilePath))
 
+	def GetConfig(self, key, default=None, valueType=None):
+		# Get a config value, nested keys are separated by '/', ex. 'Modules/Audio/Volume'
+		# the value is converted to valueType, default is returned if it can't be
+		value = self.Config
+		for part in key.split('/'):
+			if not isinstance(value, dict) or part not in value:
+				return default
+			value = value[part]
+		if valueType is None or isinstance(value, valueType):
+			return value
+		try:
+			return valueType(value)
+		except (TypeError, ValueError):
+			op.Logger.Warning(me,"Config value {} is not a {}: {}".format(key, valueType.__name__, value))
+			return default
+
+	def SetConfig(self, key, value):
+		# Set a config value, nested keys are separated by '/'
+		# writes are debounced, several changes in a row are saved once
+		parts = key.split('/')
+		target = self.Config
+		for part in parts[:-1]:
+			target = target.setdefault(part, {})
+		if target.get(parts[-1]) == value:
+			return
+		target[parts[-1]] = value
+		if not self.configSavePending:
+			self.configSavePending = True
+			run("args[0]()", self.flushConfig, delayMilliSeconds=self.ConfigSaveDelay, group='ProjectManagerConfig')
+
+	def flushConfig(self):
+		self.configSavePending = False
+		self.SaveConfig()
+
+	def StartConfigWatcher(self):
+		# Poll config.json mtime, edits made outside of TouchDesigner are applied
+		# to the affected modules only. Interval from the Configpollinterval parameter (seconds)
+		self.StopConfigWatcher()
+		interval = parent().par.Configpollinterval.eval() if hasattr(parent().par, 'Configpollinterval') else 1
+		if interval <= 0:
+			return
+		run("args[0](args[1])", self.pollConfig, interval * 1000, delayMilliSeconds=interval * 1000, group='ProjectManagerConfigWatcher')
+
+	def StopConfigWatcher(self):
+		for r in runs:
+			if r.group == 'ProjectManagerConfigWatcher':
+				r.kill()
+
+	def pollConfig(self, interval):
+		configFilePath = project.folder + '/config.json'
+		try:
+			mtime = os.stat(configFilePath).st_mtime_ns
+		except OSError:
+			mtime = self.configMtime
+		if mtime != self.configMtime:
+			previous = self.Config
+			if self.LoadConfig():
+				op.Logger.Info(me,"Config file changed: {}".format(configFilePath))
+				self.applyConfigChanges(previous, self.Config)
+		run("args[0](args[1])", self.pollConfig, interval, delayMilliSeconds=interval, group='ProjectManagerConfigWatcher')
+
+	def applyConfigChanges(self, previous, config):
+		# Only modules and properties whose values changed are touched
+		previousModules = previous.get('Modules', {})
+		modules = config.get('Modules', {})
+		for name in ProjectUtils.changedKeys(previousModules, modules):
+			self.applyModuleConfig(name, modules.get(name, {}))
+
+		properties = config.get('Properties', {})
+		for name in ProjectUtils.changedKeys(previous.get('Properties', {}), properties):
+			if name in properties and hasattr(parent().par, name):
+				setattr(parent().par, name, properties[name])
+				op.Logger.Info(me,"Config property {} set to {}".format(name, properties[name]))
+
+	def applyModuleConfig(self, name, settings):
+		# Apply module settings to the global OP shortcut of the same name,
+		# through its ApplyConfig method if it has one, otherwise to matching parameters
+		module = getattr(op, name, None)
+		if module is None:
+			op.Logger.Warning(me,"Config module {} not found".format(name))
+			return
+		if hasattr(module, 'ApplyConfig'):
+			module.ApplyConfig(settings)
+		elif isinstance(settings, dict):
+			for parName, value in settings.items():
+				if hasattr(module.par, parName):
+					setattr(module.par, parName, value)
+		op.Logger.Info(me,"Config applied to module {}".format(name))
+
 	def CheckGitignore(self):
 		# Check if .gitignore file exists in the project folder
 		# ignore iterations (projectname.4.toe) to projectname.toe
 		
-		gitignorePath = os.path.join(project.folder, '.gitignore') 
 		projectName = project.name.split('.')[0].strip()
 
 
-		if not os.path.exists(gitignorePath):
-			# create a .gitignore file
-			with open(gitignorePath, 'w') as f:
-				f.write('*.toe\n')
-				f.write('!' + projectName + '.toe\n')
-				f.write('Logs/\n')
-				f.write('log/\n')
-				f.write('Backup/*\n')
-				f.write('config.json\n')
-				f.write('custom_operators.tox\n')
-				f.write('*.bak\n')
-				f.write('*.dmp\n')
-				f.write('*.pyc\n')
-				
+		if ProjectUtils.writeGitignore(project.folder, projectName):
 			op.Logger.Info(me,".gitignore file created")
 		else:
 			op.Logger.Info(me,"Project .gitignore exists")
 		pass
 	
+	def getSnapshotStore(self):
+		return ProjectUtils.SnapshotStore(os.path.join(project.folder, 'Backup', 'Snapshots'))
+
+	def getSnapshotExcludes(self):
+		# Folders never included in snapshots: the backups themselves, logs, git and the venv
+		exclude = list(ProjectUtils.PROJECT_EXCLUDES)
+		venvFolder = self.getVenvFolder()
+		if venvFolder and venvFolder.startswith(os.path.abspath(project.folder)):
+			exclude.append(os.path.relpath(venvFolder, project.folder))
+		return exclude
+
+	def Snapshot(self):
+		# Take a deduplicated snapshot of the project folder in Backup/Snapshots, in the background
+		store = self.getSnapshotStore()
+		keep = parent().par.Snapshotkeep.eval() if hasattr(parent().par, 'Snapshotkeep') else 0
+		# operators and project are only read here, the worker thread gets plain values
+		projectFolder = project.folder
+		exclude = self.getSnapshotExcludes()
+		op.Logger.Info(me,"Taking project snapshot...")
+
+		def takeSnapshot():
+			summary = store.snapshot(projectFolder, exclude)
+			if keep > 0:
+				summary['PrunedChunks'] = store.prune(keep)
+			return summary
+
+		def onDone(summary, error):
+			if error:
+				op.Logger.Error(me,"Failed to take project snapshot: {}".format(error))
+				return
+			op.Logger.Info(me,"Project snapshot {Name}: {ChangedFiles}/{Files} files changed, {StoredBytes} bytes stored in {Seconds} s".format(**summary))
+
+		self.RunInBackground(takeSnapshot, onDone)
+
+	def GetSnapshots(self):
+		return self.getSnapshotStore().listSnapshots()
+
+	def RestoreSnapshot(self, name, targetFolder=''):
+		# Restore a snapshot in the background, to Backup/Restore/<name> unless a target folder is given
+		store = self.getSnapshotStore()
+		if name not in store.listSnapshots():
+			op.Logger.Warning(me,"Snapshot not found: {}".format(name))
+			return
+		targetFolder = targetFolder or os.path.join(project.folder, 'Backup', 'Restore', name)
+		op.Logger.Info(me,"Restoring snapshot {} to: {}".format(name, targetFolder))
+
+		def onDone(summary, error):
+			if error:
+				op.Logger.Error(me,"Failed to restore snapshot {}: {}".format(name, error))
+				return
+			op.Logger.Info(me,"Snapshot {} restored: {RestoredFiles}/{Files} files written in {Seconds} s".format(name, **summary))
+
+		self.RunInBackground(store.restore, onDone, name, targetFolder)
+
+	def GetAssetIndex(self):
+		# Open the project asset index, close it once done (it can be used in a with block)
+		return ProjectUtils.AssetIndex(os.path.join(project.folder, 'AssetIndex.db'))
+
+	def IndexAssets(self, onIndexed=None):
+		# Rescan the project folder in the background, only new or modified files are hashed
+		# the index is opened in the worker thread, from paths read on the main thread
+		projectFolder = project.folder
+		indexPath = os.path.join(projectFolder, 'AssetIndex.db')
+		exclude = self.getSnapshotExcludes()
+		op.Logger.Info(me,"Indexing project assets...")
+
+		def scan():
+			with ProjectUtils.AssetIndex(indexPath) as assetIndex:
+				return assetIndex.scan(projectFolder, exclude)
+
+		def onDone(summary, error):
+			if error:
+				op.Logger.Error(me,"Failed to index project assets: {}".format(error))
+				return
+			op.Logger.Info(me,"Asset index updated: {Files} files, {Hashed} hashed, {Removed} removed in {Seconds} s".format(**summary))
+			if onIndexed:
+				onIndexed(summary)
+
+		self.RunInBackground(scan, onDone)
+
+	def collectFileReferences(self):
+		# Visit every operator under /MainProject once and collect the paths of
+		# its File and Folder parameters, paths are absolute and de-duplicated
+		references = {}
+		stack = [op('/MainProject')]
+		while stack:
+			comp = stack.pop()
+			for node in comp.children:
+				if node.isCOMP:
+					stack.append(node)
+				for par in node.pars():
+					if par.style not in ('File', 'Folder'):
+						continue
+					value = str(par.eval()).strip()
+					if not value or '://' in value:
+						continue
+					path = os.path.normpath(value if os.path.isabs(value) else os.path.join(project.folder, value))
+					references.setdefault(path, []).append(par.owner.path + ':' + par.name)
+		return references
+
+	def PreflightMedia(self):
+		# Verify the files referenced by the project before it is Ready:
+		# existence and size against the asset index, checksums with the Preflightchecksums parameter.
+		# The report is written to preflight_report.json next to config.json
+		references = self.collectFileReferences()
+		checksums = parent().par.Preflightchecksums.eval() if hasattr(parent().par, 'Preflightchecksums') else False
+		indexPath = os.path.join(project.folder, 'AssetIndex.db')
+		assetIndex = self.GetAssetIndex() if os.path.exists(indexPath) else None
+		try:
+			results = ProjectUtils.verifyAssets(list(references), project.folder, assetIndex, checksums)
+		finally:
+			if assetIndex:
+				assetIndex.close()
+
+		report = {
+			"Date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+			"Files": len(results),
+			"Problems": {}
+		}
+		for path, result in results.items():
+			if result['Status'] not in ('ok', 'unindexed'):
+				report['Problems'][path] = dict(result, ReferencedBy=references[path])
+		try:
+			ProjectUtils.writeJsonAtomic(project.folder + '/preflight_report.json', report)
+		except Exception as e:
+			op.Logger.Error(me,"Failed to save preflight report: {}".format(e))
+
+		for path, problem in report['Problems'].items():
+			op.Logger.Warning(me,"Media {}: {} (used by {})".format(problem['Status'], path, ', '.join(problem['ReferencedBy'][:3])))
+		op.Logger.Info(me,"Media preflight: {} files checked, {} problems".format(report['Files'], len(report['Problems'])))
+		return report
+
 	def InitializeLogger(self):
 		
 		# Check if WebLogger is present
@@ -232,7 +943,7 @@ class ProjectManagerExt:
   
 
 		# Initialize the logger
-		op.Logger.par.Logfolder = project.folder + '/Logs' 
+		op.Logger.par.Logfolder = project.folder + '/' + ProjectUtils.PROJECT_LOG_FOLDER
 		op.Logger.par.Active = True 
 		op.Logger.par.Logtofile = True
 		op.Logger.allowCooking = True
@@ -246,22 +957,9 @@ class ProjectManagerExt:
 		self.ProjectLibPath = parent().par.Libraries.eval()
 
 		# Check for the libraries in the project library path
-		self.CKUI = 'Not Found'
-		self.CKTDLibrary = 'Not Found'
-		self.GGEN = 'Not Found'
-		self.TerrainTools = 'Not Found'
-
-		for folder in os.listdir(self.ProjectLibPath):
-			folderPath = os.path.join(self.ProjectLibPath, folder)
-			if os.path.isdir(folderPath):
-				if folder.lower().find('ckui') != -1:
-					self.CKUI = "Ready"
-				elif folder.lower().find('td-library') != -1:
-					self.CKTDLibrary = 'Ready'
-				elif folder.lower().find('groundgen') != -1:
-					self.GGEN = "Ready"
-				elif folder.lower().find('terrain-tools') != -1:
-					self.TerrainTools = "Ready"
+		found = ProjectUtils.findLibraries(self.ProjectLibPath)
+		for libName in ProjectUtils.LIBRARIES:
+			setattr(self, libName, 'Ready' if libName in found else 'Not Found')
 		
 		op.Logger.Info(me,"Libraries Checked")
 		pass
@@ -286,7 +984,7 @@ class ProjectManagerExt:
 			except ImportError:
 				op.Logger.Info(me,"Git not found, installing...")
 				try:
-					subprocess.run(['python', '-m', 'pip', 'install', 'GitPython'], check=True)
+					subprocess.run(['python', '-m', 'pip', 'install', 'GitPython'] + self.wheelhouseArgs(), check=True)
 					git = True
 					pass
 				except Exception as e:
@@ -297,57 +995,17 @@ class ProjectManagerExt:
 		
 	def DownloadLibrary(self, libName):
 		# Download the specified library from Github
-		import git
-		if libName == 'CKUI':
-			repoName = 'CKUI'
-			repoURL = 'https://github.com/CraftKontrol/CKUI.git'
-			op.Logger.Info(me,"Cloning repository {} from {}".format(repoName, repoURL))
-			try:
-				subprocess.run(['git', 'clone', repoURL, os.path.join(self.ProjectLibPath, repoName)], check=True)
-				op.Logger.Info(me,"Repository {} cloned successfully.".format(repoName))
-				self.CKUI = 'Ready'
-			except Exception as e:
-				op.Logger.Info(me,"Failed to clone repository {}: {}".format(repoName, e))
-
-		elif libName == 'GGEN':
-			repoName = 'GroundGen-for-Touchdesigner'
-			repoURL = 'https://github.com/CraftKontrol/GroundGen-for-Touchdesigner.git'
-			op.Logger.Info(me,"Cloning repository {} from {}".format(repoName, repoURL))
-			try:
-				subprocess.run(['git', 'clone', repoURL, os.path.join(self.ProjectLibPath, repoName)], check=True)
-				op.Logger.Info(me,"Repository {} cloned successfully.".format(repoName))
-				self.GGEN = 'Ready'
-			except Exception as e:
-				op.Logger.Info(me,"Failed to clone repository {}: {}".format(repoName, e))
-			
-		elif libName == 'TerrainTools':
-			repoName = 'Terrain-Tools-for-Touchdesigner'
-			repoURL = 'https://github.com/CraftKontrol/Terrain-Tools-for-Touchdesigner.git'
-			op.Logger.Info(me,"Cloning repository {} from {}".format(repoName, repoURL))
-			try:
-				subprocess.run(['git', 'clone', repoURL, os.path.join(self.ProjectLibPath, repoName)], check=True)
-				op.Logger.Info(me,"Repository {} cloned successfully.".format(repoName))
-				self.TerrainTools = 'Ready'
-			except Exception as e:
-				op.Logger.Info(me,"Failed to clone repository {}: {}".format(repoName, e))
-			pass
-		elif libName == 'CKTDLibrary':
-
-			repoName = 'TD-Library'
-			repoURL = 'https://github.com/CraftKontrol/TD-Library.git'
-			op.Logger.Info(me,"Cloning repository {} from {}".format(repoName, repoURL))
-			try:
-				
-				subprocess.run(['git', 'clone', repoURL, os.path.join(self.ProjectLibPath, repoName)], check=True)
-			
-				op.Logger.Info(me,"Repository {} cloned successfully.".format(repoName))
-				self.CKTDLibrary = 'Ready'
-			except Exception as e:
-				op.Logger.Info(me,"Failed to clone repository {}: {}".format(repoName, e))
-			pass
-
-		
-		pass
+		if libName not in ProjectUtils.LIBRARIES:
+			op.Logger.Warning(me,"Unknown library: {}".format(libName))
+			return
+		repoName, repoURL = ProjectUtils.LIBRARIES[libName]
+		op.Logger.Info(me,"Cloning repository {} from {}".format(repoName, repoURL))
+		try:
+			ProjectUtils.cloneLibrary(self.ProjectLibPath, libName)
+			op.Logger.Info(me,"Repository {} cloned successfully.".format(repoName))
+			setattr(self, libName, 'Ready')
+		except Exception as e:
+			op.Logger.Info(me,"Failed to clone repository {}: {}".format(repoName, e))
 	
 	def LogMessage(self, info):
 		# Log message to WebLogger if available
@@ -453,21 +1111,9 @@ class ProjectManagerExt:
 		
 		version = parent().par.Version.eval() # ex python39/python.exe
 		#check if thsis version is already installed in LOCALAPPDATA or in PROGRAMFILES
-		possible_paths = [
-			f"C:/Program Files/",
-			f"C:/Users/{os.getlogin()}/AppData/Local/Programs/Python/",
-		]
+		pythonExe = ProjectUtils.findBasePython(version)
 
-		#check if version is on possible paths
-		pythonExe = 'Unknown'
-		for basePath in possible_paths:
-			pythonPath = os.path.join(basePath, version)
-			
-			if os.path.exists(pythonPath):
-				pythonExe = pythonPath
-				break
-
-		if pythonExe == 'Unknown':
+		if not pythonExe:
 			op.Logger.Warning(me,"Desired Python version not found: {}".format(version))
 			self.VenvStatus = 'Failed'
 			return
@@ -480,9 +1126,26 @@ class ProjectManagerExt:
 			return
 		venvPath = os.path.join(project.folder, venvFolder)
 		if not os.path.exists(venvPath):
+			templateFolder = self.getVenvTemplateFolder(os.path.dirname(pythonExe))
+			if templateFolder and ProjectUtils.isTemplateReady(templateFolder):
+				# copy the prebuilt venv with hardlinks instead of building it
+				op.Logger.Info(me,"Cloning virtual environment template {} to: {}".format(templateFolder, venvPath))
+				self.VenvStatus = 'Cloning template'
+
+				def onCloned(fileCount, error):
+					if error:
+						op.Logger.Error(me,"Failed to clone virtual environment template: {}".format(error))
+						self.VenvStatus = 'Failed'
+						return
+					op.Logger.Info(me,"Virtual environment cloned from template ({} files).".format(fileCount))
+					self.activateVenv(venvPath)
+
+				self.RunInBackground(ProjectUtils.cloneTree, onCloned, templateFolder, venvPath)
+				return
+
 			op.Logger.Info(me,"Creating virtual environment at: {}".format(venvPath))
 			try:
-				subprocess.run([pythonPath, '-m', 'venv', venvPath], check=True)
+				subprocess.run([pythonExe, '-m', 'venv', venvPath], check=True)
 				op.Logger.Info(me,"Virtual environment created successfully.")
 				self.VenvStatus = 'Ready'
 			except Exception as e:
@@ -491,8 +1154,16 @@ class ProjectManagerExt:
 			op.Logger.Info(me,"Virtual environment already exists at: {}".format(venvPath))
 			self.VenvStatus = 'Ready'
 
-		self.VenvPythonExe = os.path.join(venvFolder, 'Scripts', 'python.exe')
+		self.activateVenv(venvPath)
 
+	def activateVenv(self, venvPath):
+		# Use the venv, add it to PATH and probe its interpreter
+		venvPythonExe = ProjectUtils.findVenvPython(venvPath)
+		if not venvPythonExe:
+			op.Logger.Error(me,"Python executable not found in venv at: {}".format(venvPath))
+			self.VenvStatus = 'Failed'
+			return
+		self.VenvPythonExe = venvPythonExe
 
 			# add it to PATH
 		if venvPath not in os.environ['PATH']:
@@ -500,63 +1171,84 @@ class ProjectManagerExt:
 			op.Logger.Info(me,"Virtual environment added to PATH.")
 			#add scripts folder too
 			os.environ['PATH'] += ';' + os.path.join(venvPath, 'Scripts')
-		try:
-			venvPythonExe = os.path.join(venvFolder, 'Scripts', 'python.exe')
-			result = subprocess.run([venvPythonExe, '--version'], capture_output=True, text=True, check=True)
-			venvPythonVersion = result.stdout.strip()
-			op.Logger.Info(me, f"Virtual environment Python version: {venvPythonVersion}")
-			self.VenvStatus = venvPythonVersion + " in /" + venvFolder
-		except Exception as e:
-			op.Logger.Warning(me, f"Failed to get Python version from venv: {e}")
-			venvPythonVersion = 'Unknown'
 
-		
-		#Install pip in the venv
-		try:
-			subprocess.run([self.VenvPythonExe, '-m', 'ensurepip'], check=True)
+		# probe the venv, only install pip when it is missing
+		self.ProbeVenv(venvPythonExe, venvPath, onProbed=lambda info: self.ensureVenvPip(info, venvPath))
+
+	def getVenvTemplateFolder(self, pythonHome):
+		# Template venv folder for the base python and the current requirements.txt,
+		# None when templates are disabled with the Venvtemplates parameter
+		if hasattr(parent().par, 'Venvtemplates') and not parent().par.Venvtemplates.eval():
+			return None
+		requirementsPath = os.path.join(project.folder, 'Assets', 'Python', 'requirements.txt')
+		requirementsHash = ProjectUtils.hashFile(requirementsPath) if os.path.exists(requirementsPath) else ''
+		return ProjectUtils.venvTemplateFolder(pythonHome, requirementsHash)
+
+	def SaveVenvTemplate(self):
+		# Store the project venv as the machine wide template for its base python
+		# and requirements.txt, new projects with the same requirements clone it
+		venvFolder = self.getVenvFolder()
+		pythonHome = ProjectUtils.readPyvenvCfg(venvFolder).get('home')
+		if not pythonHome:
+			op.Logger.Warning(me,"No pyvenv.cfg found in: {}".format(venvFolder))
+			return
+		templateFolder = self.getVenvTemplateFolder(pythonHome)
+		if not templateFolder or ProjectUtils.isTemplateReady(templateFolder):
+			return
+
+		def onDone(fileCount, error):
+			if error:
+				op.Logger.Warning(me,"Failed to save virtual environment template: {}".format(error))
+				return
+			op.Logger.Info(me,"Virtual environment template saved to {} ({} files).".format(templateFolder, fileCount))
+
+		self.RunInBackground(ProjectUtils.saveVenvTemplate, onDone, venvFolder, templateFolder, pythonHome)
+
+	def ensureVenvPip(self, info, venvPath):
+		# Install pip in the venv in the background if the probe didn't find it
+		if info.get('Pip'):
+			return
+		pythonExe = self.VenvPythonExe
+
+		def onDone(result, error):
+			if error:
+				op.Logger.Error(me,"Failed to install pip in virtual environment: {}".format(error))
+				return
 			op.Logger.Info(me,"pip installed in virtual environment.")
-		except Exception as e:
-			op.Logger.Error(me,"Failed to install pip in virtual environment: {}".format(e))
+			self.InvalidateVenvProbe()
+			self.ProbeVenv(pythonExe, venvPath)
+
+		op.Logger.Info(me,"Installing pip in virtual environment...")
+		self.RunInBackground(lambda: subprocess.run([pythonExe, '-m', 'ensurepip'], capture_output=True, check=True), onDone)
 
 	def PipInstallPackage(self, packageName):
 		# Install the specified package in the virtual environment
 		packageName = str(packageName)
 		
-		venvFolder = parent().par.Venvfolder.eval()
+		venvFolder = self.getVenvFolder()
+		pythonExe = ProjectUtils.findVenvPython(venvFolder)
 		
-		# Convert to absolute path if relative
-		if not os.path.isabs(venvFolder):
-			venvFolder = os.path.abspath(os.path.join(project.folder, venvFolder))
-		
-		# Try both possible locations for python.exe (venv root and Scripts subfolder)
-		pythonExe = os.path.join(venvFolder, 'Scripts', 'python.exe')
-		if not os.path.exists(pythonExe):
-			pythonExe = os.path.join(venvFolder, 'python.exe')
-		
-		if not os.path.exists(pythonExe):
+		if not pythonExe:
 			op.Logger.Warning(me,"Python executable not found in venv at: {}".format(venvFolder))
 			return
 			
-		try:
-			subprocess.run([pythonExe, '-m', 'pip', 'install', packageName], check=True)
-			op.Logger.Info(me,"Package {} installed successfully in virtual environment.".format(packageName))
-		except Exception as e:
-			op.Logger.Error(me,"Failed to install package {}: {}".format(packageName, e))
+		def onDone(returnCode):
+			if returnCode == 0:
+				op.Logger.Info(me,"Package {} installed successfully in virtual environment.".format(packageName))
+			else:
+				op.Logger.Error(me,"Failed to install package {}: pip exited with {}".format(packageName, returnCode))
 
-	def PipInstallRequirements(self):
+		self.QueuePipJob(pythonExe, ['install', packageName] + self.wheelhouseArgs(), 'Install ' + packageName, onDone)
+
+	def PipInstallRequirements(self, force=False):
 		# Install packages from Assets/Python/requirements.txt
-		venvFolder = parent().par.Venvfolder.eval()
+		# pip is skipped when requirements.lock.json matches the requirements hash
+		# and the venv still has every locked package, otherwise only the
+		# unsatisfied requirements are installed
+		venvFolder = self.getVenvFolder()
+		pythonExe = ProjectUtils.findVenvPython(venvFolder)
 		
-		# Convert to absolute path if relative
-		if not os.path.isabs(venvFolder):
-			venvFolder = os.path.abspath(os.path.join(project.folder, venvFolder))
-		
-		# Try both possible locations for python.exe (venv root and Scripts subfolder)
-		pythonExe = os.path.join(venvFolder, 'Scripts', 'python.exe')
-		if not os.path.exists(pythonExe):
-			pythonExe = os.path.join(venvFolder, 'python.exe')
-		
-		if not os.path.exists(pythonExe):
+		if not pythonExe:
 			op.Logger.Warning(me,"Python executable not found in venv at: {}".format(venvFolder))
 			return
 			
@@ -564,49 +1256,265 @@ class ProjectManagerExt:
 		if not os.path.exists(requirementsPath):
 			op.Logger.Warning(me,"requirements.txt file not found at: {}".format(requirementsPath))
 			return
+
+		lockPath = os.path.join(project.folder, 'Assets', 'Python', 'requirements.lock.json')
+		requirementsHash = ProjectUtils.hashFile(requirementsPath)
+		sitePackages = ProjectUtils.findSitePackages(venvFolder) or self.VenvInfo.get('SitePackages')
+		installed = ProjectUtils.installedDistributions(sitePackages)
+
+		pipArgs = ['install', '-r', requirementsPath]
+		if not force:
+			if ProjectUtils.lockSatisfied(ProjectUtils.readLock(lockPath), requirementsHash, installed):
+				op.Logger.Info(me,"Virtual environment matches requirements.lock.json, nothing to install.")
+				return
+
+			unsatisfied = ProjectUtils.unsatisfiedRequirements(requirementsPath, installed)
+			if unsatisfied == []:
+				ProjectUtils.writeLock(lockPath, requirementsHash, installed, self.VenvInfo.get('Version', ''))
+				op.Logger.Info(me,"Virtual environment already satisfies requirements.txt, lock file updated.")
+				return
+			if unsatisfied:
+				op.Logger.Info(me,"Requirements to install: {}".format(', '.join(unsatisfied)))
+				pipArgs = ['install'] + unsatisfied
+		pipArgs += self.wheelhouseArgs()
 		
 		op.Logger.Info(me,"Installing from: {}".format(requirementsPath))
 		op.Logger.Info(me,"Using Python: {}".format(pythonExe))
 		
+		def onDone(returnCode):
+			if returnCode == 0:
+				ProjectUtils.writeLock(lockPath, requirementsHash, ProjectUtils.installedDistributions(sitePackages), self.VenvInfo.get('Version', ''))
+				op.Logger.Info(me,"Packages from requirements.txt installed successfully in virtual environment.")
+				self.SaveVenvTemplate()
+			else:
+				op.Logger.Error(me,"Failed to install packages from requirements.txt: pip exited with {}".format(returnCode))
+
+		self.QueuePipJob(pythonExe, pipArgs, 'Install requirements.txt', onDone)
+
+	def GetWheelhouse(self):
+		# Wheelhouse folder: Wheelhouse parameter, CKUI_WHEELHOUSE for a machine wide one,
+		# or Assets/Python/wheels in the project
+		wheelhouse = parent().par.Wheelhouse.eval() if hasattr(parent().par, 'Wheelhouse') else ''
+		wheelhouse = wheelhouse or os.getenv('CKUI_WHEELHOUSE', '')
+		if not wheelhouse:
+			return os.path.join(project.folder, 'Assets', 'Python', 'wheels')
+		if not os.path.isabs(wheelhouse):
+			wheelhouse = os.path.abspath(os.path.join(project.folder, wheelhouse))
+		return wheelhouse
+
+	def wheelhouseArgs(self):
+		# pip install arguments, installs only use the wheelhouse when Offlineinstall is on
+		offline = parent().par.Offlineinstall.eval() if hasattr(parent().par, 'Offlineinstall') else False
+		wheelhouse = self.GetWheelhouse()
+		if offline and not ProjectUtils.hasWheels(wheelhouse):
+			op.Logger.Warning(me,"Offline install enabled but the wheelhouse is empty: {}".format(wheelhouse))
+		return ProjectUtils.wheelhouseArgs(wheelhouse, offline)
+
+	def BuildWheelhouse(self):
+		# Build wheels for requirements.txt and GitPython into the wheelhouse,
+		# run it once with network access, later installs can be done offline
+		venvFolder = self.getVenvFolder()
+		pythonExe = ProjectUtils.findVenvPython(venvFolder)
+		if not pythonExe:
+			op.Logger.Warning(me,"Python executable not found in venv at: {}".format(venvFolder))
+			return
+
+		wheelhouse = self.GetWheelhouse()
+		os.makedirs(wheelhouse, exist_ok=True)
+		# wheels already in the wheelhouse are reused instead of downloaded again
+		pipArgs = ['-w', wheelhouse, '--find-links', wheelhouse]
+
+		def onDone(returnCode):
+			if returnCode == 0:
+				op.Logger.Info(me,"Wheelhouse updated: {}".format(wheelhouse))
+			else:
+				op.Logger.Error(me,"Failed to build wheelhouse: pip exited with {}".format(returnCode))
+
+		requirementsPath = os.path.join(project.folder, 'Assets', 'Python', 'requirements.txt')
+		if os.path.exists(requirementsPath):
+			self.QueuePipJob(pythonExe, ['wheel', '-r', requirementsPath] + pipArgs, 'Wheelhouse requirements.txt', onDone)
+		self.QueuePipJob(pythonExe, ['wheel', 'GitPython'] + pipArgs, 'Wheelhouse GitPython', onDone)
+
+	def QueuePipJob(self, pythonExe, pipArgs, label, onDone=None):
+		# Run pip in the background, jobs of the same venv run one after the other
+		# so two installs never write to the venv at the same time
+		# onDone(returnCode) is called on the main thread, returnCode is None if cancelled
+		venvKey = os.path.normcase(os.path.abspath(pythonExe))
+		job = {
+			'PythonExe': pythonExe,
+			'Args': pipArgs,
+			'Label': label,
+			'OnDone': onDone,
+			'Process': None,
+			'Output': queue.Queue(),
+			'Lines': 0,
+			'Cancelled': False
+		}
+		self.pipQueues.setdefault(venvKey, collections.deque()).append(job)
+		if venvKey in self.pipJobs:
+			op.Logger.Info(me,"pip job queued: {}".format(label))
+			self.setPipStatus('Queued: ' + label)
+		else:
+			self.startNextPipJob(venvKey)
+		return job
+
+	def CancelPipJobs(self):
+		# Stop the running pip jobs and drop the queued ones
+		for pending in self.pipQueues.values():
+			for job in pending:
+				job['Cancelled'] = True
+				if job['OnDone']:
+					job['OnDone'](None)
+			pending.clear()
+		for job in self.pipJobs.values():
+			job['Cancelled'] = True
+			if job['Process'] and job['Process'].poll() is None:
+				job['Process'].terminate()
+		op.Logger.Warning(me,"pip jobs cancelled.")
+
+	def startNextPipJob(self, venvKey):
+		pending = self.pipQueues.get(venvKey)
+		if not pending:
+			self.pipJobs.pop(venvKey, None)
+			if not self.pipJobs:
+				self.setPipStatus('Idle')
+			return
+
+		job = pending.popleft()
+		self.pipJobs[venvKey] = job
+		op.Logger.Info(me,"pip job started: {}".format(job['Label']))
+		self.setPipStatus('Running: ' + job['Label'])
+		command = [job['PythonExe'], '-m', 'pip'] + job['Args']
+		if job['Args'][0] in ('install', 'download', 'wheel'):
+			# the progress bar redraws a single line, it is noise once streamed to the log
+			command += ['--progress-bar', 'off']
 		try:
-			subprocess.run([pythonExe, '-m', 'pip', 'install', '-r', requirementsPath], check=True)
-			op.Logger.Info(me,"Packages from requirements.txt installed successfully in virtual environment.")
+			job['Process'] = subprocess.Popen(
+				command,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE,
+				text=True,
+				bufsize=1,
+				env=dict(os.environ, PYTHONUNBUFFERED='1'),
+				creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
 		except Exception as e:
-			op.Logger.Error(me,"Failed to install packages from requirements.txt: {}".format(e))
+			op.Logger.Error(me,"Failed to start pip job {}: {}".format(job['Label'], e))
+			if job['OnDone']:
+				job['OnDone'](-1)
+			self.startNextPipJob(venvKey)
+			return
 
-		
+		def readStream(stream, level):
+			for line in stream:
+				job['Output'].put((level, line.rstrip()))
+			stream.close()
+
+		def waitProcess(readers):
+			for reader in readers:
+				reader.join()
+			job['Output'].put(('EXIT', job['Process'].wait()))
+
+		readers = [
+			threading.Thread(target=readStream, args=(job['Process'].stdout, 'INFO'), daemon=True),
+			threading.Thread(target=readStream, args=(job['Process'].stderr, 'WARNING'), daemon=True)
+		]
+		for reader in readers:
+			reader.start()
+		threading.Thread(target=waitProcess, args=(readers,), daemon=True).start()
+
+		if not self.pipPollScheduled:
+			self.pipPollScheduled = True
+			run("args[0]()", self.pollPipJobs, delayFrames=1)
 
+	def pollPipJobs(self):
+		# Stream pip output into the Logger, a bounded number of lines per frame
+		# finished jobs start the next one of their venv, it is polled by this loop
+		self.pipPollScheduled = False
+		for venvKey, job in list(self.pipJobs.items()):
+			for i in range(self.PipLinesPerFrame):
+				try:
+					level, line = job['Output'].get_nowait()
+				except queue.Empty:
+					break
+
+				if level == 'EXIT':
+					returnCode = None if job['Cancelled'] else line
+					if returnCode == 0:
+						op.Logger.Info(me,"pip job finished: {}".format(job['Label']))
+					elif returnCode is None:
+						op.Logger.Warning(me,"pip job cancelled: {}".format(job['Label']))
+					else:
+						op.Logger.Error(me,"pip job failed with exit code {}: {}".format(returnCode, job['Label']))
+					self.setPipStatus('{}: {}'.format('Done' if returnCode == 0 else 'Failed', job['Label']))
+					if job['OnDone']:
+						job['OnDone'](returnCode)
+					self.startNextPipJob(venvKey)
+					break
+
+				if not line:
+					continue
+				job['Lines'] += 1
+				if level == 'WARNING':
+					op.Logger.Warning(me,"pip: {}".format(line))
+				else:
+					op.Logger.Info(me,"pip: {}".format(line))
+				self.setPipStatus('{} ({} lines): {}'.format(job['Label'], job['Lines'], line[:80]))
 
+		if self.pipJobs and not self.pipPollScheduled:
+			self.pipPollScheduled = True
+			run("args[0]()", self.pollPipJobs, delayFrames=1)
 
+	def setPipStatus(self, status):
+		self.PipStatus = status
+		if hasattr(parent().par, 'Pipstatus'):
+			parent().par.Pipstatus = status
 
-	def SetColors(self):
+	def SetColors(self, incremental=False):
 		# Set colors of all nodes in the project to CKUIColor
 		# not for nodes inside components named 'Content'
 		# not for nodes inside components with tag 'CKLib'
-		# recursively exclude those nodes
-		ckColor = self.CKUIColor
-		for node in op('/MainProject').findChildren():
-			exclude = False
-			if 'CKLib' in node.tags:
-				exclude = True
-			parentComp = node.parent()
-			try:
-				while parentComp is not None:
-					if parentComp.name == 'Content' or 'CKLib' in parentComp.tags:
-						exclude = True
-						break
-					parentComp = parentComp.parent()
-			except:
-				pass
-			if not exclude:
-				# Set the node color
-				node.color = ckColor
-
-				# set Icon color if exists
-				if node.name == 'ico':
-					node.par.fontcolorr = ckColor[0]
-					node.par.fontcolorg = ckColor[1]
-					node.par.fontcolorb = ckColor[2]
-			
-		
+		# single top-down walk, excluded components are pruned with their whole subtree
+		# incremental mode only colors operators not seen by a previous run
+		ckColor = tuple(self.CKUIColor)
+		if not incremental:
+			self.ColoredOps = set()
+
+		stack = [op('/MainProject')]
+		while stack:
+			comp = stack.pop()
+			for node in comp.children:
+				if 'CKLib' in node.tags:
+					continue
+				if node.isCOMP and node.name != 'Content':
+					stack.append(node)
+				if node.id in self.ColoredOps:
+					continue
+				self.ColoredOps.add(node.id)
+				self.colorNode(node, ckColor)
+
+	def ColorOp(self, node):
+		# Color a single operator, ex. from an OP Execute DAT onCreate callback
+		parentComp = node
+		while parentComp is not None:
+			if 'CKLib' in parentComp.tags or (parentComp is not node and parentComp.name == 'Content'):
+				return
+			parentComp = parentComp.parent()
+		self.ColoredOps.add(node.id)
+		self.colorNode(node, tuple(self.CKUIColor))
+
+	def colorNode(self, node, ckColor):
+		# Only write the color when it differs, parameter writes are the costly part
+		if not self.sameColor(node.color, ckColor):
+			node.color = ckColor
+
+		# set Icon color if exists
+		if node.name == 'ico':
+			fontColor = (node.par.fontcolorr.eval(), node.par.fontcolorg.eval(), node.par.fontcolorb.eval())
+			if not self.sameColor(fontColor, ckColor):
+				node.par.fontcolorr = ckColor[0]
+				node.par.fontcolorg = ckColor[1]
+				node.par.fontcolorb = ckColor[2]
+
+	def sameColor(self, colorA, colorB):
+		return all(abs(a - b) < 1e-4 for a, b in zip(colorA, colorB))
 
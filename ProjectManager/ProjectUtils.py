@@ -0,0 +1,1629 @@
+"""
+Project Utilities for TouchDesigner
+Author: Arnaud Cassone / CraftKontrol
+Helpers used by the Project Manager Extension that don't depend on TouchDesigner,
+so they can run in worker threads or outside of TouchDesigner.
+"""
+
+import datetime
+import glob
+import hashlib
+import http.server
+import importlib.machinery
+import json
+import mimetypes
+import ntpath
+import os
+import platform
+import queue
+import re
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# Printed as json by the interpreter being probed
+PROBE_SCRIPT = """
+import json, platform, sysconfig
+try:
+	from importlib.metadata import version
+	pip = version('pip')
+except Exception:
+	pip = None
+print(json.dumps({
+	'Version': 'Python ' + platform.python_version(),
+	'Platform': sysconfig.get_platform(),
+	'SitePackages': sysconfig.get_paths()['purelib'],
+	'Pip': pip
+}))
+"""
+
+
+def findVenvPython(venvFolder):
+	"""
+	Find the python executable of a venv.
+
+	Args:
+		venvFolder (str): The venv folder.
+
+	Returns:
+		str|None: Path to the executable, Scripts subfolder (Windows venv), root (embedded Python) or bin (posix venv).
+	"""
+	if not venvFolder:
+		return None
+	for candidate in (os.path.join(venvFolder, 'Scripts', 'python.exe'),
+					os.path.join(venvFolder, 'python.exe'),
+					os.path.join(venvFolder, 'bin', 'python')):
+		if os.path.exists(candidate):
+			return candidate
+	return None
+
+
+def interpreterKey(pythonExe):
+	"""
+	Key identifying an interpreter install, changes when the executable
+	or its pyvenv.cfg is replaced.
+	"""
+	key = '{}|{}'.format(os.path.normcase(os.path.abspath(pythonExe)), os.stat(pythonExe).st_mtime_ns)
+	for cfgPath in (os.path.join(os.path.dirname(pythonExe), 'pyvenv.cfg'),
+					os.path.join(os.path.dirname(os.path.dirname(pythonExe)), 'pyvenv.cfg')):
+		if os.path.exists(cfgPath):
+			key += '|{}'.format(os.stat(cfgPath).st_mtime_ns)
+			break
+	return key
+
+
+def probeInterpreter(pythonExe, timeout=30):
+	"""
+	Run the interpreter once to get its metadata.
+
+	Returns:
+		dict: Version, Platform, SitePackages, Pip (None when pip is missing) and Key.
+	"""
+	key = interpreterKey(pythonExe)
+	result = subprocess.run([pythonExe, '-c', PROBE_SCRIPT], capture_output=True, text=True, check=True, timeout=timeout)
+	info = json.loads(result.stdout.strip().splitlines()[-1])
+	info['Key'] = key
+	return info
+
+
+def hashFile(path, algorithm='sha256', chunkSize=1 << 20):
+	"""
+	Hash the content of a file.
+
+	Returns:
+		str: The hex digest.
+	"""
+	digest = hashlib.new(algorithm)
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(chunkSize), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def normalizeName(name):
+	"""Normalize a distribution name (PEP 503) so requirements and installed names compare."""
+	return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def findSitePackages(venvFolder):
+	"""
+	Find the site-packages folder of a venv without running its interpreter.
+
+	Returns:
+		str|None: Lib/site-packages (Windows) or lib/pythonX.Y/site-packages (posix).
+	"""
+	candidates = [os.path.join(venvFolder, 'Lib', 'site-packages')]
+	candidates += sorted(glob.glob(os.path.join(venvFolder, 'lib', 'python*', 'site-packages')))
+	for candidate in candidates:
+		if os.path.isdir(candidate):
+			return candidate
+	return None
+
+
+def installedDistributions(sitePackages):
+	"""
+	List the distributions installed in a site-packages folder from the
+	.dist-info/.egg-info folder names, without importing anything.
+
+	Returns:
+		dict: Normalized name -> version.
+	"""
+	installed = {}
+	if not sitePackages or not os.path.isdir(sitePackages):
+		return installed
+	for entry in os.scandir(sitePackages):
+		for suffix in ('.dist-info', '.egg-info'):
+			if entry.name.endswith(suffix):
+				name, _, version = entry.name[:-len(suffix)].partition('-')
+				version = version.split('-py')[0]
+				installed[normalizeName(name)] = version
+	return installed
+
+
+def loadRequirementClass():
+	"""Requirement class from packaging, or from the copy vendored by pip."""
+	try:
+		from packaging.requirements import Requirement
+	except ImportError:
+		try:
+			from pip._vendor.packaging.requirements import Requirement
+		except ImportError:
+			return None
+	return Requirement
+
+
+def unsatisfiedRequirements(requirementsPath, installed):
+	"""
+	Compare a requirements file with the installed distributions.
+
+	Args:
+		requirementsPath (str): Path to the requirements.txt file.
+		installed (dict): Normalized name -> version, see installedDistributions.
+
+	Returns:
+		list|None: The requirement lines that are not satisfied, or None
+		when the file uses options (-r, -e, urls...) that can't be checked here.
+	"""
+	Requirement = loadRequirementClass()
+	unsatisfied = []
+	with open(requirementsPath, 'r', encoding='utf-8') as f:
+		lines = f.read().splitlines()
+
+	for line in lines:
+		line = line.split(' #')[0].strip()
+		if not line or line.startswith('#'):
+			continue
+		if line.startswith('-') or '://' in line or line.startswith('.'):
+			return None
+
+		if Requirement:
+			try:
+				requirement = Requirement(line)
+			except Exception:
+				return None
+			if requirement.marker and not requirement.marker.evaluate():
+				continue
+			version = installed.get(normalizeName(requirement.name))
+			if version is None or (requirement.specifier and not requirement.specifier.contains(version, prereleases=True)):
+				unsatisfied.append(line)
+		else:
+			# without packaging only plain names and == pins can be checked
+			match = re.match(r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(?:==\s*([^\s;,]+))?\s*$', line)
+			if not match:
+				return None
+			version = installed.get(normalizeName(match.group(1)))
+			if version is None or (match.group(2) and match.group(2) != version):
+				unsatisfied.append(line)
+
+	return unsatisfied
+
+
+def readLock(lockPath):
+	"""
+	Read a requirements lock file.
+
+	Returns:
+		dict|None: RequirementsHash and Packages (normalized name -> version), None if missing or invalid.
+	"""
+	try:
+		with open(lockPath, 'r', encoding='utf-8') as f:
+			lock = json.load(f)
+	except (OSError, ValueError):
+		return None
+	if not isinstance(lock, dict) or 'RequirementsHash' not in lock:
+		return None
+	return lock
+
+
+def writeLock(lockPath, requirementsHash, packages, pythonVersion=''):
+	"""Write a requirements lock file with the resolved package set."""
+	lock = {
+		'RequirementsHash': requirementsHash,
+		'Python': pythonVersion,
+		'Packages': dict(sorted(packages.items()))
+	}
+	with open(lockPath, 'w', encoding='utf-8') as f:
+		json.dump(lock, f, indent=4)
+	return lock
+
+
+def lockSatisfied(lock, requirementsHash, installed):
+	"""Whether the lock matches the requirements file and every locked package is installed at its version."""
+	if not lock or lock.get('RequirementsHash') != requirementsHash:
+		return False
+	return all(installed.get(name) == version for name, version in lock.get('Packages', {}).items())
+
+
+def machineCacheFolder(*parts):
+	"""
+	Machine wide CKUI cache folder, shared by all projects of the user.
+	%LOCALAPPDATA%/CKUI on Windows, $XDG_CACHE_HOME/ckui or ~/.cache/ckui otherwise.
+	"""
+	if os.getenv('LOCALAPPDATA'):
+		base = os.path.join(os.getenv('LOCALAPPDATA'), 'CKUI')
+	else:
+		base = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'ckui')
+	return os.path.join(base, *parts)
+
+
+def hasWheels(wheelhouse):
+	"""Whether a wheelhouse folder holds any wheel or source archive."""
+	if not wheelhouse or not os.path.isdir(wheelhouse):
+		return False
+	return any(entry.name.endswith(('.whl', '.tar.gz', '.zip')) for entry in os.scandir(wheelhouse))
+
+
+def wheelhouseArgs(wheelhouse, offline=False):
+	"""
+	pip install arguments to use a local wheelhouse.
+
+	Args:
+		wheelhouse (str): Folder holding the wheels.
+		offline (bool): Only install from the wheelhouse, never reach the package index.
+
+	Returns:
+		list: Arguments to append to pip install.
+	"""
+	args = []
+	if offline:
+		args.append('--no-index')
+	if offline or hasWheels(wheelhouse):
+		args += ['--find-links', wheelhouse]
+	return args
+
+
+def readPyvenvCfg(venvFolder):
+	"""
+	Read the pyvenv.cfg of a venv.
+
+	Returns:
+		dict: The key/value pairs, empty if the file is missing.
+	"""
+	config = {}
+	try:
+		with open(os.path.join(venvFolder, 'pyvenv.cfg'), 'r', encoding='utf-8') as f:
+			for line in f:
+				key, sep, value = line.partition('=')
+				if sep:
+					config[key.strip()] = value.strip()
+	except OSError:
+		pass
+	return config
+
+
+def venvTemplateFolder(pythonHome, requirementsHash):
+	"""
+	Machine wide folder of the template venv built with the python install
+	in pythonHome for a given requirements.txt hash.
+	"""
+	key = hashlib.sha256('{}|{}'.format(os.path.normcase(os.path.abspath(pythonHome)), requirementsHash).encode()).hexdigest()[:16]
+	return machineCacheFolder('VenvTemplates', key)
+
+
+# Written in a template venv once it is complete
+TEMPLATE_MARKER = 'ckui_template.json'
+
+
+def isTemplateReady(templateFolder):
+	"""Whether a template venv was completely built."""
+	return os.path.exists(os.path.join(templateFolder, TEMPLATE_MARKER))
+
+
+def linkOrCopy(source, dest, link=True):
+	"""Hardlink a file, copy it when hardlinks are not possible (other volume, FAT...)."""
+	if link:
+		try:
+			os.link(source, dest)
+			return
+		except OSError:
+			pass
+	shutil.copy2(source, dest)
+
+
+def cloneTree(source, dest, link=True, workers=8):
+	"""
+	Clone a folder tree, files are hardlinked in parallel when possible.
+	The clone is built in a temporary folder and renamed once complete.
+
+	Text files of the venv Scripts/bin folders and pyvenv.cfg that
+	contain the source path are copied with the path replaced by dest,
+	so activation scripts point at the clone.
+
+	Returns:
+		int: The number of files cloned.
+	"""
+	source = os.path.abspath(source)
+	dest = os.path.abspath(dest)
+	tempDest = dest + '.tmp-{}'.format(os.getpid())
+	if os.path.exists(tempDest):
+		shutil.rmtree(tempDest)
+
+	oldPath = source.encode()
+	newPath = dest.encode()
+	files = []
+	for root, dirs, fileNames in os.walk(source):
+		relRoot = os.path.relpath(root, source)
+		os.makedirs(os.path.join(tempDest, relRoot), exist_ok=True)
+		for name in dirs + fileNames:
+			sourcePath = os.path.join(root, name)
+			destPath = os.path.normpath(os.path.join(tempDest, relRoot, name))
+			if os.path.islink(sourcePath):
+				os.symlink(os.readlink(sourcePath), destPath)
+			elif name in fileNames and not (relRoot == '.' and name == TEMPLATE_MARKER):
+				rewrite = name == 'pyvenv.cfg' or relRoot.split(os.sep)[0] in ('Scripts', 'bin')
+				files.append((sourcePath, destPath, rewrite))
+		# symlinked folders were recreated as links, don't walk into them
+		dirs[:] = [name for name in dirs if not os.path.islink(os.path.join(root, name))]
+
+	def cloneFile(item):
+		sourcePath, destPath, rewrite = item
+		if rewrite and os.path.getsize(sourcePath) < (1 << 20):
+			with open(sourcePath, 'rb') as f:
+				content = f.read()
+			if b'\0' not in content and oldPath in content:
+				with open(destPath, 'wb') as f:
+					f.write(content.replace(oldPath, newPath))
+				shutil.copystat(sourcePath, destPath)
+				return
+		linkOrCopy(sourcePath, destPath, link)
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		list(executor.map(cloneFile, files))
+
+	os.replace(tempDest, dest)
+	return len(files)
+
+
+def siteIndexKey(sitePackages):
+	"""Key of a site-packages folder, changes when a distribution is installed or removed."""
+	return '{}|{}'.format(os.path.normcase(os.path.abspath(sitePackages)), os.stat(sitePackages).st_mtime_ns)
+
+
+def stdlibModuleNames():
+	"""Top level names of the standard library, venv modules never shadow them."""
+	return set(getattr(sys, 'stdlib_module_names', ())) | set(sys.builtin_module_names)
+
+
+def buildModuleIndex(sitePackages):
+	"""
+	Index the top level modules of a site-packages folder and of the
+	folders added by its .pth files. Standard library names are left out.
+
+	Returns:
+		dict: Module name -> folder holding it.
+	"""
+	index = {}
+	folders = [sitePackages]
+	for entry in os.scandir(sitePackages):
+		if entry.name.endswith('.pth') and entry.is_file():
+			try:
+				with open(entry.path, 'r', encoding='utf-8') as f:
+					for line in f:
+						line = line.strip()
+						if line and not line.startswith(('#', 'import ', 'import\t')):
+							folder = os.path.normpath(os.path.join(sitePackages, line))
+							if os.path.isdir(folder):
+								folders.append(folder)
+			except (OSError, UnicodeDecodeError):
+				pass
+
+	stdlib = stdlibModuleNames()
+	for folder in folders:
+		for entry in os.scandir(folder):
+			name = entry.name
+			if entry.is_dir():
+				if '.' in name or name == '__pycache__' or not name.isidentifier():
+					continue
+			elif name.endswith(('.py', '.pyd', '.so')):
+				name = name.split('.')[0]
+				if not name.isidentifier():
+					continue
+			else:
+				continue
+			if name in stdlib:
+				continue
+			# the first folder wins, like it would on sys.path
+			index.setdefault(name, folder)
+	return index
+
+
+class ModuleIndexFinder:
+	"""
+	Meta path finder resolving top level imports with a module index,
+	so they go straight to their folder instead of trying every sys.path entry.
+	Names missing from the index fall through to the regular finders.
+
+	Insert it right before PathFinder (see insertModuleIndexFinder) so builtin,
+	frozen and standard library modules are never shadowed by the venv.
+	"""
+	isModuleIndexFinder = True
+
+	def __init__(self, index):
+		stdlib = stdlibModuleNames()
+		self.index = {name: folder for name, folder in index.items() if name not in stdlib}
+
+	def find_spec(self, fullname, path=None, target=None):
+		if path is not None:
+			return None
+		folder = self.index.get(fullname)
+		if folder is None:
+			return None
+		return importlib.machinery.PathFinder.find_spec(fullname, [folder])
+
+	def invalidate_caches(self):
+		pass
+
+
+def insertModuleIndexFinder(finder):
+	"""Replace any previous ModuleIndexFinder in sys.meta_path, the new one goes right before PathFinder."""
+	sys.meta_path[:] = [entry for entry in sys.meta_path if not getattr(entry, 'isModuleIndexFinder', False)]
+	position = next((i for i, entry in enumerate(sys.meta_path) if entry is importlib.machinery.PathFinder), len(sys.meta_path))
+	sys.meta_path.insert(position, finder)
+
+
+def writeJsonAtomic(path, data, indent=4):
+	"""
+	Write json to a temporary file next to path and rename it over path,
+	readers never see a partially written file.
+	"""
+	folder = os.path.dirname(os.path.abspath(path))
+	fd, tempPath = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8') as f:
+			json.dump(data, f, indent=indent)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tempPath, path)
+	except BaseException:
+		if os.path.exists(tempPath):
+			os.remove(tempPath)
+		raise
+
+
+def changedKeys(old, new):
+	"""Keys of two dicts whose values were added, removed or changed."""
+	old = old if isinstance(old, dict) else {}
+	new = new if isinstance(new, dict) else {}
+	return [key for key in old.keys() | new.keys() if old.get(key) != new.get(key)]
+
+
+# Folder of the project logs, in the project folder
+PROJECT_LOG_FOLDER = 'Logs'
+
+
+def projectConfig(projectName, toolsPath, logPath, touchDesignerVersion='', modules=None, properties=None):
+	"""
+	Content of the project config.json, the same for TouchDesigner and ProjectManagerCLI.
+	Outside of TouchDesigner the version is unknown and left empty, TouchDesigner fills it in.
+	"""
+	return {
+		"Project": projectName,
+		"ToolsPath": toolsPath,
+		"LogPath": logPath,
+		"TouchDesignerVersion": touchDesignerVersion,
+		"Modules": modules or {},
+		"Properties": properties or {}
+	}
+
+
+# Project folders that are never snapshotted or indexed
+PROJECT_EXCLUDES = ('Backup', 'Logs', 'log', 'TDLogs', '.git', '__pycache__')
+
+
+def gitignoreLines(projectName):
+	"""Lines of the project .gitignore, iterations (projectname.4.toe) are ignored but not projectname.toe."""
+	return [
+		'*.toe',
+		'!' + projectName + '.toe',
+		'Logs/',
+		'log/',
+		'Backup/*',
+		'config.json',
+		'startup_profile.json',
+		'AssetIndex.db*',
+		'preflight_report.json',
+		'provision_report.json',
+		'custom_operators.tox',
+		'*.bak',
+		'*.dmp',
+		'*.pyc'
+	]
+
+
+def writeGitignore(projectFolder, projectName):
+	"""
+	Create the project .gitignore if it doesn't exist.
+
+	Returns:
+		bool: True when the file was created.
+	"""
+	gitignorePath = os.path.join(projectFolder, '.gitignore')
+	if os.path.exists(gitignorePath):
+		return False
+	with open(gitignorePath, 'w') as f:
+		f.write('\n'.join(gitignoreLines(projectName)) + '\n')
+	return True
+
+
+# Libraries cloned in the Libraries folder: name -> (repository folder, url)
+LIBRARIES = {
+	'CKUI': ('CKUI', 'https://github.com/CraftKontrol/CKUI.git'),
+	'CKTDLibrary': ('TD-Library', 'https://github.com/CraftKontrol/TD-Library.git'),
+	'GGEN': ('GroundGen-for-Touchdesigner', 'https://github.com/CraftKontrol/GroundGen-for-Touchdesigner.git'),
+	'TerrainTools': ('Terrain-Tools-for-Touchdesigner', 'https://github.com/CraftKontrol/Terrain-Tools-for-Touchdesigner.git')
+}
+
+# Part of a folder name identifying an installed library, checked in order
+LIBRARY_MARKERS = (('ckui', 'CKUI'), ('td-library', 'CKTDLibrary'), ('groundgen', 'GGEN'), ('terrain-tools', 'TerrainTools'))
+
+
+def findLibraries(librariesFolder):
+	"""
+	Find the libraries installed in the Libraries folder.
+
+	Returns:
+		dict: Library name -> folder path, for the libraries found.
+	"""
+	found = {}
+	if not librariesFolder or not os.path.isdir(librariesFolder):
+		return found
+	for entry in os.scandir(librariesFolder):
+		if not entry.is_dir():
+			continue
+		for marker, name in LIBRARY_MARKERS:
+			if marker in entry.name.lower():
+				found.setdefault(name, entry.path)
+				break
+	return found
+
+
+def cloneLibrary(librariesFolder, name, update=False):
+	"""
+	Clone a library in the Libraries folder, or pull it when it is already there and update is True.
+
+	Returns:
+		str: 'Cloned', 'Updated' or 'Ready'.
+	"""
+	folder = findLibraries(librariesFolder).get(name)
+	if folder:
+		if not update:
+			return 'Ready'
+		subprocess.run(['git', '-C', folder, 'pull', '--ff-only'], capture_output=True, check=True)
+		return 'Updated'
+	repoName, repoURL = LIBRARIES[name]
+	os.makedirs(librariesFolder, exist_ok=True)
+	subprocess.run(['git', 'clone', repoURL, os.path.join(librariesFolder, repoName)], capture_output=True, check=True)
+	return 'Cloned'
+
+
+def findBasePython(version):
+	"""
+	Find a python install on Windows from a relative executable path, ex. Python311/python.exe.
+
+	Returns:
+		str|None: The python executable, None when not found.
+	"""
+	possiblePaths = [
+		"C:/Program Files/",
+		os.path.join(os.path.expanduser('~'), 'AppData/Local/Programs/Python/')
+	]
+	for basePath in possiblePaths:
+		pythonPath = os.path.join(basePath, version)
+		if os.path.exists(pythonPath):
+			return pythonPath
+	return None
+
+
+def createVenv(pythonExe, venvPath, templateFolder=None):
+	"""
+	Create a venv, cloned from templateFolder when it holds a complete template.
+
+	Returns:
+		str: 'Exists', 'Cloned' or 'Created'.
+	"""
+	if os.path.exists(venvPath):
+		return 'Exists'
+	if templateFolder and isTemplateReady(templateFolder):
+		cloneTree(templateFolder, venvPath)
+		return 'Cloned'
+	subprocess.run([pythonExe, '-m', 'venv', venvPath], capture_output=True, check=True)
+	return 'Created'
+
+
+def saveVenvTemplate(venvFolder, templateFolder, pythonHome):
+	"""
+	Store a venv as a template, the marker is written once the copy is complete.
+
+	Returns:
+		int: The number of files cloned.
+	"""
+	if os.path.exists(templateFolder):
+		shutil.rmtree(templateFolder)
+	os.makedirs(os.path.dirname(templateFolder), exist_ok=True)
+	fileCount = cloneTree(venvFolder, templateFolder)
+	with open(os.path.join(templateFolder, TEMPLATE_MARKER), 'w') as f:
+		json.dump({"Source": venvFolder, "Home": pythonHome, "Date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, f, indent=4)
+	return fileCount
+
+
+def installRequirements(pythonExe, requirementsPath, lockPath, pipArgs=(), force=False):
+	"""
+	Install a requirements file in a venv, the same way as PipInstallRequirements:
+	nothing runs when the lock file matches, only unsatisfied requirements are installed
+	otherwise, and the lock file is written after a successful install.
+
+	Returns:
+		dict: Status ('Locked', 'Satisfied' or 'Installed') and the Installed requirements.
+	"""
+	info = probeInterpreter(pythonExe)
+	if not info.get('Pip'):
+		subprocess.run([pythonExe, '-m', 'ensurepip'], capture_output=True, check=True)
+	sitePackages = info.get('SitePackages')
+	requirementsHash = hashFile(requirementsPath)
+	installed = installedDistributions(sitePackages)
+
+	unsatisfied = None
+	if not force:
+		if lockSatisfied(readLock(lockPath), requirementsHash, installed):
+			return {'Status': 'Locked', 'Installed': []}
+		unsatisfied = unsatisfiedRequirements(requirementsPath, installed)
+		if unsatisfied == []:
+			writeLock(lockPath, requirementsHash, installed, info.get('Version', ''))
+			return {'Status': 'Satisfied', 'Installed': []}
+
+	installArgs = ['install'] + unsatisfied if unsatisfied else ['install', '-r', requirementsPath]
+	subprocess.run([pythonExe, '-m', 'pip'] + installArgs + list(pipArgs), capture_output=True, check=True)
+	writeLock(lockPath, requirementsHash, installedDistributions(sitePackages), info.get('Version', ''))
+	return {'Status': 'Installed', 'Installed': unsatisfied or [requirementsPath]}
+
+
+# Manifest at the root of a project template archive: Name, Version and the Libraries it uses
+PROJECT_TEMPLATE_MANIFEST = 'template.json'
+
+# Template files rendered with the project values, other files are copied
+TEMPLATE_TEXT_SUFFIXES = ('.json', '.txt', '.md', '.py', '.cfg', '.ini', '.yaml', '.yml', '.bat', '.ps1', '.sh', '.gitignore')
+
+# Only large binary media of a template is hardlinked from the cache, it is replaced rather
+# than edited in place. Anything else (.toe, .tox, scripts, config) is copied so saving it
+# in a project can't change the cached template and every project made from it
+TEMPLATE_LINK_TYPES = ('image', 'video', 'audio', 'geometry')
+TEMPLATE_LINK_SIZE = 1 << 20
+
+
+def versionKey(version):
+	"""Sort key of a version string, ex. '1.10.2' > '1.9'."""
+	return tuple(int(part) if part.isdigit() else 0 for part in re.split(r'[.\-_]', str(version)))
+
+
+def findProjectTemplates(templatesFolder):
+	"""
+	Find the project template archives <Name>-<Version>.zip of a folder.
+
+	Returns:
+		dict: Template name -> (version, archive path) of its latest version.
+	"""
+	templates = {}
+	for path in glob.glob(os.path.join(templatesFolder, '*.zip')):
+		name, _, version = os.path.basename(path)[:-4].rpartition('-')
+		if not name:
+			continue
+		if name not in templates or versionKey(version) > versionKey(templates[name][0]):
+			templates[name] = (version, path)
+	return templates
+
+
+def projectTemplateArchive(templatesFolder, template):
+	"""
+	The archive of a template given as 'Name' (latest version), 'Name-Version' or an archive path.
+
+	Returns:
+		str|None: The archive path, None when not found.
+	"""
+	if template.endswith('.zip') and os.path.isfile(template):
+		return template
+	path = os.path.join(templatesFolder, template + '.zip')
+	if os.path.isfile(path):
+		return path
+	latest = findProjectTemplates(templatesFolder).get(template)
+	return latest[1] if latest else None
+
+
+def extractProjectTemplate(archivePath):
+	"""
+	Extract a template archive to the machine cache, once per template name and version.
+	The archive is extracted in a temporary folder renamed once complete.
+
+	Returns:
+		tuple: The extracted template folder and its manifest.
+	"""
+	with zipfile.ZipFile(archivePath) as archive:
+		manifest = json.loads(archive.read(PROJECT_TEMPLATE_MANIFEST))
+		folder = machineCacheFolder('ProjectTemplates', manifest['Name'], str(manifest['Version']))
+		if os.path.exists(os.path.join(folder, PROJECT_TEMPLATE_MANIFEST)):
+			return folder, manifest
+
+		tempFolder = folder + '.tmp-{}'.format(os.getpid())
+		if os.path.exists(tempFolder):
+			shutil.rmtree(tempFolder)
+		archive.extractall(tempFolder)
+
+	os.makedirs(os.path.dirname(folder), exist_ok=True)
+	try:
+		os.replace(tempFolder, folder)
+	except OSError:
+		# extracted by another process in the meantime
+		shutil.rmtree(tempFolder, ignore_errors=True)
+		if not os.path.exists(os.path.join(folder, PROJECT_TEMPLATE_MANIFEST)):
+			raise
+	return folder, manifest
+
+
+def renderTemplate(text, values):
+	"""Replace the {{Key}} placeholders of a text with values, unknown keys are left as they are."""
+	return re.sub(r'\{\{(\w+)\}\}', lambda match: str(values.get(match.group(1), match.group(0))), text)
+
+
+def materializeTemplate(templateFolder, projectFolder, values, link=True, workers=8, overwrite=False):
+	"""
+	Write an extracted template into a project folder, in parallel.
+
+	Folder and file names are rendered with values, text files holding placeholders
+	are rendered too, large media files are hardlinked from the template cache when
+	link is True and other files are copied.
+	Existing project files are kept unless overwrite is True.
+
+	Returns:
+		dict: Files written, Rendered files, Skipped existing files and Seconds.
+	"""
+	start = time.perf_counter()
+	tasks = []
+	skipped = 0
+	for root, dirs, fileNames in os.walk(templateFolder):
+		relRoot = os.path.relpath(root, templateFolder)
+		destRoot = projectFolder if relRoot == '.' else os.path.join(projectFolder, renderTemplate(relRoot, values))
+		os.makedirs(destRoot, exist_ok=True)
+		for name in fileNames:
+			if relRoot == '.' and name == PROJECT_TEMPLATE_MANIFEST:
+				continue
+			destPath = os.path.join(destRoot, renderTemplate(name, values))
+			if os.path.exists(destPath):
+				if not overwrite:
+					skipped += 1
+					continue
+				os.remove(destPath)
+			tasks.append((os.path.join(root, name), destPath))
+
+	def writeFile(item):
+		sourcePath, destPath = item
+		if sourcePath.endswith(TEMPLATE_TEXT_SUFFIXES) and os.path.getsize(sourcePath) < (1 << 20):
+			with open(sourcePath, 'rb') as f:
+				content = f.read()
+			if b'{{' in content:
+				try:
+					text = content.decode('utf-8')
+				except UnicodeDecodeError:
+					text = None
+				if text is not None:
+					with open(destPath, 'w', encoding='utf-8', newline='') as f:
+						f.write(renderTemplate(text, values))
+					return True
+		if link and mediaType(sourcePath) in TEMPLATE_LINK_TYPES and os.path.getsize(sourcePath) >= TEMPLATE_LINK_SIZE:
+			linkOrCopy(sourcePath, destPath)
+		else:
+			shutil.copy2(sourcePath, destPath)
+		return False
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		rendered = sum(executor.map(writeFile, tasks))
+
+	return {'Files': len(tasks), 'Rendered': rendered, 'Skipped': skipped, 'Seconds': round(time.perf_counter() - start, 3)}
+
+
+class SnapshotStore:
+	"""
+	Content addressed, deduplicated snapshots of a folder.
+
+	Files are split in fixed size chunks, each chunk is stored once under
+	objects/ with zlib compression (raw when it doesn't compress, ex. media),
+	a snapshot is a json manifest under snapshots/ listing the chunks of every file.
+	Files with the same size and mtime as in the previous snapshot are not read again.
+	"""
+
+	def __init__(self, backupFolder, chunkSize=4 << 20, workers=8, compressLevel=1):
+		self.backupFolder = backupFolder
+		self.objectsFolder = os.path.join(backupFolder, 'objects')
+		self.snapshotsFolder = os.path.join(backupFolder, 'snapshots')
+		self.chunkSize = chunkSize
+		self.workers = workers
+		self.compressLevel = compressLevel
+
+	def listSnapshots(self):
+		"""Snapshot names, oldest first."""
+		if not os.path.isdir(self.snapshotsFolder):
+			return []
+		return sorted(name[:-5] for name in os.listdir(self.snapshotsFolder) if name.endswith('.json'))
+
+	def loadManifest(self, name):
+		with open(os.path.join(self.snapshotsFolder, name + '.json'), 'r', encoding='utf-8') as f:
+			return json.load(f)
+
+	def objectPath(self, digest):
+		return os.path.join(self.objectsFolder, digest[:2], digest)
+
+	def storeChunk(self, path, offset):
+		with open(path, 'rb') as f:
+			f.seek(offset)
+			data = f.read(self.chunkSize)
+		digest = hashlib.sha256(data).hexdigest()
+		objectPath = self.objectPath(digest)
+		if os.path.exists(objectPath):
+			return digest, 0
+
+		compressed = zlib.compress(data, self.compressLevel)
+		payload = b'Z' + compressed if len(compressed) < len(data) * 0.95 else b'R' + data
+		os.makedirs(os.path.dirname(objectPath), exist_ok=True)
+		tempPath = '{}.{}.{}.tmp'.format(objectPath, os.getpid(), threading.get_ident())
+		with open(tempPath, 'wb') as f:
+			f.write(payload)
+		os.replace(tempPath, objectPath)
+		return digest, len(payload)
+
+	def readChunk(self, digest):
+		with open(self.objectPath(digest), 'rb') as f:
+			payload = f.read()
+		return zlib.decompress(payload[1:]) if payload[:1] == b'Z' else payload[1:]
+
+	def snapshot(self, sourceFolder, exclude=()):
+		"""
+		Snapshot a folder.
+
+		Args:
+			sourceFolder (str): The folder to back up.
+			exclude (tuple): Folder names or relative paths that are skipped.
+
+		Returns:
+			dict: Name, Files, ChangedFiles, StoredBytes and Seconds.
+		"""
+		start = time.perf_counter()
+		sourceFolder = os.path.abspath(sourceFolder)
+		snapshots = self.listSnapshots()
+		previous = {}
+		if snapshots:
+			manifest = self.loadManifest(snapshots[-1])
+			if manifest.get('ChunkSize') == self.chunkSize:
+				previous = manifest['Files']
+		exclude = {os.path.normcase(os.path.normpath(path)) for path in exclude}
+
+		files = {}
+		changed = []
+		for root, dirs, fileNames in os.walk(sourceFolder):
+			relRoot = os.path.relpath(root, sourceFolder)
+			dirs[:] = [name for name in dirs
+				if name not in exclude and os.path.normcase(os.path.normpath(os.path.join(relRoot, name))) not in exclude]
+			for name in fileNames:
+				path = os.path.join(root, name)
+				relPath = os.path.normpath(os.path.join(relRoot, name)).replace(os.sep, '/')
+				try:
+					stat = os.stat(path)
+				except OSError:
+					continue
+				entry = {'Size': stat.st_size, 'Mtime': stat.st_mtime_ns}
+				old = previous.get(relPath)
+				if old and old['Size'] == entry['Size'] and old['Mtime'] == entry['Mtime']:
+					entry['Chunks'] = old['Chunks']
+				else:
+					changed.append((relPath, path, stat.st_size))
+				files[relPath] = entry
+
+		# every chunk of every changed file is hashed and stored in parallel
+		tasks = [(relPath, path, offset) for relPath, path, size in changed for offset in range(0, max(size, 1), self.chunkSize)]
+		storedBytes = 0
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			results = executor.map(lambda task: self.storeChunk(task[1], task[2]), tasks)
+			for (relPath, path, offset), (digest, written) in zip(tasks, results):
+				files[relPath].setdefault('Chunks', []).append(digest)
+				storedBytes += written
+
+		name = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+		while name in snapshots:
+			name += '_'
+		os.makedirs(self.snapshotsFolder, exist_ok=True)
+		manifest = {'Name': name, 'Source': sourceFolder, 'ChunkSize': self.chunkSize, 'Files': files}
+		writeJsonAtomic(os.path.join(self.snapshotsFolder, name + '.json'), manifest, indent=None)
+		return {'Name': name, 'Files': len(files), 'ChangedFiles': len(changed), 'StoredBytes': storedBytes, 'Seconds': round(time.perf_counter() - start, 3)}
+
+	def restore(self, name, targetFolder):
+		"""
+		Restore a snapshot into a folder, files already matching
+		the snapshot size and mtime are left untouched.
+
+		Returns:
+			dict: Files, RestoredFiles and Seconds.
+		"""
+		start = time.perf_counter()
+		files = self.loadManifest(name)['Files']
+
+		def restoreFile(item):
+			relPath, entry = item
+			path = os.path.join(targetFolder, *relPath.split('/'))
+			try:
+				stat = os.stat(path)
+				if stat.st_size == entry['Size'] and stat.st_mtime_ns == entry['Mtime']:
+					return 0
+			except OSError:
+				pass
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			tempPath = path + '.restore.tmp'
+			with open(tempPath, 'wb') as f:
+				for digest in entry['Chunks']:
+					f.write(self.readChunk(digest))
+			os.utime(tempPath, ns=(entry['Mtime'], entry['Mtime']))
+			os.replace(tempPath, path)
+			return 1
+
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			restored = sum(executor.map(restoreFile, files.items()))
+		return {'Files': len(files), 'RestoredFiles': restored, 'Seconds': round(time.perf_counter() - start, 3)}
+
+	def prune(self, keep):
+		"""
+		Delete the oldest snapshots, keeping the last ones,
+		and the chunks no remaining snapshot uses.
+
+		Returns:
+			int: The number of chunks deleted.
+		"""
+		snapshots = self.listSnapshots()
+		for name in snapshots[:-keep] if keep > 0 else []:
+			os.remove(os.path.join(self.snapshotsFolder, name + '.json'))
+
+		used = set()
+		for name in self.listSnapshots():
+			for entry in self.loadManifest(name)['Files'].values():
+				used.update(entry['Chunks'])
+
+		deleted = 0
+		if os.path.isdir(self.objectsFolder):
+			for root, dirs, fileNames in os.walk(self.objectsFolder):
+				for digest in fileNames:
+					if digest not in used:
+						os.remove(os.path.join(root, digest))
+						deleted += 1
+		return deleted
+
+
+# Media types from the file extension, mimetypes doesn't know most of these
+MEDIA_TYPES = {
+	'.toe': 'touchdesigner', '.tox': 'touchdesigner',
+	'.exr': 'image', '.dds': 'image', '.hdr': 'image', '.tga': 'image', '.psd': 'image',
+	'.mov': 'video', '.mp4': 'video', '.avi': 'video', '.mkv': 'video', '.webm': 'video', '.hap': 'video',
+	'.wav': 'audio', '.aif': 'audio', '.aiff': 'audio', '.flac': 'audio', '.ogg': 'audio', '.mp3': 'audio',
+	'.obj': 'geometry', '.fbx': 'geometry', '.abc': 'geometry', '.usd': 'geometry', '.usdz': 'geometry', '.glb': 'geometry', '.gltf': 'geometry', '.ply': 'geometry',
+	'.py': 'text', '.json': 'text', '.glsl': 'text', '.frag': 'text', '.vert': 'text', '.csv': 'text', '.txt': 'text', '.md': 'text', '.xml': 'text'
+}
+
+
+def mediaType(path):
+	"""Media type of a file: image, video, audio, geometry, text, touchdesigner or other."""
+	extension = os.path.splitext(path)[1].lower()
+	if extension in MEDIA_TYPES:
+		return MEDIA_TYPES[extension]
+	mimeType = mimetypes.guess_type(path)[0] or ''
+	majorType = mimeType.split('/')[0]
+	return majorType if majorType in ('image', 'video', 'audio', 'text') else 'other'
+
+
+def hashAsset(path):
+	"""Content hash of an asset, module level so process pools can pickle it."""
+	return hashFile(path, 'blake2b', 4 << 20)
+
+
+class AssetIndex:
+	"""
+	SQLite index of the files of a folder: path, size, mtime, content hash and media type.
+
+	Rescans only hash files that are new or whose size or mtime changed.
+	Hashing runs on a thread pool, or a process pool when useProcesses is set,
+	which can't be used inside TouchDesigner where sys.executable is TouchDesigner itself.
+	"""
+
+	def __init__(self, dbPath):
+		self.dbPath = dbPath
+		self.connection = sqlite3.connect(dbPath)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('''CREATE TABLE IF NOT EXISTS assets (
+			path TEXT PRIMARY KEY,
+			folder TEXT NOT NULL,
+			size INTEGER NOT NULL,
+			mtime INTEGER NOT NULL,
+			hash TEXT NOT NULL,
+			mediaType TEXT NOT NULL)''')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS assetsHash ON assets (hash)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS assetsFolder ON assets (folder)')
+		self.connection.commit()
+
+	def close(self):
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def scan(self, rootFolder, exclude=(), workers=None, useProcesses=False):
+		"""
+		Update the index with the files of a folder.
+
+		Args:
+			rootFolder (str): The indexed folder, paths are stored relative to it with '/' separators.
+			exclude (tuple): Folder names or relative paths that are skipped.
+			workers (int, optional): Number of hashing workers. Defaults to the cpu count.
+			useProcesses (bool, optional): Hash in worker processes instead of threads.
+
+		Returns:
+			dict: Files, Hashed, Removed and Seconds.
+		"""
+		start = time.perf_counter()
+		rootFolder = os.path.abspath(rootFolder)
+		exclude = {os.path.normcase(os.path.normpath(path)) for path in exclude}
+		dbName = os.path.basename(self.dbPath)
+		known = {row[0]: (row[1], row[2]) for row in self.connection.execute('SELECT path, size, mtime FROM assets')}
+
+		seen = set()
+		changed = []
+		for root, dirs, fileNames in os.walk(rootFolder):
+			relRoot = os.path.relpath(root, rootFolder)
+			dirs[:] = [name for name in dirs
+				if name not in exclude and os.path.normcase(os.path.normpath(os.path.join(relRoot, name))) not in exclude]
+			for name in fileNames:
+				if name.startswith(dbName):
+					continue
+				relPath = os.path.normpath(os.path.join(relRoot, name)).replace(os.sep, '/')
+				try:
+					stat = os.stat(os.path.join(root, name))
+				except OSError:
+					continue
+				seen.add(relPath)
+				if known.get(relPath) != (stat.st_size, stat.st_mtime_ns):
+					changed.append((relPath, stat.st_size, stat.st_mtime_ns))
+
+		rows = []
+		if changed:
+			executorClass = ProcessPoolExecutor if useProcesses else ThreadPoolExecutor
+			with executorClass(max_workers=workers or os.cpu_count()) as executor:
+				paths = [os.path.join(rootFolder, *relPath.split('/')) for relPath, size, mtime in changed]
+				for (relPath, size, mtime), digest in zip(changed, executor.map(hashAsset, paths, chunksize=8 if useProcesses else 1)):
+					folder = relPath.rpartition('/')[0]
+					rows.append((relPath, folder, size, mtime, digest, mediaType(relPath)))
+
+		removed = [(path,) for path in known if path not in seen]
+		with self.connection:
+			self.connection.executemany('INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?)', rows)
+			self.connection.executemany('DELETE FROM assets WHERE path = ?', removed)
+		return {'Files': len(seen), 'Hashed': len(rows), 'Removed': len(removed), 'Seconds': round(time.perf_counter() - start, 3)}
+
+	def get(self, relPath):
+		"""
+		Returns:
+			dict|None: The indexed entry of a relative path.
+		"""
+		row = self.connection.execute('SELECT path, folder, size, mtime, hash, mediaType FROM assets WHERE path = ?', (relPath,)).fetchone()
+		if row is None:
+			return None
+		return dict(zip(('Path', 'Folder', 'Size', 'Mtime', 'Hash', 'MediaType'), row))
+
+	def duplicates(self):
+		"""
+		Returns:
+			list: Lists of paths with the same content, biggest files first.
+		"""
+		rows = self.connection.execute('''SELECT group_concat(path, '\n') FROM assets WHERE size > 0
+			GROUP BY hash HAVING count(*) > 1 ORDER BY max(size) DESC''')
+		return [row[0].split('\n') for row in rows]
+
+	def missing(self, relPaths):
+		"""
+		Returns:
+			list: The relative paths that aren't in the index.
+		"""
+		return [relPath for relPath in relPaths
+			if self.connection.execute('SELECT 1 FROM assets WHERE path = ?', (relPath,)).fetchone() is None]
+
+	def sizeByFolder(self, mediaType=None):
+		"""
+		Total size of the files directly in each folder, optionally for one media type.
+
+		Returns:
+			dict: Relative folder -> size in bytes.
+		"""
+		if mediaType:
+			rows = self.connection.execute('SELECT folder, sum(size) FROM assets WHERE mediaType = ? GROUP BY folder', (mediaType,))
+		else:
+			rows = self.connection.execute('SELECT folder, sum(size) FROM assets GROUP BY folder')
+		return dict(rows.fetchall())
+
+
+def verifyAssets(paths, rootFolder, assetIndex=None, checksums=False, workers=8):
+	"""
+	Check that referenced files exist and match the asset index.
+
+	Args:
+		paths (list): Absolute file paths.
+		rootFolder (str): The folder indexed by assetIndex.
+		assetIndex (AssetIndex, optional): Index to compare sizes and hashes with.
+		checksums (bool, optional): Hash files whose mtime differs from the index.
+
+	Returns:
+		dict: Path -> Status (ok, missing, modified, unindexed) and Size.
+	"""
+	rootFolder = os.path.abspath(rootFolder)
+	entries = {}
+	if assetIndex:
+		for path in paths:
+			try:
+				relPath = os.path.relpath(path, rootFolder)
+			except ValueError:
+				# on another drive than the project, outside of the index
+				continue
+			if not relPath.startswith('..'):
+				entries[path] = assetIndex.get(relPath.replace(os.sep, '/'))
+
+	def verify(path):
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return path, {'Status': 'missing', 'Size': None}
+		result = {'Status': 'ok', 'Size': stat.st_size}
+		if os.path.isdir(path):
+			return path, result
+		entry = entries.get(path)
+		if assetIndex and entry is None:
+			result['Status'] = 'unindexed'
+		elif entry:
+			if entry['Size'] != stat.st_size:
+				result['Status'] = 'modified'
+			elif checksums and entry['Mtime'] != stat.st_mtime_ns and hashAsset(path) != entry['Hash']:
+				result['Status'] = 'modified'
+		return path, result
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		return dict(executor.map(verify, paths))
+
+
+def localIPv4Addresses(timeout=2):
+	"""
+	IPv4 addresses of the network interfaces, without any DNS lookup.
+	Uses psutil when installed, the system network tools otherwise.
+
+	Args:
+		timeout (float): Seconds after which the system tool is abandoned.
+
+	Returns:
+		list: Sorted addresses, loopback excluded.
+	"""
+	addresses = set()
+	try:
+		import psutil
+		for interfaceAddresses in psutil.net_if_addrs().values():
+			for address in interfaceAddresses:
+				if address.family == socket.AF_INET:
+					addresses.add(address.address)
+	except ImportError:
+		if platform.system() == 'Windows':
+			command, pattern = ['ipconfig'], r'IPv4[^:\r\n]*:\s*(\d+\.\d+\.\d+\.\d+)'
+		elif shutil.which('ip'):
+			command, pattern = ['ip', '-4', '-o', 'addr', 'show'], r'inet (\d+\.\d+\.\d+\.\d+)'
+		else:
+			command, pattern = ['ifconfig'], r'inet (?:addr:)?(\d+\.\d+\.\d+\.\d+)'
+		try:
+			result = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+				creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+			addresses.update(re.findall(pattern, result.stdout))
+		except (OSError, subprocess.SubprocessError):
+			pass
+
+	if not addresses:
+		# address of the default route, connecting a udp socket sends nothing
+		try:
+			with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+				s.connect(('10.255.255.255', 1))
+				addresses.add(s.getsockname()[0])
+		except OSError:
+			pass
+
+	return sorted((address for address in addresses if not address.startswith('127.')), key=socket.inet_aton)
+
+
+class ClusterNode:
+	"""
+	UDP multicast announce/listen service for the machines of a show.
+
+	Every node sends its status as json. A full status is sent every fullInterval
+	seconds, in between only the changed fields are sent (delta),
+	so the traffic stays small with many nodes. Received statuses are merged in self.nodes,
+	nodes silent for more than timeout seconds are dropped.
+	Network work runs in a thread, the owner reads changes with poll() on its own thread.
+	"""
+
+	def __init__(self, nodeId, group='239.255.42.99', port=42099, interval=1.0, fullInterval=10.0, timeout=5.0, ttl=1):
+		self.nodeId = nodeId
+		self.group = group
+		self.port = port
+		self.interval = interval
+		self.fullInterval = fullInterval
+		self.timeout = timeout
+		self.ttl = ttl
+		self.nodes = {} # node id -> status, with LastSeen and Address
+		self.status = {}
+		self.sentStatus = {}
+		self.lastFull = 0
+		self.sequence = 0
+		self.changes = queue.Queue()
+		self.lock = threading.Lock()
+		self.running = False
+		self.thread = None
+		self.socket = None
+
+	def start(self):
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		if hasattr(socket, 'SO_REUSEPORT'):
+			self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		self.socket.bind(('', self.port))
+		membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton('0.0.0.0'))
+		self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+		self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+		self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+		self.socket.settimeout(0.2)
+		self.running = True
+		self.thread = threading.Thread(target=self.loop, daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		if self.thread:
+			self.thread.join(1)
+		if self.socket:
+			self.socket.close()
+			self.socket = None
+
+	def setStatus(self, status):
+		"""Set the announced status, only the fields that changed go out with the next delta."""
+		with self.lock:
+			self.status = dict(status)
+
+	def announce(self, now):
+		with self.lock:
+			status = dict(self.status)
+		full = now - self.lastFull >= self.fullInterval
+		if full:
+			fields = status
+			self.lastFull = now
+		else:
+			fields = {key: value for key, value in status.items() if self.sentStatus.get(key) != value}
+		self.sentStatus = status
+		self.sequence += 1
+		message = {'Id': self.nodeId, 'Seq': self.sequence, 'Full': full, 'Status': fields}
+		self.socket.sendto(json.dumps(message, separators=(',', ':')).encode(), (self.group, self.port))
+
+	def receive(self, data, address):
+		try:
+			message = json.loads(data)
+			nodeId = message['Id']
+			fields = dict(message.get('Status', {}))
+		except (ValueError, KeyError, TypeError, AttributeError):
+			return
+		with self.lock:
+			# deltas received before the first full status are kept, the node is marked incomplete
+			node = self.nodes.setdefault(nodeId, {'Status': {}, 'Complete': False})
+			changed = {key: value for key, value in fields.items() if node['Status'].get(key) != value}
+			if message.get('Full'):
+				for key in node['Status'].keys() - fields.keys():
+					changed[key] = None
+				node['Status'] = fields
+				node['Complete'] = True
+			else:
+				node['Status'].update(changed)
+			node['LastSeen'] = time.monotonic()
+			node['Address'] = address[0]
+		if changed:
+			self.changes.put((nodeId, changed))
+
+	def getNodes(self):
+		"""
+		Returns:
+			dict: Node id -> copy of its Status, Complete, LastSeen and Address.
+		"""
+		with self.lock:
+			return {nodeId: dict(node, Status=dict(node['Status'])) for nodeId, node in self.nodes.items()}
+
+	def loop(self):
+		nextAnnounce = 0
+		while self.running:
+			now = time.monotonic()
+			if now >= nextAnnounce:
+				try:
+					self.announce(now)
+				except OSError:
+					pass
+				nextAnnounce = now + self.interval
+				with self.lock:
+					for nodeId in [nodeId for nodeId, node in self.nodes.items() if now - node['LastSeen'] > self.timeout]:
+						del self.nodes[nodeId]
+						self.changes.put((nodeId, None))
+			try:
+				data, address = self.socket.recvfrom(65535)
+			except (socket.timeout, OSError):
+				continue
+			self.receive(data, address)
+
+	def poll(self):
+		"""
+		Returns:
+			list: (node id, changed fields) since the last poll, fields are None when the node went away.
+		"""
+		changes = []
+		while True:
+			try:
+				changes.append(self.changes.get_nowait())
+			except queue.Empty:
+				return changes
+
+
+def hashChunks(path, chunkSize):
+	"""sha256 of every chunkSize block of a file."""
+	chunks = []
+	with open(path, 'rb') as f:
+		for data in iter(lambda: f.read(chunkSize), b''):
+			chunks.append(hashlib.sha256(data).hexdigest())
+	return chunks
+
+
+def buildManifest(folder, chunkSize=4 << 20, previous=None, exclude=('.git', '__pycache__')):
+	"""
+	Describe the files of a folder for a sync: size, mtime and chunk hashes.
+
+	Args:
+		previous (dict, optional): A previous manifest, files with the same size and mtime aren't hashed again.
+
+	Returns:
+		dict: Relative path ('/' separators) -> Size, Mtime and Chunks.
+	"""
+	previous = previous or {}
+	manifest = {}
+	for root, dirs, fileNames in os.walk(folder):
+		dirs[:] = [name for name in dirs if name not in exclude]
+		for name in fileNames:
+			if name.endswith(SYNC_PART_SUFFIXES):
+				continue
+			path = os.path.join(root, name)
+			relPath = os.path.relpath(path, folder).replace(os.sep, '/')
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue
+			old = previous.get(relPath)
+			if old and old['Size'] == stat.st_size and old['Mtime'] == stat.st_mtime_ns:
+				manifest[relPath] = old
+			else:
+				manifest[relPath] = {'Size': stat.st_size, 'Mtime': stat.st_mtime_ns, 'Chunks': hashChunks(path, chunkSize)}
+	return manifest
+
+
+# Files of an unfinished download, with the list of verified chunks
+SYNC_PART_SUFFIXES = ('.part', '.part.json')
+
+# Folders left out of a shared folder, unless SyncServer is given others for it
+SYNC_EXCLUDES = ('.git', '__pycache__')
+
+# The libraries are shared with their .git folder, so the pulled copies can still be updated with git pull
+LIBRARY_SYNC_EXCLUDES = {'Libraries': ('__pycache__',)}
+
+
+class SyncServer:
+	"""
+	HTTP server sharing folders with the other machines of a show.
+
+	GET /manifest/<name> returns the manifest of a shared folder,
+	GET /file/<name>/<path> returns a file and supports Range requests,
+	so peers only download the chunks they miss and can resume.
+
+	The server only listens on host, the loopback interface by default.
+	excludes holds the folder names left out of a shared folder, by folder name,
+	SYNC_EXCLUDES for the others. The manifest lists them so peers skip the same folders.
+	"""
+
+	def __init__(self, folders, port=42100, chunkSize=4 << 20, host='127.0.0.1', excludes=None):
+		self.folders = dict(folders)
+		self.port = port
+		self.host = host
+		self.chunkSize = chunkSize
+		self.excludes = dict(excludes or {})
+		self.manifests = {}
+		self.lock = threading.Lock()
+		self.server = None
+		self.thread = None
+
+	def getManifest(self, name):
+		with self.lock:
+			manifest = buildManifest(self.folders[name], self.chunkSize, self.manifests.get(name), self.getExclude(name))
+			self.manifests[name] = manifest
+			return manifest
+
+	def getExclude(self, name):
+		return tuple(self.excludes.get(name, SYNC_EXCLUDES))
+
+	def start(self):
+		syncServer = self
+
+		class Handler(http.server.BaseHTTPRequestHandler):
+			def log_message(self, format, *args):
+				pass
+
+			def do_GET(self):
+				parts = urllib.parse.unquote(self.path).lstrip('/').split('/', 2)
+				if len(parts) >= 2 and parts[0] == 'manifest' and parts[1] in syncServer.folders:
+					body = json.dumps({'ChunkSize': syncServer.chunkSize, 'Exclude': syncServer.getExclude(parts[1]), 'Files': syncServer.getManifest(parts[1])}).encode()
+					self.send_response(200)
+					self.send_header('Content-Type', 'application/json')
+					self.send_header('Content-Length', str(len(body)))
+					self.end_headers()
+					self.wfile.write(body)
+					return
+				if len(parts) == 3 and parts[0] == 'file' and parts[1] in syncServer.folders:
+					root = os.path.abspath(syncServer.folders[parts[1]])
+					path = os.path.abspath(os.path.join(root, *parts[2].split('/')))
+					if path.startswith(root + os.sep) and os.path.isfile(path):
+						self.sendFile(path)
+						return
+				self.send_error(404)
+
+			def sendFile(self, path):
+				size = os.path.getsize(path)
+				start, end = 0, size - 1
+				match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+				if match:
+					start = int(match.group(1))
+					end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+					self.send_response(206)
+					self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+				else:
+					self.send_response(200)
+				length = max(end - start + 1, 0)
+				self.send_header('Content-Length', str(length))
+				self.end_headers()
+				with open(path, 'rb') as f:
+					f.seek(start)
+					while length > 0:
+						data = f.read(min(length, 1 << 20))
+						if not data:
+							break
+						self.wfile.write(data)
+						length -= len(data)
+
+		self.server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+		self.server.daemon_threads = True
+		self.port = self.server.server_address[1]
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		if self.server:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+
+
+def syncDestination(destFolder, relPath):
+	"""
+	The local path of a manifest entry, the entry comes from the network so it
+	must be a relative path that stays inside destFolder. Windows drives are
+	rejected on every platform, the peer may run another one.
+
+	Raises:
+		ValueError: When relPath is absolute, contains '..' or leaves destFolder.
+	"""
+	parts = relPath.replace('\\', '/').split('/')
+	if not relPath or relPath.startswith('/') or os.path.isabs(relPath) or ntpath.splitdrive(relPath)[0] or '..' in parts or '' in parts:
+		raise ValueError('Unsafe path in sync manifest: {!r}'.format(relPath))
+	root = os.path.abspath(destFolder)
+	path = os.path.abspath(os.path.join(root, *parts))
+	if not path.startswith(root + os.sep):
+		raise ValueError('Unsafe path in sync manifest: {!r}'.format(relPath))
+	return path
+
+
+def syncFromPeer(baseUrl, name, destFolder, workers=4, timeout=30):
+	"""
+	Bring a local folder up to date with a folder shared by a SyncServer.
+
+	Only chunks whose hash differs from the local file are downloaded,
+	each chunk is verified, and an interrupted download resumes from its .part file.
+	The manifest is checked first, nothing is written when one of its paths leaves destFolder.
+
+	Returns:
+		dict: Files, UpdatedFiles, DownloadedBytes and Seconds.
+	"""
+	start = time.perf_counter()
+	with urllib.request.urlopen('{}/manifest/{}'.format(baseUrl, urllib.parse.quote(name)), timeout=timeout) as response:
+		remote = json.loads(response.read())
+	chunkSize = remote['ChunkSize']
+	paths = {relPath: syncDestination(destFolder, relPath) for relPath in remote['Files']}
+	local = buildManifest(destFolder, chunkSize, exclude=tuple(remote.get('Exclude', SYNC_EXCLUDES))) if os.path.isdir(destFolder) else {}
+
+	tasks = []
+	files = []
+	for relPath, entry in remote['Files'].items():
+		localEntry = local.get(relPath)
+		if localEntry and localEntry['Size'] == entry['Size'] and localEntry['Chunks'] == entry['Chunks']:
+			continue
+		path = paths[relPath]
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		partPath = path + '.part'
+		statePath = path + '.part.json'
+		done = set()
+		try:
+			with open(statePath, 'r') as f:
+				state = json.load(f)
+			if state.get('Chunks') == entry['Chunks'] and os.path.getsize(partPath) == entry['Size']:
+				done = set(state.get('Done', []))
+		except (OSError, ValueError):
+			pass
+		if not done:
+			# start from the local file, its matching chunks don't need a download
+			with open(partPath, 'wb') as f:
+				f.truncate(entry['Size'])
+			if localEntry:
+				with open(path, 'rb') as source, open(partPath, 'r+b') as f:
+					for index, digest in enumerate(localEntry['Chunks']):
+						if index < len(entry['Chunks']) and entry['Chunks'][index] == digest:
+							source.seek(index * chunkSize)
+							f.seek(index * chunkSize)
+							f.write(source.read(min(chunkSize, entry['Size'] - index * chunkSize)))
+							done.add(index)
+		job = {'RelPath': relPath, 'Path': path, 'Entry': entry, 'Done': done, 'Lock': threading.Lock()}
+		files.append(job)
+		tasks += [(job, index) for index in range(len(entry['Chunks'])) if index not in done]
+
+	def download(task):
+		job, index = task
+		offset = index * chunkSize
+		length = min(chunkSize, job['Entry']['Size'] - offset)
+		url = '{}/file/{}/{}'.format(baseUrl, urllib.parse.quote(name), urllib.parse.quote(job['RelPath']))
+		request = urllib.request.Request(url, headers={'Range': 'bytes={}-{}'.format(offset, offset + length - 1)})
+		with urllib.request.urlopen(request, timeout=timeout) as response:
+			data = response.read()
+		if hashlib.sha256(data).hexdigest() != job['Entry']['Chunks'][index]:
+			raise IOError('Chunk {} of {} failed verification'.format(index, job['RelPath']))
+		with job['Lock']:
+			with open(job['Path'] + '.part', 'r+b') as f:
+				f.seek(offset)
+				f.write(data)
+			job['Done'].add(index)
+			with open(job['Path'] + '.part.json', 'w') as f:
+				json.dump({'Chunks': job['Entry']['Chunks'], 'Done': sorted(job['Done'])}, f)
+		return len(data)
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		downloaded = sum(executor.map(download, tasks))
+
+	for job in files:
+		os.utime(job['Path'] + '.part', ns=(job['Entry']['Mtime'], job['Entry']['Mtime']))
+		os.replace(job['Path'] + '.part', job['Path'])
+		if os.path.exists(job['Path'] + '.part.json'):
+			os.remove(job['Path'] + '.part.json')
+
+	return {'Files': len(remote['Files']), 'UpdatedFiles': len(files), 'DownloadedBytes': downloaded, 'Seconds': round(time.perf_counter() - start, 3)}
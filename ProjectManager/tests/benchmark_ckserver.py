@@ -0,0 +1,100 @@
+"""
+CKServer formatting benchmark of LoggerExt
+Author: Arnaud Cassone / CraftKontrol
+Time per record of logToCKServer, with the stub TouchDesigner globals of tdstubs
+and a CKServer client that doesn't send anything, against the previous logToCKServer
+(hasattr chains and a log_parts list per record): a single record per frame,
+records in a burst, and the identity invalidated before every record (worst case).
+
+	python tests/benchmark_ckserver.py --records 100000 --repeat 5
+
+op.StateMachine is a plain attribute here, in TouchDesigner the OP shortcut
+lookups are slower so the saving is larger.
+"""
+
+import argparse
+import builtins
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import tdstubs
+
+
+def logToCKServerBefore(logger, logItemDict):
+	# logToCKServer before the identity and prefix caching
+	device_id = op.StateMachine.ClientId if hasattr(op, 'StateMachine') and hasattr(op.StateMachine, 'ClientId') else f"{project.name.split('.')[0]}"
+	user_id = op.StateMachine.Payload if hasattr(op, 'StateMachine') and hasattr(op.StateMachine, 'Payload') else ""
+	log_parts = [f"[{logItemDict['level']}]", logger.LoggerName]
+	if logItemDict['source']:
+		log_parts.append(logItemDict['source'])
+	log_parts.append(logItemDict['message'])
+	if logItemDict['stackInfos']:
+		log_parts.append(f"({logItemDict['stackInfos']['fileName']}:{logItemDict['stackInfos']['ln']})")
+	log_message = " - ".join(log_parts)
+	result = sys.modules['LoggerExt'].client.log_append(device_id=device_id, msg=log_message, user_id=user_id, level=logItemDict['level'].lower())
+	if not result.get('ok'):
+		logger.countCKServerFailure('rejected')
+
+
+def timePerRecord(fn, records, repeat):
+	# best of repeat runs, in us per record
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		for logItemDict in records:
+			fn(logItemDict)
+		duration = time.perf_counter() - start
+		best = duration if best is None else min(best, duration)
+	return best / len(records) * 1e6
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the per record CKServer formatting of LoggerExt.')
+	parser.add_argument('--records', type=int, default=100000, help='records formatted per case')
+	parser.add_argument('--repeat', type=int, default=5, help='runs per case, the fastest is kept')
+	args = parser.parse_args(argv)
+
+	folder = tempfile.mkdtemp(prefix='logger_benchmark_')
+	try:
+		tdstubs.install(folder, 'Show.toe')
+		builtins.op.StateMachine = types.SimpleNamespace(ClientId='node-1', Payload='user-7')
+		logger = tdstubs.createLogger('BenchmarkLogger', folder)
+		module = sys.modules['LoggerExt']
+		module.client = types.SimpleNamespace(log_append=lambda **kwargs: {'ok': True})
+
+		stackInfos = {'fileName': '/project1/script1', 'fn': 'onFrameStart', 'ln': 12}
+		records = [{'level': 'INFO', 'source': 'PID:1234 - ', 'message': 'message {}'.format(i), 'stackInfos': stackInfos} for i in range(args.records)]
+
+		def beforeOnePerFrame(logItemDict):
+			absTime.frame += 1
+			logToCKServerBefore(logger, logItemDict)
+
+		def onePerFrame(logItemDict):
+			absTime.frame += 1
+			logger.logToCKServer(logItemDict)
+
+		def invalidatedEveryRecord(logItemDict):
+			logger.InvalidateCKServerIdentity()
+			logger.logToCKServer(logItemDict)
+
+		before = timePerRecord(beforeOnePerFrame, records, args.repeat)
+		cases = [
+			('one record per frame', timePerRecord(onePerFrame, records, args.repeat)),
+			('burst of records', timePerRecord(logger.logToCKServer, records, args.repeat)),
+			('invalidated every record', timePerRecord(invalidatedEveryRecord, records, args.repeat))
+		]
+	finally:
+		shutil.rmtree(folder, ignore_errors=True)
+
+	print('{:<32}{:>12}{:>14}'.format('Case', 'us/record', 'vs previous'))
+	print('{:<32}{:>12.3f}{:>14}'.format('previous logToCKServer', before, '-'))
+	for name, duration in cases:
+		print('{:<32}{:>12.3f}{:>13.0f}%'.format(name, duration, (duration / before - 1) * 100))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
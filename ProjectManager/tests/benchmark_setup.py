@@ -0,0 +1,147 @@
+"""
+Startup benchmark of ProjectManagerExt
+Author: Arnaud Cassone / CraftKontrol
+Replays Setup headless, with the stub TouchDesigner globals of tdstubs, against
+synthetic projects of growing size (operators under /MainProject, media files
+they reference) and prints the median wall time of each startup stage.
+
+	python tests/benchmark_setup.py --sizes 100 1000 10000 --save startup_baseline.json
+	python tests/benchmark_setup.py --baseline startup_baseline.json
+
+With --baseline, the exit code is 1 when a stage got slower than the baseline.
+"""
+
+import argparse
+import builtins
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+
+import tdstubs
+
+
+def buildProject(folder, operators, fanout=10, mediaEvery=10, missingEvery=100):
+	"""
+	Build a synthetic project: a ProjectManager COMP, and operators under /MainProject,
+	one in fanout is a COMP, one in mediaEvery references a media file of the project folder
+	and one in missingEvery references a file that doesn't exist.
+
+	Returns:
+		OP: The ProjectManager COMP.
+	"""
+	root = tdstubs.install(folder)
+	librariesFolder = os.path.join(folder, 'Libraries')
+	os.makedirs(os.path.join(librariesFolder, 'CKUI'))
+	os.makedirs(os.path.join(folder, 'Media'))
+
+	comp = tdstubs.OP('ProjectManager', root, isCOMP=True, Libraries=librariesFolder, Logger='Unknown', Iprefresh=0, Configpollinterval=0, Metricsinterval=0)
+	tdstubs.OP('DelayedStartup', comp)
+	tdstubs.setParent(comp)
+	builtins.op.Logger = tdstubs.LoggerStub('Logger', root)
+
+	mainProject = root.op('MainProject')
+	tdstubs.OP('Content', mainProject, isCOMP=True)
+	tdstubs.OP('Library', mainProject, isCOMP=True, tags=('CKLib',))
+	comps = [mainProject]
+	for i in range(operators):
+		parentComp = comps[i // fanout // fanout]
+		if i % fanout == 0:
+			comps.append(tdstubs.OP('base{}'.format(i), parentComp, isCOMP=True))
+			continue
+		node = tdstubs.OP('moviefilein{}'.format(i), parentComp)
+		if i % mediaEvery == 1:
+			relPath = 'Media/clip{}.mov'.format(i)
+			node.addPar('file', relPath, style='File')
+			if i % missingEvery != 1:
+				with open(os.path.join(folder, relPath), 'wb') as f:
+					f.write(os.urandom(1024))
+	return comp
+
+
+def benchmarkSize(operators, repeat):
+	"""
+	Run Setup repeat times on a synthetic project of that many operators.
+
+	Returns:
+		dict: Stage -> median wall time in ms, and the startup errors logged.
+	"""
+	folder = tempfile.mkdtemp(prefix='pm_benchmark_')
+	try:
+		comp = buildProject(folder, operators)
+		module = tdstubs.importExtension('ProjectManagerExt')
+		profiles = []
+		for _ in range(repeat):
+			extension = module.ProjectManagerExt(comp)
+			comp.ext.ProjectManagerExt = extension
+			extension.Setup()
+			profiles.append(dict(extension.StartupProfile))
+		errors = [message for level, message in builtins.op.Logger.messages if level == 'ERROR']
+	finally:
+		shutil.rmtree(folder, ignore_errors=True)
+
+	stages = {}
+	for profile in profiles:
+		for stage, duration in profile.items():
+			stages.setdefault(stage, []).append(duration)
+	return {stage: round(statistics.median(durations), 3) for stage, durations in stages.items()}, errors
+
+
+def findRegressions(results, baseline, tolerance, slack):
+	# a stage regressed when it is tolerance times slower than the baseline and slack ms slower
+	regressions = []
+	for size, stages in results.items():
+		for stage, duration in stages.items():
+			previous = baseline.get(size, {}).get(stage)
+			if previous is not None and duration > previous * tolerance and duration - previous > slack:
+				regressions.append('{} operators, {}: {} ms (baseline {} ms)'.format(size, stage, duration, previous))
+	return regressions
+
+
+def printTable(results):
+	sizes = list(results)
+	stages = []
+	for stageTimes in results.values():
+		stages += [stage for stage in stageTimes if stage not in stages]
+	print('{:<14}'.format('Stage (ms)') + ''.join('{:>12}'.format(size) for size in sizes))
+	for stage in stages:
+		print('{:<14}'.format(stage) + ''.join('{:>12}'.format(results[size].get(stage, '-')) for size in sizes))
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark ProjectManagerExt.Setup on synthetic projects of growing size.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='operators under /MainProject')
+	parser.add_argument('--repeat', type=int, default=5, help='Setup runs per size, the median is kept')
+	parser.add_argument('--save', default='', help='write the results to this JSON file')
+	parser.add_argument('--baseline', default='', help='compare with results saved by --save')
+	parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown ratio reported as a regression')
+	parser.add_argument('--slack', type=float, default=5, help='ms a stage can get slower regardless of the ratio')
+	args = parser.parse_args(argv)
+
+	results = {}
+	failed = False
+	for size in args.sizes:
+		results[str(size)], errors = benchmarkSize(size, args.repeat)
+		for error in errors:
+			print('{} operators: {}'.format(size, error), file=sys.stderr)
+			failed = True
+	printTable(results)
+
+	if args.save:
+		with open(args.save, 'w') as f:
+			json.dump({'Sizes': results}, f, indent=4)
+
+	if args.baseline:
+		with open(args.baseline, 'r') as f:
+			baseline = json.load(f)['Sizes']
+		regressions = findRegressions(results, baseline, args.tolerance, args.slack)
+		for regression in regressions:
+			print('Regression: ' + regression, file=sys.stderr)
+		failed = failed or bool(regressions)
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Stub TouchDesigner globals
+Author: Arnaud Cassone / CraftKontrol
+Just enough of op, parent, me, project, app, absTime, ui, run and runs, and of
+the TDFunctions/TDStoreTools modules, to import the extensions and run them
+headless from the tests and benchmarks. Nothing scheduled with run() is executed.
+"""
+
+import builtins
+import fnmatch
+import importlib
+import itertools
+import logging
+import os
+import sys
+import types
+
+ProjectManagerFolder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ids = itertools.count(1)
+runs = [] # Run objects scheduled with run(), in the order they were scheduled
+state = types.SimpleNamespace(root=None, parent=None, me=None)
+
+
+class Par:
+	def __init__(self, owner, name, value=None, style='Str', page='Custom'):
+		self.owner = owner
+		self.name = name
+		self.val = value
+		self.default = value
+		self.style = style
+		self.page = page
+		self.readOnly = False
+		self.order = 0
+
+	def eval(self):
+		return self.val
+
+	def reset(self):
+		self.val = self.default
+
+	def pulse(self):
+		pass
+
+	def destroy(self):
+		self.owner.par.pars.pop(self.name, None)
+
+
+class ParCollection:
+	# hasattr() is only True for the parameters the operator has, like in TouchDesigner,
+	# assigning an unknown parameter creates it
+	def __init__(self, owner):
+		self.__dict__['owner'] = owner
+		self.__dict__['pars'] = {}
+
+	def __getattr__(self, name):
+		if name in self.pars:
+			return self.pars[name]
+		raise AttributeError(name)
+
+	def __setattr__(self, name, value):
+		if name in self.pars:
+			self.pars[name].val = value
+		else:
+			self.pars[name] = Par(self.owner, name, value)
+
+
+class Page:
+	def __init__(self, owner):
+		self.owner = owner
+
+	def appendStr(self, name):
+		par = Par(self.owner, name, '')
+		self.owner.par.pars[name] = par
+		return par
+
+
+class OP:
+	def __init__(self, name, parent=None, isCOMP=False, tags=(), **pars):
+		self.name = name
+		self.parentOp = parent
+		self.isCOMP = isCOMP
+		self.tags = set(tags)
+		self.id = next(ids)
+		self.color = (0.55, 0.55, 0.55)
+		self.children = []
+		self.par = ParCollection(self)
+		self.time = types.SimpleNamespace(frame=1)
+		self.ext = types.SimpleNamespace()
+		self.customPages = [Page(self)]
+		self.allowCooking = True
+		for parName, value in pars.items():
+			self.addPar(parName, value)
+		if parent is not None:
+			parent.children.append(self)
+
+	def __repr__(self):
+		return "op('{}')".format(self.path)
+
+	@property
+	def path(self):
+		if self.parentOp is None:
+			return '/'
+		return self.parentOp.path.rstrip('/') + '/' + self.name
+
+	def parent(self):
+		return self.parentOp
+
+	def addPar(self, name, value, style='Str'):
+		par = Par(self, name, value, style)
+		self.par.pars[name] = par
+		return par
+
+	def pars(self, pattern='*'):
+		return [par for name, par in self.par.pars.items() if fnmatch.fnmatchcase(name, pattern)]
+
+	def op(self, path):
+		node = self
+		for name in path.strip('/').split('/'):
+			if name:
+				node = next((child for child in node.children if child.name == name), None)
+				if node is None:
+					return None
+		return node
+
+	def run(self, *args, **kwargs):
+		pass
+
+
+class LoggerStub(OP):
+	# op.Logger for the extensions that only log, the messages are kept as (level, message)
+	def __init__(self, name='Logger', parent=None):
+		super().__init__(name, parent, isCOMP=True, Logfolder='', Active=False, Logtofile=False)
+		self.messages = []
+
+	def Log(self, *args, level='INFO', **kwargs):
+		self.messages.append((level, ' - '.join(arg if isinstance(arg, str) else repr(arg) for arg in args)))
+
+	def Info(self, *args, **kwargs):
+		self.Log(*args, level='INFO')
+
+	def Debug(self, *args, **kwargs):
+		self.Log(*args, level='DEBUG')
+
+	def Warning(self, *args, **kwargs):
+		self.Log(*args, level='WARNING')
+
+	def Error(self, *args, **kwargs):
+		self.Log(*args, level='ERROR')
+
+	def Critical(self, *args, **kwargs):
+		self.Log(*args, level='CRITICAL')
+
+
+class OpShortcuts:
+	# op(path) finds an operator, absolute or relative to the parent of me,
+	# global OP shortcuts (op.Logger...) are attributes set by the tests
+	def __call__(self, path):
+		if path.startswith('/'):
+			return state.root.op(path)
+		return state.parent.op(path) if state.parent else None
+
+
+class Run:
+	def __init__(self, script, args, group):
+		self.script = script
+		self.args = args
+		self.group = group
+
+	def kill(self):
+		if self in runs:
+			runs.remove(self)
+
+
+def run(script, *args, delayFrames=0, delayMilliSeconds=0, group=None, **kwargs):
+	scheduled = Run(script, args, group)
+	runs.append(scheduled)
+	return scheduled
+
+
+def createProperty(classInstance, name, value=None, attributeName=None, readOnly=False, dependable=True):
+	setattr(classInstance, name, value)
+
+
+class StorageManager:
+	def __init__(self, extension, ownerComp, storedItems=None):
+		for item in storedItems or []:
+			setattr(extension, item['name'], item.get('default'))
+
+
+class CKServerApi:
+	# CKServer client of the CKUI environment, records the messages instead of sending them
+	def __init__(self, base, tokenLog='', tokenSync='', tokenAdmin=''):
+		self.sent = []
+
+	def log_append(self, device_id, msg, user_id='', level='info'):
+		self.sent.append((device_id, user_id, level, msg))
+		return {'ok': True}
+
+	def health(self):
+		return {'ok': True, 'actions': []}
+
+
+def installModule(name, module):
+	# only stands in for modules that aren't installed
+	try:
+		importlib.import_module(name)
+	except ImportError:
+		sys.modules[name] = module
+
+
+def install(projectFolder, projectName='Benchmark.toe'):
+	"""
+	Install the stub globals for a project saved in projectFolder.
+
+	Returns:
+		OP: The root operator, /MainProject is created under it.
+	"""
+	if ProjectManagerFolder not in sys.path:
+		sys.path.insert(0, ProjectManagerFolder)
+
+	installModule('TDFunctions', types.SimpleNamespace(createProperty=createProperty))
+	installModule('TDStoreTools', types.SimpleNamespace(StorageManager=StorageManager))
+	installModule('ckserverapi', types.SimpleNamespace(CKServerApi=CKServerApi))
+	exceptions = types.SimpleNamespace(HTTPError=type('HTTPError', (Exception,), {}), RequestException=type('RequestException', (Exception,), {}))
+	installModule('requests', types.SimpleNamespace(exceptions=exceptions))
+
+	state.root = OP('', isCOMP=True)
+	OP('MainProject', state.root, isCOMP=True)
+	state.parent = state.root
+	state.me = OP('me', state.root)
+	runs.clear()
+
+	shortcuts = OpShortcuts()
+	shortcuts.TDModules = types.SimpleNamespace(mod=types.SimpleNamespace(TDFunctions=sys.modules['TDFunctions']))
+	builtins.op = shortcuts
+	builtins.parent = lambda *args: state.parent
+	builtins.me = state.me
+	builtins.project = types.SimpleNamespace(folder=projectFolder, name=projectName, save=lambda *args: None)
+	builtins.app = types.SimpleNamespace(build='2023.12000', version='2023')
+	builtins.absTime = types.SimpleNamespace(frame=1, seconds=0.0)
+	builtins.ui = types.SimpleNamespace(status='')
+	builtins.run = run
+	builtins.runs = runs
+	builtins.debug = print
+	return state.root
+
+
+def setParent(comp, dat='ext'):
+	"""
+	Make comp the parent() of the extension DATs imported next, me is a DAT inside it.
+	"""
+	state.parent = comp
+	state.me = comp.op(dat) or OP(dat, comp)
+	builtins.me = state.me
+	return state.me
+
+
+def importExtension(name):
+	"""
+	Import an extension module again, module level code sees the current parent() and me.
+	"""
+	sys.modules.pop(name, None)
+	return importlib.import_module(name)
+
+
+def createLogger(name, logFolder, **pars):
+	"""
+	Create a Logger COMP under the root with its LoggerExt.
+	Parameters default to an active logger at DEBUG level without handlers, pars override them.
+	The handlers already on the logging.Logger of that name are left to the extension,
+	like when a Logger COMP is initialized again in TouchDesigner.
+
+	Returns:
+		LoggerExt: The extension, op.Logger is its COMP.
+	"""
+	defaults = dict(Active=True, Parentlogger=None, Propagate=False, Logtotextport=False, Logtostatusbar=False,
+		Logtofile=False, Loglevel='DEBUG', Logfolder=logFolder, Addpidtofilename=True, Origin=state.root,
+		Loggername=name, clone=None, Filerotation=1, Pathtologfile='', Tokenlog='', Tokensync='', Tokenadmin='')
+	defaults.update(pars)
+	comp = OP(name, state.root, isCOMP=True, **defaults)
+	setParent(comp)
+	module = importExtension('LoggerExt')
+	extension = module.LoggerExt(comp)
+	comp.ext.LoggerExt = extension
+	builtins.op.Logger = extension
+	return extension
@@ -0,0 +1,64 @@
+"""
+Tests of the CKServer identity of LoggerExt: resolved once and kept until
+InvalidateCKServerIdentity, which StateMachine calls when it starts or changes.
+
+	python -m pytest tests
+"""
+
+import builtins
+import sys
+import types
+
+import pytest
+
+import tdstubs
+
+
+@pytest.fixture
+def logger(tmp_path):
+	tdstubs.install(str(tmp_path), 'Show.3.toe')
+	extension = tdstubs.createLogger('CKServerTestLogger', str(tmp_path / 'Logs'), Logtockserver=True)
+	extension.sent = sys.modules['LoggerExt'].client.sent
+	extension.sent.clear()
+	return extension
+
+
+def nextFrame():
+	builtins.absTime.frame += 1
+
+
+def startStateMachine(logger, clientId, payload):
+	# what StateMachine does when it starts
+	builtins.op.StateMachine = types.SimpleNamespace(ClientId=clientId, Payload=payload)
+	logger.InvalidateCKServerIdentity()
+
+
+def test_identity_without_statemachine(logger):
+	logger.Info('hello')
+	device_id, user_id, level, message = logger.sent[-1]
+	assert (device_id, user_id, level) == ('Show', '', 'info')
+	assert message.startswith('[INFO] - CKServerTestLogger - hello - (')
+
+
+def test_identity_is_kept_until_invalidated(logger):
+	logger.Info('first', withInfos=False)
+	builtins.op.StateMachine = types.SimpleNamespace(ClientId='node-1', Payload='user-7')
+	nextFrame()
+	logger.Info('next frame', withInfos=False)
+	assert [sent[:2] for sent in logger.sent] == [('Show', ''), ('Show', '')]
+
+
+def test_statemachine_started_after_the_first_message(logger):
+	logger.Info('before', withInfos=False)
+	startStateMachine(logger, 'node-1', 'user-7')
+	logger.Info('after', withInfos=False)
+	assert [sent[:2] for sent in logger.sent] == [('Show', ''), ('node-1', 'user-7')]
+
+
+def test_statemachine_values_change(logger):
+	startStateMachine(logger, 'node-1', 'user-7')
+	logger.Info('first', withInfos=False)
+	builtins.op.StateMachine.Payload = 'user-8'
+	logger.InvalidateCKServerIdentity()
+	logger.Info('second', withInfos=False)
+	assert [sent[:2] for sent in logger.sent] == [('node-1', 'user-7'), ('node-1', 'user-8')]
@@ -0,0 +1,136 @@
+"""
+Tests of ProjectUtils.ClusterNode over loopback UDP: full statuses and deltas,
+and the expiry of silent nodes. The nodes send to each other's loopback port
+instead of the multicast group, so the tests don't depend on multicast routing.
+
+	python -m pytest tests
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ProjectUtils
+
+
+def loopbackSocket():
+	udpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+	udpSocket.bind(('127.0.0.1', 0))
+	udpSocket.settimeout(2)
+	return udpSocket
+
+
+def connect(node, peer):
+	# node announces to the loopback port of peer
+	node.group, node.port = peer.socket.getsockname()
+
+
+def startLoop(node):
+	# ClusterNode.start without the multicast membership
+	node.socket.settimeout(0.05)
+	node.running = True
+	node.thread = threading.Thread(target=node.loop, daemon=True)
+	node.thread.start()
+
+
+def waitFor(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		result = condition()
+		if result:
+			return result
+		time.sleep(0.02)
+	return condition()
+
+
+@pytest.fixture
+def nodes():
+	a = ProjectUtils.ClusterNode('a', fullInterval=10.0)
+	b = ProjectUtils.ClusterNode('b', fullInterval=10.0)
+	a.socket, b.socket = loopbackSocket(), loopbackSocket()
+	connect(a, b)
+	connect(b, a)
+	yield a, b
+	a.stop()
+	b.stop()
+
+
+def transfer(sender, receiver, now):
+	# one announce of sender, received by receiver, returns the message
+	sender.announce(now)
+	data, address = receiver.socket.recvfrom(65535)
+	receiver.receive(data, address)
+	return json.loads(data)
+
+
+def test_full_status_then_deltas(nodes):
+	a, b = nodes
+	a.setStatus({'State': 'Ready', 'Fps': 60, 'Project': 'Show'})
+	message = transfer(a, b, 100.0)
+	assert message['Full'] and message['Status'] == {'State': 'Ready', 'Fps': 60, 'Project': 'Show'}
+	assert b.poll() == [('a', {'State': 'Ready', 'Fps': 60, 'Project': 'Show'})]
+
+	a.setStatus({'State': 'Ready', 'Fps': 30, 'Project': 'Show'})
+	message = transfer(a, b, 101.0)
+	assert not message['Full'] and message['Status'] == {'Fps': 30}
+	assert b.poll() == [('a', {'Fps': 30})]
+
+	message = transfer(a, b, 102.0)
+	assert message['Status'] == {}
+	assert b.poll() == []
+
+	message = transfer(a, b, 110.0)
+	assert message['Full'] and message['Status'] == {'State': 'Ready', 'Fps': 30, 'Project': 'Show'}
+	assert b.poll() == []
+
+	node = b.getNodes()['a']
+	assert node['Complete'] and node['Address'] == '127.0.0.1'
+	assert node['Status'] == {'State': 'Ready', 'Fps': 30, 'Project': 'Show'}
+
+
+def test_full_status_clears_the_missing_fields(nodes):
+	a, b = nodes
+	a.setStatus({'State': 'Error', 'Error': 'No GPU'})
+	transfer(a, b, 100.0)
+	b.poll()
+
+	a.setStatus({'State': 'Ready'})
+	a.lastFull = 0
+	transfer(a, b, 200.0)
+	assert b.poll() == [('a', {'State': 'Ready', 'Error': None})]
+	assert b.getNodes()['a']['Status'] == {'State': 'Ready'}
+
+
+def test_delta_before_the_full_status_is_incomplete(nodes):
+	a, b = nodes
+	b.receive(json.dumps({'Id': 'a', 'Seq': 5, 'Full': False, 'Status': {'Fps': 60}}).encode(), ('127.0.0.1', 0))
+	assert b.getNodes()['a']['Complete'] is False
+	assert b.getNodes()['a']['Status'] == {'Fps': 60}
+
+	b.receive(b'not json', ('127.0.0.1', 0))
+	b.receive(json.dumps({'Seq': 6}).encode(), ('127.0.0.1', 0))
+	assert list(b.getNodes()) == ['a']
+
+
+def test_silent_node_expires(nodes):
+	a, b = nodes
+	a.interval = b.interval = 0.05
+	b.timeout = 0.3
+	a.setStatus({'State': 'Ready'})
+	startLoop(a)
+	startLoop(b)
+	assert waitFor(lambda: 'a' in b.getNodes())
+	b.poll()
+
+	a.running = False
+	a.thread.join(1)
+	changes = []
+	assert waitFor(lambda: changes.extend(b.poll()) or ('a', None) in changes)
+	assert 'a' not in b.getNodes()
@@ -0,0 +1,103 @@
+"""
+Tests of the LogCollector module: records sent by several processes to a
+collector on an ephemeral loopback port are merged in time order.
+
+	python -m pytest tests
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+ProjectManagerFolder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ProjectManagerFolder)
+
+import LogCollector
+
+# sends records with the given timestamps, in that order, as a separate process
+SENDER_SCRIPT = """
+import os, socket, sys
+sys.path.insert(0, sys.argv[1])
+import LogCollector
+port, name = int(sys.argv[2]), sys.argv[3]
+connection = socket.create_connection(('127.0.0.1', port), timeout=5)
+for created in sys.argv[4:]:
+	connection.sendall(LogCollector.encodeRecord(float(created), os.getpid(), name, 'INFO', '{} {}'.format(name, created)))
+connection.close()
+"""
+
+
+@pytest.fixture
+def collector(tmp_path):
+	logCollector = LogCollector.LogCollector(0, str(tmp_path / 'Logs' / 'merged.log'), reorderDelay=0.2)
+	logCollector.start()
+	logCollector.port = logCollector.server.server_address[1]
+	yield logCollector
+	logCollector.stop()
+
+
+def sendFromProcesses(collector, timestampsByName):
+	processes = [subprocess.Popen([sys.executable, '-c', SENDER_SCRIPT, ProjectManagerFolder, str(collector.port), name] + [repr(created) for created in timestamps])
+		for name, timestamps in timestampsByName.items()]
+	for process in processes:
+		assert process.wait(30) == 0
+	return [process.pid for process in processes]
+
+
+def waitFor(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		if condition():
+			return True
+		time.sleep(0.02)
+	return condition()
+
+
+def readLines(collector):
+	if not os.path.exists(collector.path):
+		return []
+	with open(collector.path, encoding='utf8') as f:
+		return f.read().splitlines()
+
+
+def test_records_of_several_processes_are_merged_in_time_order(collector):
+	# in the future, so they are all pending until stop and only their timestamps order them
+	base = time.time() + 60
+	pids = sendFromProcesses(collector, {
+		'first': [base + 4, base + 0, base + 2],
+		'second': [base + 5, base + 3, base + 1]
+	})
+	assert waitFor(lambda: collector.sequence == 6)
+	assert readLines(collector) == []
+	collector.stop()
+
+	lines = readLines(collector)
+	assert [line.rsplit(' - ', 1)[1] for line in lines] == [
+		'first {!r}'.format(base + 0), 'second {!r}'.format(base + 1), 'first {!r}'.format(base + 2),
+		'second {!r}'.format(base + 3), 'first {!r}'.format(base + 4), 'second {!r}'.format(base + 5)]
+	assert all(' - PID:{} - INFO - first - '.format(pids[0]) in line for line in lines[0::2])
+	assert all(' - PID:{} - INFO - second - '.format(pids[1]) in line for line in lines[1::2])
+
+
+def test_late_records_are_written_on_arrival(collector):
+	now = time.time()
+	sendFromProcesses(collector, {'late': [now - 10], 'future': [now + 60]})
+	assert waitFor(lambda: len(readLines(collector)) == 1)
+	assert readLines(collector)[0].endswith('late {!r}'.format(now - 10))
+
+
+def test_collector_handler_sends_the_records_of_a_logger(collector):
+	handler = LogCollector.CollectorHandler(collector.port)
+	logger = logging.getLogger('CollectorTestLogger')
+	logger.propagate = False
+	logger.addHandler(handler)
+	try:
+		logger.warning('from %s', 'a logger')
+		assert waitFor(lambda: any(line.endswith(' - WARNING - CollectorTestLogger - from a logger') for line in readLines(collector)))
+	finally:
+		logger.removeHandler(handler)
+		handler.close()
@@ -0,0 +1,72 @@
+"""
+Tests of the LoggerExt handlers when a Logger COMP is initialized again: the
+handlers left on the logging.Logger are adopted, not duplicated, and the shared
+file handler keeps a single reference.
+
+	python -m pytest tests
+"""
+
+import logging
+
+import pytest
+
+import tdstubs
+import LogFileHandlers
+
+
+@pytest.fixture
+def folder(tmp_path):
+	tdstubs.install(str(tmp_path), 'Show.toe')
+	yield str(tmp_path / 'Logs')
+	for handler in list(logging.getLogger('HandlersTestLogger').handlers):
+		logging.getLogger('HandlersTestLogger').removeHandler(handler)
+		handler.close()
+
+
+def handlersOf(logger, handlerType):
+	return [handler for handler in logger.Logger.handlers if type(handler) is handlerType]
+
+
+def test_initialized_again_adopts_the_handlers(folder):
+	first = tdstubs.createLogger('HandlersTestLogger', folder, Logtotextport=True, Logtofile=True)
+	path = first.getLogFilePath()
+	for _ in range(2):
+		logger = tdstubs.createLogger('HandlersTestLogger', folder, Logtotextport=True, Logtofile=True)
+
+	assert logger.Logger is first.Logger
+	assert handlersOf(logger, logging.StreamHandler) == [logger.streamHandler]
+	assert [handler for handler in logger.Logger.handlers if LogFileHandlers.isSharedFileHandler(handler)] == [logger.fileHandler]
+	assert LogFileHandlers.references(path) == 1
+
+	logger.Info('once', withInfos=False)
+	logger.fileHandler.flush()
+	with open(path, encoding='utf8') as f:
+		assert f.read().count(' - once') == 1
+
+	logger.deleteFileHandler()
+	assert LogFileHandlers.references(path) == 0
+
+
+def test_initialized_again_without_file_logging_releases_the_file(folder):
+	first = tdstubs.createLogger('HandlersTestLogger', folder, Logtotextport=True, Logtofile=True)
+	path = first.getLogFilePath()
+	fileHandler = first.fileHandler
+
+	logger = tdstubs.createLogger('HandlersTestLogger', folder)
+	assert logger.fileHandler is None and logger.streamHandler is None
+	assert handlersOf(logger, logging.StreamHandler) == []
+	assert not any(LogFileHandlers.isSharedFileHandler(handler) or handler is fileHandler for handler in logger.Logger.handlers)
+	assert LogFileHandlers.references(path) == 0
+	assert fileHandler.stream is None
+
+
+def test_loggers_of_the_same_file_share_one_handler(folder):
+	first = tdstubs.createLogger('HandlersTestLogger', folder, Logtofile=True)
+	path = first.getLogFilePath()
+	handler = LogFileHandlers.acquireFileHandler(path)
+	assert handler is first.fileHandler
+	assert LogFileHandlers.references(path) == 2
+
+	LogFileHandlers.releaseFileHandler(handler)
+	first.deleteFileHandler()
+	assert LogFileHandlers.references(path) == 0
@@ -0,0 +1,104 @@
+"""
+Tests of the LoggerExt pending logs queue: FIFO order, re-entrant queued logs,
+the bound of the queue and a failing handler, with thousands of queued entries.
+
+	python -m pytest tests
+"""
+
+import functools
+import logging
+
+import pytest
+
+import tdstubs
+
+
+class RecordingHandler(logging.Handler):
+	def __init__(self):
+		super().__init__()
+		self.records = []
+		self.failing = False
+
+	def emit(self, record):
+		if self.failing:
+			raise RuntimeError('handler is down')
+		self.records.append((record.levelname, record.getMessage()))
+
+	def messages(self):
+		return [message.split(' - ', 1)[1].split(' (')[0] for level, message in self.records]
+
+
+@pytest.fixture
+def logger(tmp_path):
+	tdstubs.install(str(tmp_path))
+	extension = tdstubs.createLogger('QueueTestLogger', str(tmp_path / 'Logs'))
+	handler = RecordingHandler()
+	extension.Logger.addHandler(handler)
+	extension.handler = handler
+	# queued calls without the stack infos, inspect.stack() would be most of the run time
+	extension.info = functools.partial(extension.Info, withInfos=False)
+	yield extension
+	extension.Logger.removeHandler(handler)
+
+
+def test_dequeue_logs_in_fifo_order(logger):
+	for i in range(logger.LogsQueue.maxlen):
+		logger.LogsQueue.append((logger.info, f'queued {i}'))
+	logger.dequeueLogs()
+	assert not logger.LogsQueue
+	assert logger.handler.messages() == [f'queued {i}' for i in range(logger.LogsQueue.maxlen)]
+
+
+def test_queue_is_bounded(logger):
+	for i in range(5000):
+		logger.LogsQueue.append((logger.info, f'queued {i}'))
+	assert len(logger.LogsQueue) == logger.LogsQueue.maxlen
+	logger.dequeueLogs()
+	assert logger.handler.messages() == [f'queued {i}' for i in range(5000 - logger.LogsQueue.maxlen, 5000)]
+
+
+def test_log_drains_the_queue_before_its_own_message(logger):
+	for i in range(3000):
+		logger.LogsQueue.append((functools.partial(logger.Debug, withInfos=False), f'queued {i}'))
+	logger.Info('direct', withInfos=False)
+	messages = logger.handler.messages()
+	assert messages[-1] == 'direct'
+	assert messages[:-1] == [f'queued {i}' for i in range(2000, 3000)]
+	assert not logger.LogsQueue
+
+
+def test_queued_logs_that_log_again(logger):
+	def logTwice(message):
+		logger.info(message)
+		logger.info(message + ' again')
+
+	for i in range(1000):
+		logger.LogsQueue.append((logTwice, f'queued {i}'))
+	logger.dequeueLogs()
+	expected = []
+	for i in range(1000):
+		expected += [f'queued {i}', f'queued {i} again']
+	assert logger.handler.messages() == expected
+	assert not logger.LogsQueue
+
+
+def test_failed_log_is_queued_with_its_level(logger):
+	logger.handler.failing = True
+	logger.Warning('lost', withInfos=False)
+	assert [logFn.__name__ for logFn, message in logger.LogsQueue] == ['Error', 'Warning']
+
+	logger.handler.failing = False
+	logger.dequeueLogs()
+	levels = [level for level, message in logger.handler.records]
+	assert levels == ['ERROR', 'WARNING']
+	assert 'handler is down' in logger.handler.records[0][1]
+	assert 'lost' in logger.handler.records[1][1]
+
+
+def test_failing_handler_does_not_grow_the_queue(logger):
+	logger.handler.failing = True
+	for i in range(1000):
+		logger.Info(f'message {i}', withInfos=False)
+		assert len(logger.LogsQueue) <= 2
+	logger.dequeueLogs()
+	assert not logger.LogsQueue
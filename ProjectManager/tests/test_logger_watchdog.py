@@ -0,0 +1,68 @@
+"""
+Tests of the LoggerExt frame watchdog: a slow frame is reported with its spans,
+including the spans over the budget and the spans they ran in.
+
+	python -m pytest tests
+"""
+
+import logging
+import time
+
+import pytest
+
+import tdstubs
+
+
+class RecordingHandler(logging.Handler):
+	def __init__(self):
+		super().__init__()
+		self.records = []
+
+	def emit(self, record):
+		self.records.append((record.levelname, record.getMessage()))
+
+
+@pytest.fixture
+def logger(tmp_path):
+	tdstubs.install(str(tmp_path))
+	extension = tdstubs.createLogger('WatchdogTestLogger', str(tmp_path / 'Logs'), Framebudget=20, Watchdoginterval=0)
+	handler = RecordingHandler()
+	extension.Logger.addHandler(handler)
+	extension.handler = handler
+	yield extension
+	extension.Logger.removeHandler(handler)
+
+
+def slowFrameWarnings(logger):
+	# the warnings without their recent logs, which hold the previous warnings
+	return [message.split('\nRecent logs:')[0] for level, message in logger.handler.records if level == 'WARNING' and 'Slow frame' in message]
+
+
+def test_slow_frame_reports_the_spans_over_the_budget(logger):
+	logger.FrameTick()
+	with logger.Span('onFrameStart'):
+		with logger.Span('loadScene'):
+			time.sleep(0.05)
+		with logger.Span('fast'):
+			pass
+	logger.FrameTick()
+
+	warnings = slowFrameWarnings(logger)
+	assert len(warnings) == 1
+	overBudget = warnings[0].split('Spans over the budget: ')[1]
+	assert 'onFrameStart > loadScene 5' in overBudget
+	assert 'fast' not in overBudget
+
+
+def test_spans_of_a_previous_frame_are_not_reported(logger):
+	logger.FrameTick()
+	with logger.Span('previousFrame'):
+		time.sleep(0.03)
+	logger.FrameTick()
+	logger.handler.records.clear()
+
+	time.sleep(0.03)
+	logger.FrameTick()
+	warnings = slowFrameWarnings(logger)
+	assert len(warnings) == 1
+	assert 'previousFrame' not in warnings[0]
@@ -0,0 +1,76 @@
+"""
+Tests of the Metrics module: the registry exposition page served by a
+MetricsServer on an ephemeral loopback port.
+
+	python -m pytest tests
+"""
+
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Metrics
+
+
+@pytest.fixture
+def server():
+	metricsServer = Metrics.MetricsServer(0, Metrics.MetricsRegistry(), host='127.0.0.1')
+	metricsServer.start()
+	yield metricsServer
+	metricsServer.stop()
+
+
+def scrape(server, path='/metrics'):
+	host, port = server.server.server_address[:2]
+	with urllib.request.urlopen('http://{}:{}{}'.format(host, port, path), timeout=5) as response:
+		return response.headers['Content-Type'], response.read().decode('utf-8')
+
+
+def test_exposition_page(server):
+	registry = server.registry
+	registry.describe('ckui_logs_total', 'counter', 'Log records by level')
+	registry.inc('ckui_logs_total', (('level', 'INFO'),))
+	registry.inc('ckui_logs_total', (('level', 'INFO'),))
+	registry.inc('ckui_logs_total', (('level', 'ERROR'),))
+	registry.describe('ckui_frame_ms', 'gauge')
+	registry.set('ckui_frame_ms', 16.5)
+
+	contentType, page = scrape(server)
+	assert contentType.startswith('text/plain; version=0.0.4')
+	assert page == (
+		'# TYPE ckui_frame_ms gauge\n'
+		'ckui_frame_ms 16.5\n'
+		'# HELP ckui_logs_total Log records by level\n'
+		'# TYPE ckui_logs_total counter\n'
+		'ckui_logs_total{level="ERROR"} 1\n'
+		'ckui_logs_total{level="INFO"} 2\n')
+
+
+def test_page_is_rendered_again_after_a_change(server):
+	registry = server.registry
+	registry.describe('ckui_library_status', 'gauge')
+	registry.setState('ckui_library_status', 'Loading', (('library', 'CKUI'),))
+	assert 'status="Loading"} 1' in scrape(server)[1]
+
+	registry.setState('ckui_library_status', 'Ready', (('library', 'CKUI'),))
+	page = scrape(server)[1]
+	assert 'ckui_library_status{library="CKUI",status="Ready"} 1' in page
+	assert 'Loading' not in page
+
+
+def test_label_values_are_escaped(server):
+	registry = server.registry
+	registry.inc('ckui_errors_total', (('source', 'C:\\Show\nline "2"'),))
+	page = scrape(server)[1]
+	assert 'ckui_errors_total{source="C:\\\\Show\\nline \\"2\\""} 1\n' in page
+
+
+def test_unknown_path_is_not_found(server):
+	with pytest.raises(urllib.error.HTTPError) as error:
+		scrape(server, '/other')
+	assert error.value.code == 404
@@ -0,0 +1,183 @@
+"""
+Tests of the library sync: ProjectUtils.SyncServer and syncFromPeer over loopback
+(delta, resume, excluded folders, path traversal), and the peers PullFromPeer
+picks from the cluster.
+
+	python -m pytest tests
+"""
+
+import builtins
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import threading
+import types
+
+import pytest
+
+import tdstubs
+import ProjectUtils
+
+CHUNK = 1024
+
+
+def writeFile(path, data):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'wb') as f:
+		f.write(data)
+
+
+def readFile(path):
+	with open(path, 'rb') as f:
+		return f.read()
+
+
+@pytest.fixture
+def shared(tmp_path):
+	# a Libraries folder shared on an ephemeral loopback port
+	folder = str(tmp_path / 'Shared')
+	writeFile(os.path.join(folder, 'CKUI', 'ui.tox'), os.urandom(CHUNK * 4 + 100))
+	writeFile(os.path.join(folder, 'CKUI', 'README.md'), b'CKUI')
+	writeFile(os.path.join(folder, 'CKUI', '.git', 'HEAD'), b'ref: refs/heads/main\n')
+	writeFile(os.path.join(folder, 'CKUI', '__pycache__', 'ui.pyc'), b'cache')
+	server = ProjectUtils.SyncServer({'Libraries': folder}, 0, chunkSize=CHUNK, excludes=ProjectUtils.LIBRARY_SYNC_EXCLUDES)
+	server.start()
+	server.baseUrl = 'http://127.0.0.1:{}'.format(server.port)
+	server.folder = folder
+	yield server
+	server.stop()
+
+
+def test_server_listens_on_loopback_by_default(shared):
+	assert shared.server.server_address[0] == '127.0.0.1'
+
+
+def test_first_sync_copies_the_folder_with_git(shared, tmp_path):
+	dest = str(tmp_path / 'Dest')
+	summary = ProjectUtils.syncFromPeer(shared.baseUrl, 'Libraries', dest)
+	assert summary['Files'] == summary['UpdatedFiles'] == 3
+	for relPath in ('CKUI/ui.tox', 'CKUI/README.md', 'CKUI/.git/HEAD'):
+		assert readFile(os.path.join(dest, relPath)) == readFile(os.path.join(shared.folder, relPath))
+	assert not os.path.exists(os.path.join(dest, 'CKUI', '__pycache__'))
+	assert not [name for name in os.listdir(os.path.join(dest, 'CKUI')) if name.endswith(ProjectUtils.SYNC_PART_SUFFIXES)]
+
+
+def test_git_is_excluded_by_default(tmp_path):
+	folder = str(tmp_path / 'Wheelhouse')
+	writeFile(os.path.join(folder, 'numpy.whl'), b'wheel')
+	writeFile(os.path.join(folder, '.git', 'HEAD'), b'ref')
+	server = ProjectUtils.SyncServer({'Wheelhouse': folder}, 0)
+	server.start()
+	try:
+		summary = ProjectUtils.syncFromPeer('http://127.0.0.1:{}'.format(server.port), 'Wheelhouse', str(tmp_path / 'Dest'))
+	finally:
+		server.stop()
+	assert summary['Files'] == 1
+	assert not os.path.exists(str(tmp_path / 'Dest' / '.git'))
+
+
+def test_second_sync_only_downloads_the_changed_chunk(shared, tmp_path):
+	dest = str(tmp_path / 'Dest')
+	ProjectUtils.syncFromPeer(shared.baseUrl, 'Libraries', dest)
+	path = os.path.join(shared.folder, 'CKUI', 'ui.tox')
+	data = bytearray(readFile(path))
+	data[CHUNK * 2 + 10] ^= 0xFF
+	writeFile(path, bytes(data))
+	os.utime(path, ns=(1, 1))
+
+	summary = ProjectUtils.syncFromPeer(shared.baseUrl, 'Libraries', dest)
+	assert summary['UpdatedFiles'] == 1
+	assert summary['DownloadedBytes'] == CHUNK
+	assert readFile(os.path.join(dest, 'CKUI', 'ui.tox')) == bytes(data)
+
+	assert ProjectUtils.syncFromPeer(shared.baseUrl, 'Libraries', dest)['UpdatedFiles'] == 0
+
+
+def test_interrupted_download_resumes(shared, tmp_path):
+	dest = str(tmp_path / 'Dest')
+	data = readFile(os.path.join(shared.folder, 'CKUI', 'ui.tox'))
+	chunks = [hashlib.sha256(data[offset:offset + CHUNK]).hexdigest() for offset in range(0, len(data), CHUNK)]
+	# the first two chunks were downloaded before the interruption
+	partPath = os.path.join(dest, 'CKUI', 'ui.tox.part')
+	writeFile(partPath, data[:CHUNK * 2] + bytes(len(data) - CHUNK * 2))
+	with open(partPath + '.json', 'w') as f:
+		json.dump({'Chunks': chunks, 'Done': [0, 1]}, f)
+
+	summary = ProjectUtils.syncFromPeer(shared.baseUrl, 'Libraries', dest)
+	assert summary['DownloadedBytes'] == len(data) - CHUNK * 2 + len(b'CKUI') + len(b'ref: refs/heads/main\n')
+	assert readFile(os.path.join(dest, 'CKUI', 'ui.tox')) == data
+	assert not os.path.exists(partPath) and not os.path.exists(partPath + '.json')
+
+
+def test_server_rejects_paths_outside_the_shared_folder(shared, tmp_path):
+	writeFile(str(tmp_path / 'secret.txt'), b'secret')
+	connection = http.client.HTTPConnection('127.0.0.1', shared.port, timeout=5)
+	try:
+		for path in ('/file/Libraries/../secret.txt', '/file/Libraries/%2e%2e/secret.txt', '/file/Libraries/CKUI/../../secret.txt', '/file/Other/secret.txt'):
+			connection.request('GET', path)
+			response = connection.getresponse()
+			response.read()
+			assert response.status == 404, path
+	finally:
+		connection.close()
+
+
+@pytest.mark.parametrize('relPath', ['../evil.txt', 'CKUI/../../evil.txt', '/tmp/evil.txt', 'C:/evil.txt', 'CKUI//evil.txt'])
+def test_client_rejects_a_manifest_leaving_the_folder(tmp_path, relPath):
+	manifest = json.dumps({'ChunkSize': CHUNK, 'Files': {'ok.txt': {'Size': 2, 'Mtime': 0, 'Chunks': []}, relPath: {'Size': 4, 'Mtime': 0, 'Chunks': []}}}).encode()
+
+	class Handler(http.server.BaseHTTPRequestHandler):
+		def do_GET(self):
+			self.send_response(200)
+			self.send_header('Content-Length', str(len(manifest)))
+			self.end_headers()
+			self.wfile.write(manifest)
+
+		def log_message(self, *args):
+			pass
+
+	server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	dest = tmp_path / 'Dest' / 'Libraries'
+	try:
+		with pytest.raises(ValueError):
+			ProjectUtils.syncFromPeer('http://127.0.0.1:{}'.format(server.server_address[1]), 'Libraries', str(dest))
+	finally:
+		server.shutdown()
+		server.server_close()
+	assert not os.path.exists(str(tmp_path / 'Dest'))
+	assert not os.path.exists(str(tmp_path / 'evil.txt'))
+
+
+@pytest.fixture
+def projectManager(tmp_path):
+	root = tdstubs.install(str(tmp_path), 'Show.toe')
+	librariesFolder = str(tmp_path / 'Libraries')
+	comp = tdstubs.OP('ProjectManager', root, isCOMP=True, Libraries=librariesFolder, Logger='Unknown', Syncport=42100, Syncpeers='')
+	tdstubs.setParent(comp)
+	builtins.op.Logger = tdstubs.LoggerStub('Logger', root)
+	extension = tdstubs.importExtension('ProjectManagerExt').ProjectManagerExt(comp)
+	extension.pulls = []
+	extension.RunInBackground = lambda work, onDone=None, *args: extension.pulls.append(work)
+	nodes = {
+		'intruder': {'Status': {'SyncPort': 42100}, 'Address': '10.0.0.66'},
+		'show-2': {'Status': {'SyncPort': 42100}, 'Address': '10.0.0.2'}
+	}
+	extension.clusterNode = types.SimpleNamespace(getNodes=lambda: nodes)
+	return extension
+
+
+def test_pull_without_host_needs_syncpeers(projectManager):
+	projectManager.PullFromPeer()
+	assert projectManager.pulls == []
+	assert any('Syncpeers is empty' in message for level, message in builtins.op.Logger.messages if level == 'WARNING')
+
+
+def test_pull_without_host_picks_a_node_of_syncpeers(projectManager):
+	projectManager.ownerComp.par.Syncpeers = '10.0.0.2 10.0.0.3'
+	projectManager.PullFromPeer()
+	assert len(projectManager.pulls) == 1
+	assert any('http://10.0.0.2:42100' in message for level, message in builtins.op.Logger.messages)
+	assert not any('10.0.0.66' in message for level, message in builtins.op.Logger.messages)